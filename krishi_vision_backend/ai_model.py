@@ -5,20 +5,55 @@ Accuracy: Excellent at identifying diseases from images.
 
 Two modes:
 1. Gemini API (lightweight, highly accurate, works on Vercel)
-2. Local model (if torch + transformers are installed)
+2. Local model (torch + transformers, or an ONNX export run with onnxruntime)
 """
 
+import asyncio
+import importlib.util
 import os
 import json
 import base64
-from PIL import Image
-from io import BytesIO
+import threading
+import time
+from functools import lru_cache
+
+from batching import MicroBatcher
+from disease_db import DISEASES_BY_ID
+from executors import io_pool, cpu_pool, ExecutorSaturated
+from gemini_client import GeminiBackend, is_outage, error_reason
+from circuit_breaker import CircuitOpen, gemini_breaker
+from rate_limiter import RateLimited, gemini_limiter
+from metrics import GEMINI_ERRORS
+from hedging import hedger
+from imaging import DecodedImage, LOCAL_MODEL_MIN_EDGE
+from outbound_image import gemini_image_policy
 
 # Optional: for local inference
 _pipeline = None
 
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "")
 
+# Concurrent local predictions arriving within this window are run through the
+# pipeline as one batch. LOCAL_BATCH_MAX_SIZE=1 disables batching.
+LOCAL_BATCH_MAX_SIZE = int(os.environ.get("LOCAL_BATCH_MAX_SIZE", "4"))
+LOCAL_BATCH_WINDOW_MS = float(os.environ.get("LOCAL_BATCH_WINDOW_MS", "5"))
+
+LOCAL_MODEL_ID = os.environ.get("LOCAL_MODEL_ID", "ozair23/mobilenet_v2_1.0_224-finetuned-plantdisease")
+# Local inference engine: "torch" (transformers model), "onnx" (onnxruntime, see onnx_engine.py),
+# "synthetic" (fixed-latency stand-in for load tests, see synthetic_engine.py) or "none" (Gemini only)
+LOCAL_MODEL_ENGINE = os.environ.get("LOCAL_MODEL_ENGINE", "torch").lower()
+
+# Load the local model (and run one dummy inference) in the background at startup
+MODEL_WARMUP = os.environ.get("MODEL_WARMUP", "1") == "1"
+# After a failed load, wait this long before trying again
+LOCAL_MODEL_RETRY_SECONDS = float(os.environ.get("LOCAL_MODEL_RETRY_SECONDS", "60"))
+
+# Local backend lifecycle: unavailable | cold | loading | warm | failed
+_local_status = "cold"
+_local_error = None
+_local_failed_at = 0.0
+_model_lock = threading.Lock()
+
 # We keep the old HF mapping for local inference if still used, but Gemini will
 # output our native `disease_id` format directly based on the prompt.
 LABEL_TO_DISEASE_ID = {
@@ -68,30 +103,7 @@ LABEL_TO_DISEASE_ID = {
 # Google Gemini API
 # -------------------------------------------------------------------
 
-def get_gemini_client():
-    import google.generativeai as genai
-    genai.configure(api_key=GEMINI_API_KEY)
-    
-    # We specify JSON output format to ensure we easily parse it
-    model = genai.GenerativeModel("gemini-2.5-flash", generation_config={"response_mime_type": "application/json"})
-    return model
-
-def predict_disease_gemini(image_bytes: bytes) -> dict:
-    """
-    Call the Google Gemini API to analyze the plant image.
-    Outputs JSON matching our required format.
-    """
-    if not GEMINI_API_KEY:
-        raise Exception("GEMINI_API_KEY is not set.")
-
-    import google.generativeai as genai
-    model = get_gemini_client()
-    
-    img = Image.open(BytesIO(image_bytes))
-    if img.mode != "RGB":
-        img = img.convert("RGB")
-
-    prompt = """
+GEMINI_PROMPT = """
     You are an expert plant pathologist AI. Analyze the uploaded leaf image for diseases.
     You MUST output valid JSON only.
 
@@ -112,33 +124,93 @@ def predict_disease_gemini(image_bytes: bytes) -> dict:
     }
     """
 
-    try:
-        response = model.generate_content([prompt, img])
-        result = json.loads(response.text.strip())
-        
-        disease_id = result.get("disease_id", "healthy_leaf")
-        confidence = float(result.get("confidence", 0.92))
-        raw_label = result.get("raw_label", disease_id)
-
-        # Basic validation against our allowed IDs
-        valid_ids = [
-            "tomato_late_blight", "tomato_early_blight", "tomato_bacterial_spot", "tomato_yellow_leaf_curl",
-            "potato_early_blight", "potato_late_blight", "apple_scab", "apple_black_rot",
-            "corn_common_rust", "corn_northern_leaf_blight", "grape_black_rot", "rice_brown_spot",
-            "wheat_leaf_rust", "citrus_greening", "healthy_leaf"
+_gemini_backend = None
+
+
+def get_gemini_backend() -> GeminiBackend:
+    """The process-wide Gemini backend, created on first use (or in lifespan)."""
+    global _gemini_backend
+    if not GEMINI_API_KEY:
+        raise Exception("GEMINI_API_KEY is not set.")
+    if _gemini_backend is None:
+        _gemini_backend = GeminiBackend(GEMINI_API_KEY)
+    return _gemini_backend
+
+
+async def close_gemini_backend():
+    global _gemini_backend
+    if _gemini_backend is not None:
+        await _gemini_backend.aclose()
+        _gemini_backend = None
+
+
+def _parse_gemini_result(text: str) -> dict:
+    result = json.loads(text.strip())
+
+    disease_id = result.get("disease_id", "healthy_leaf")
+    confidence = float(result.get("confidence", 0.92))
+    raw_label = result.get("raw_label", disease_id)
+
+    # Basic validation against our allowed IDs
+    if disease_id not in DISEASES_BY_ID:
+        disease_id = "healthy_leaf"
+
+    return {
+        "disease_id": disease_id,
+        "confidence": confidence,
+        "raw_label": raw_label,
+        "all_predictions": [
+            {"label": raw_label, "confidence": confidence}
         ]
-        if disease_id not in valid_ids:
-            disease_id = "healthy_leaf"
-
-        return {
-            "disease_id": disease_id,
-            "confidence": confidence,
-            "raw_label": raw_label,
-            "all_predictions": [
-                {"label": raw_label, "confidence": confidence}
-            ]
-        }
+    }
+
+
+def _count_gemini_error(error: Exception):
+    if isinstance(error, CircuitOpen):
+        reason = "circuit_open"
+    elif isinstance(error, RateLimited):
+        reason = "rate_limited"
+    elif isinstance(error, ValueError):  # reply wasn't the JSON we asked for
+        reason = "bad_response"
+    else:
+        reason = error_reason(error)
+    GEMINI_ERRORS.inc(reason)
+
+
+def predict_disease_gemini(image: DecodedImage | bytes) -> dict:
+    """
+    Call the Google Gemini API to analyze the plant image.
+    Outputs JSON matching our required format.
+    """
+    backend = get_gemini_backend()
+    try:
+        gemini_breaker.check()
+        gemini_limiter.acquire_sync()
+        data, mime_type = gemini_image_policy.prepare(image)
+        text = gemini_breaker.call_sync(lambda: backend.generate(GEMINI_PROMPT, data, mime_type), is_outage)
+        return _parse_gemini_result(text)
+    except Exception as e:
+        _count_gemini_error(e)
+        raise Exception(f"Gemini API Error: {str(e)}")
+
+
+async def predict_disease_gemini_async(image: DecodedImage | bytes) -> dict:
+    """
+    Event-loop version of predict_disease_gemini; only the re-encode uses a
+    worker thread. Fails fast while the circuit breaker is open or the quota
+    limiter has no slot within GEMINI_QUEUE_MAX_WAIT.
+    """
+    backend = get_gemini_backend()
+    try:
+        gemini_breaker.check()
+        await gemini_limiter.acquire()
+        data, mime_type = await cpu_pool.run(gemini_image_policy.prepare, image)
+        text = await gemini_breaker.call(lambda: backend.agenerate(GEMINI_PROMPT, data, mime_type), is_outage)
+        return _parse_gemini_result(text)
+    except ExecutorSaturated:
+        raise
     except Exception as e:
+        _count_gemini_error(e)
         raise Exception(f"Gemini API Error: {str(e)}")
 
 
@@ -146,33 +218,87 @@ def predict_disease_gemini(image_bytes: bytes) -> dict:
 # Local model inference (when torch + transformers are installed)
 # -------------------------------------------------------------------
 
-def get_model():
-    """Lazy-load the HuggingFace image classification pipeline."""
-    global _pipeline
-    if _pipeline is None:
-        print("🧠 Loading AI model (first time — may take 30-60 seconds)...")
+def _load_engine():
+    if LOCAL_MODEL_ENGINE == "synthetic":
+        from synthetic_engine import SyntheticEngine
+        return SyntheticEngine(tuple(LABEL_TO_DISEASE_ID))
+    if LOCAL_MODEL_ENGINE == "onnx":
+        from onnx_engine import OnnxEngine, ONNX_MODEL_PATH
+        return OnnxEngine(ONNX_MODEL_PATH)
+    from local_engine import TorchEngine
+    return TorchEngine(LOCAL_MODEL_ID)
+
+
+def get_model(mark_warm: bool = True):
+    """
+    Lazy-load the local classifier for LOCAL_MODEL_ENGINE (once, even under
+    concurrency). Both engines share the HF pipeline call signature.
+    """
+    global _pipeline, _local_status, _local_error, _local_failed_at
+    if _pipeline is not None:
+        return _pipeline
+    with _model_lock:
+        if _pipeline is not None:
+            return _pipeline
+        if _local_status == "failed" and time.monotonic() - _local_failed_at < LOCAL_MODEL_RETRY_SECONDS:
+            raise Exception(f"Local model unavailable (last load failed: {_local_error})")
+        print(f"🧠 Loading AI model ({LOCAL_MODEL_ENGINE}, first time — may take 30-60 seconds)...")
+        _local_status = "loading"
         try:
-            from transformers import pipeline
-            _pipeline = pipeline(
-                "image-classification",
-                model="ozair23/mobilenet_v2_1.0_224-finetuned-plantdisease",
-                top_k=5,
-            )
+            _pipeline = _load_engine()
+            if mark_warm:
+                _local_status = "warm"
             print("✅ AI model loaded successfully!")
         except Exception as e:
+            _local_status, _local_error, _local_failed_at = "failed", str(e), time.monotonic()
             print(f"❌ Failed to load AI model: {e}")
             raise e
     return _pipeline
 
 
-def predict_disease_local(image_bytes: bytes) -> dict:
-    """Run local AI inference on a leaf image using HuggingFace."""
-    img = Image.open(BytesIO(image_bytes))
-    if img.mode != "RGB":
-        img = img.convert("RGB")
+def warm_up_local_model():
+    """Load the model and push one dummy image through it, so the first farmer doesn't wait."""
+    global _local_status, _local_error, _local_failed_at
+    from PIL import Image
+
+    start = time.perf_counter()
+    try:
+        get_model(mark_warm=False)(Image.new("RGB", (LOCAL_MODEL_MIN_EDGE, LOCAL_MODEL_MIN_EDGE), (34, 139, 34)))
+    except Exception as e:
+        if _local_status != "failed":
+            _local_status, _local_error, _local_failed_at = "failed", str(e), time.monotonic()
+        print(f"⚠️ Model warmup failed: {e}")
+        return
+    _local_status = "warm"
+    print(f"🔥 Local model warm in {time.perf_counter() - start:.1f}s")
+
 
+def _run_local_batch(images: list) -> list:
+    """Run one forward pass over a list of PIL images; one top-k list per image."""
     model = get_model()
-    results = model(img)
+    return model(images, batch_size=len(images))
+
+
+_local_batcher = MicroBatcher(
+    _run_local_batch,
+    max_batch_size=LOCAL_BATCH_MAX_SIZE,
+    window_ms=LOCAL_BATCH_WINDOW_MS,
+    name="local-model-batcher",
+)
+
+
+def local_batch_stats() -> dict:
+    return _local_batcher.stats()
+
+
+def predict_disease_local(image: DecodedImage | bytes) -> dict:
+    """Run local AI inference on a leaf image (torch or ONNX engine)."""
+    img = DecodedImage.ensure(image).cover(LOCAL_MODEL_MIN_EDGE)
+
+    if LOCAL_BATCH_MAX_SIZE > 1:
+        results = _local_batcher(img)
+    else:
+        results = get_model()(img)
 
     top = results[0]
     label = top["label"]
@@ -195,40 +321,118 @@ def predict_disease_local(image_bytes: bytes) -> dict:
 # Public API: auto-selects the best available method
 # -------------------------------------------------------------------
 
+@lru_cache(maxsize=None)
 def is_model_available() -> bool:
-    """Check if local model dependencies are installed."""
-    try:
-        import transformers
-        import torch
-        return True
-    except ImportError:
-        return False
+    """
+    Check if the local engine's dependencies (and model file) are present
+    (checked once per process). Packages are located, not imported: torch
+    and transformers take seconds to import, which only the model load pays.
+    """
+    if LOCAL_MODEL_ENGINE in ("synthetic", "none"):
+        return LOCAL_MODEL_ENGINE == "synthetic"
+    if LOCAL_MODEL_ENGINE == "onnx":
+        from onnx_engine import ONNX_MODEL_PATH
+        return _installed("onnxruntime") and os.path.exists(ONNX_MODEL_PATH)
+    return _installed("transformers") and _installed("torch")
+
+
+def _installed(package: str) -> bool:
+    return importlib.util.find_spec(package) is not None
 
 
 def is_gemini_api_available() -> bool:
-    """Check if google.generativeai is installed and GEMINI_API_KEY is set."""
-    try:
-        import google.generativeai
-        return bool(GEMINI_API_KEY)
-    except ImportError:
+    """Check if GEMINI_API_KEY is set (the REST client ships with the app)."""
+    return bool(GEMINI_API_KEY)
+
+
+def detect_backends() -> dict:
+    """Probe backend capabilities once at startup; returns backend_status()."""
+    global _local_status
+    if not is_model_available():
+        _local_status = "unavailable"
+    return backend_status()
+
+
+def backend_status() -> dict:
+    """Per-backend readiness: local is unavailable/cold/loading/warm/failed, gemini unavailable/ready."""
+    return {
+        "local": _local_status if is_model_available() else "unavailable",
+        "gemini": "ready" if is_gemini_api_available() else "unavailable",
+    }
+
+
+def _use_local_model() -> bool:
+    if not is_model_available():
         return False
+    if _local_status == "warm":
+        return True
+    # While the model is loading (or recently failed to), don't make farmers wait if Gemini can answer
+    return not is_gemini_api_available() or _local_status == "cold"
 
 
-def predict_disease(image_bytes: bytes) -> dict:
+def reserve_decode(image: DecodedImage):
+    """
+    Size the image's one decode for the largest view the backends that may
+    run will ask for (the local model's cover, Gemini's upload), rather than
+    for whichever view is asked for first.
+    """
+    if _use_local_model():
+        image.reserve(image.cover_size(LOCAL_MODEL_MIN_EDGE))
+    if is_gemini_api_available():
+        size = gemini_image_policy.view_size(image)
+        if size is not None:
+            image.reserve(size)
+
+
+def predict_disease(image: DecodedImage | bytes) -> dict:
     """
     Main prediction function — auto-selects the best available method:
-    1. Local HF model (if torch + transformers installed)
+    1. Local model (torch + transformers, or onnxruntime with LOCAL_MODEL_ENGINE=onnx)
     2. Google Gemini API (lightweight, highly accurate, works on Vercel)
+
+    Pass the request's DecodedImage so every backend shares one decode.
     """
+    image = DecodedImage.ensure(image)
+
     # Try local model first (optional, useful for edge/offline)
-    if is_model_available():
+    if _use_local_model():
         try:
-            return predict_disease_local(image_bytes)
+            return predict_disease_local(image)
         except Exception as e:
             print(f"⚠️ Local model failed: {e}")
 
     # Fall back to Gemini API
     if is_gemini_api_available():
-        return predict_disease_gemini(image_bytes)
+        return predict_disease_gemini(image)
 
     raise Exception("No active prediction method available. Please provide GEMINI_API_KEY.")
+
+
+class PredictionTimeout(Exception):
+    """No backend answered within the request's latency budget."""
+
+
+async def predict_disease_async(image: DecodedImage | bytes, deadline: float | None = None) -> dict:
+    """
+    Same backend order as predict_disease, for async callers, but hedged
+    (see hedging.py): when the local model is slower than usual, Gemini
+    starts too and the first valid answer wins. The local model runs on the
+    I/O pool (it waits on the micro-batcher), Gemini directly on the event
+    loop. `deadline` is an event-loop time after which PredictionTimeout is
+    raised.
+    """
+    image = DecodedImage.ensure(image)
+
+    backends = []
+    if _use_local_model():
+        backends.append(("local", lambda: io_pool.run(predict_disease_local, image)))
+    if is_gemini_api_available():
+        backends.append(("gemini", lambda: predict_disease_gemini_async(image)))
+    if not backends:
+        raise Exception("No active prediction method available. Please provide GEMINI_API_KEY.")
+
+    try:
+        async with asyncio.timeout_at(deadline):
+            return await hedger.run(*backends)
+    except TimeoutError:
+        raise PredictionTimeout("No prediction within the latency budget")
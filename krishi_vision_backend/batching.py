@@ -0,0 +1,94 @@
+"""
+KrishiVision — Micro-batching Module
+Coalesces concurrent single-image inference calls into one batched forward
+pass, so the local model does one big matmul instead of many tiny ones.
+"""
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+
+class MicroBatcher:
+    """
+    Collects items submitted from many request threads and hands them to
+    `run_batch` in groups.
+
+    A batch is dispatched as soon as it holds `max_batch_size` items, or
+    `window_ms` after its first item arrived, whichever comes first.
+    `run_batch(items)` must return one result per item, in order; each caller
+    gets its own result (or the batch's exception) back through a Future.
+    """
+
+    def __init__(self, run_batch, max_batch_size: int = 8, window_ms: float = 5.0, name: str = "micro-batcher"):
+        self.run_batch = run_batch
+        self.max_batch_size = max(1, max_batch_size)
+        self.window = max(0.0, window_ms) / 1000
+        self.name = name
+        self._queue = queue.Queue()
+        self._worker = None
+        self._start_lock = threading.Lock()
+
+        self.batches = 0
+        self.items = 0
+
+    def submit(self, item) -> Future:
+        """Queue one item; the returned Future resolves to its result."""
+        self._ensure_worker()
+        future = Future()
+        self._queue.put((item, future))
+        return future
+
+    def __call__(self, item, timeout: float | None = None):
+        """Submit and block until this item's result is ready."""
+        return self.submit(item).result(timeout)
+
+    def stats(self) -> dict:
+        return {
+            "batches": self.batches,
+            "items": self.items,
+            "avg_batch_size": round(self.items / self.batches, 2) if self.batches else 0.0,
+            "queued": self._queue.qsize(),
+        }
+
+    def _ensure_worker(self):
+        if self._worker is not None:
+            return
+        with self._start_lock:
+            if self._worker is None:
+                self._worker = threading.Thread(target=self._loop, name=self.name, daemon=True)
+                self._worker.start()
+
+    def _collect(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.max_batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            # Drop callers that cancelled while waiting in the queue
+            live = [(item, f) for item, f in batch if f.set_running_or_notify_cancel()]
+            if not live:
+                continue
+            items = [item for item, _ in live]
+            futures = [f for _, f in live]
+            try:
+                results = self.run_batch(items)
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: expected {len(items)} results, got {len(results)}")
+            except Exception as e:
+                for f in futures:
+                    f.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(items)
+            for f, result in zip(futures, results):
+                f.set_result(result)
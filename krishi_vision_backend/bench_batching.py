@@ -0,0 +1,54 @@
+"""
+Benchmark: local MobileNetV2 throughput/latency with micro-batching vs batch size 1.
+Needs torch + transformers. Usage: python bench_batching.py [concurrency] [requests]
+"""
+
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from PIL import Image
+
+from ai_model import get_model, is_model_available
+from batching import MicroBatcher
+
+CONCURRENCY = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+REQUESTS = int(sys.argv[2]) if len(sys.argv) > 2 else 128
+BATCH_SIZES = [1, 4, 8, 16]
+WINDOW_MS = 5.0
+
+
+def run(batch_size: int, images: list) -> dict:
+    model = get_model()
+    batcher = MicroBatcher(lambda imgs: model(imgs, batch_size=len(imgs)), max_batch_size=batch_size, window_ms=WINDOW_MS)
+
+    def one(img):
+        start = time.perf_counter()
+        batcher(img)
+        return time.perf_counter() - start
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=CONCURRENCY) as pool:
+        latencies = sorted(pool.map(one, images))
+    elapsed = time.perf_counter() - start
+
+    return {
+        "batch": batch_size,
+        "img/s": round(len(images) / elapsed, 1),
+        "p50 ms": round(statistics.median(latencies) * 1000, 1),
+        "p95 ms": round(latencies[int(len(latencies) * 0.95) - 1] * 1000, 1),
+        "avg batch": batcher.stats()["avg_batch_size"],
+    }
+
+
+if __name__ == "__main__":
+    if not is_model_available():
+        sys.exit("torch + transformers are required for this benchmark.")
+
+    images = [Image.new("RGB", (256, 256), color=(30 + i % 200, 120, 40)) for i in range(REQUESTS)]
+    get_model()(images[0])  # load + warm up
+
+    print(f"{REQUESTS} requests, {CONCURRENCY} concurrent callers, {WINDOW_MS} ms window")
+    for size in BATCH_SIZES:
+        print(run(size, images))
@@ -0,0 +1,111 @@
+"""
+Cold start benchmark: launches the API in a fresh process (uvicorn, as a
+serverless instance would) several times and measures how long each takes
+to answer its first request, then breaks the median run down with the
+app's own /debug/cold-start report (runtime, imports by module, lifespan
+phases).
+
+Usage: python bench_cold_start.py [--runs 5] [--path /] [--engine torch]
+                                  [--database-url URL]
+                                  [--save results.json] [--baseline results.json --tolerance 20]
+
+Without a database the app still starts (schema bootstrap fails and is
+skipped), which isolates import cost. Saved results can be compared against
+a baseline: the run exits with status 1 if the median time to first
+response regressed by more than --tolerance percent.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+import httpx
+
+from bench_load import HERE, free_port
+
+FIRST_RESPONSE_TIMEOUT = 120
+
+
+def cold_start(args) -> dict:
+    """One fresh process: seconds from spawn to the first 200 on --path, plus the app's own report."""
+    port = free_port()
+    env = dict(os.environ, LOCAL_MODEL_ENGINE=args.engine, MODEL_WARMUP="0", PYTHONUNBUFFERED="1")
+    if args.database_url:
+        env["DATABASE_URL"] = args.database_url
+    url = f"http://127.0.0.1:{port}"
+    start = time.perf_counter()
+    app = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "main:app", "--port", str(port), "--log-level", "warning"],
+        cwd=HERE, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL,
+    )
+    try:
+        deadline = start + FIRST_RESPONSE_TIMEOUT
+        while True:
+            if app.poll() is not None:
+                raise RuntimeError(f"app exited with status {app.returncode}")
+            try:
+                if httpx.get(url + args.path, timeout=FIRST_RESPONSE_TIMEOUT).status_code == 200:
+                    break
+            except httpx.TransportError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"no response after {FIRST_RESPONSE_TIMEOUT}s")
+            time.sleep(0.005)
+        elapsed = time.perf_counter() - start
+        return {"first_response_ms": round(elapsed * 1000, 1), "report": httpx.get(f"{url}/debug/cold-start", timeout=10).json()}
+    finally:
+        app.terminate()
+        try:
+            app.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            app.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--path", default="/", help="first request of each instance")
+    parser.add_argument("--engine", default=os.environ.get("LOCAL_MODEL_ENGINE", "torch"), help="LOCAL_MODEL_ENGINE for the app")
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=20, help="allowed regression, percent")
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        try:
+            run = cold_start(args)
+        except Exception as e:
+            print(f"Cold start benchmark failed: {e}")
+            sys.exit(2)
+        runs.append(run)
+        print(f"run {i + 1}: first response {run['first_response_ms']:.0f} ms")
+
+    times = [run["first_response_ms"] for run in runs]
+    median = statistics.median(times)
+    typical = min(runs, key=lambda run: abs(run["first_response_ms"] - median))["report"]
+    print(f"\nfirst response: median {median:.0f} ms, min {min(times):.0f} ms, max {max(times):.0f} ms ({args.runs} runs, engine={args.engine})")
+    print(f"median run: runtime {typical['runtime_ms']} ms, phases {typical['phases_ms']}")
+    print("slowest imports (cumulative ms):")
+    for module, ms in typical["imports_ms"].items():
+        print(f"  {module:<32}{ms:>9}")
+
+    results = {"median_ms": median, "runs_ms": times, "median_run": typical}
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["median_ms"]
+        if median > baseline * (1 + args.tolerance / 100):
+            print(f"REGRESSION first response median {baseline:.0f} -> {median:.0f} ms")
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,314 @@
+"""
+Load test: starts the API (uvicorn subprocess) with local stand-ins for
+everything external — Postgres, Gemini (fake_gemini.py) and the local model
+(LOCAL_MODEL_ENGINE=synthetic) — drives concurrent /predict, /history and
+/stats traffic and reports p50/p95/p99 latency and throughput per endpoint.
+
+Usage: python bench_load.py [--backend synthetic|gemini|both] [--concurrency 16]
+                            [--duration 30] [--mix predict=5,history=3,stats=2]
+                            [--database-url URL | --embedded-postgres]
+                            [--gemini-latency lognormal:800:0.5] [--gemini-error-rate 0.02]
+                            [--save results.json] [--baseline results.json --tolerance 20]
+
+The database is --database-url (or $DATABASE_URL); --embedded-postgres
+instead creates a throwaway cluster with initdb/pg_ctl from $PATH or
+$PG_BIN. Results can be saved and compared against a saved baseline: the
+run exits with status 1 if any endpoint's p95 or throughput regressed by
+more than --tolerance percent.
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+
+import httpx
+from PIL import Image
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+READY_TIMEOUT = 120
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def wait_for(url: str, timeout: float, process: subprocess.Popen | None = None):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process is not None and process.poll() is not None:
+            raise RuntimeError(f"{url}: process exited with status {process.returncode}")
+        try:
+            if httpx.get(url, timeout=2).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.25)
+    raise RuntimeError(f"{url} not ready after {timeout:.0f}s")
+
+
+class EmbeddedPostgres:
+    """A temporary Postgres cluster on a free port, removed on stop()."""
+
+    def __init__(self):
+        bin_dir = os.environ.get("PG_BIN") or os.path.dirname(shutil.which("pg_ctl") or "")
+        if not bin_dir or not os.path.exists(os.path.join(bin_dir, "pg_ctl")):
+            raise RuntimeError("pg_ctl not found; put it on PATH, set PG_BIN, or pass --database-url")
+        self.bin_dir = bin_dir
+        self.data_dir = tempfile.mkdtemp(prefix="krishi-bench-pg-")
+        self.port = free_port()
+        self.started = False
+
+    def _run(self, tool: str, *args):
+        result = subprocess.run([os.path.join(self.bin_dir, tool), *args], stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True)
+        if result.returncode != 0:
+            raise RuntimeError(f"{tool} failed: {result.stderr.strip()}")
+
+    def start(self) -> str:
+        self._run("initdb", "-D", self.data_dir, "-U", "postgres", "-A", "trust")
+        self._run("pg_ctl", "-D", self.data_dir, "-w", "-l", os.path.join(self.data_dir, "server.log"),
+                  "-o", f"-p {self.port} -k {self.data_dir} -c listen_addresses=127.0.0.1", "start")
+        self.started = True
+        self._run("createdb", "-h", "127.0.0.1", "-p", str(self.port), "-U", "postgres", "krishi")
+        return f"postgresql://postgres@127.0.0.1:{self.port}/krishi"
+
+    def stop(self):
+        try:
+            if self.started:
+                self._run("pg_ctl", "-D", self.data_dir, "-m", "fast", "stop")
+        finally:
+            shutil.rmtree(self.data_dir, ignore_errors=True)
+
+
+def make_images(count: int, size=(640, 480)) -> list[bytes]:
+    """Distinct JPEGs: a random base colour plus coarse noise, so neither hash nor dHash collide."""
+    images = []
+    for _ in range(count):
+        noise = Image.effect_noise((size[0] // 16, size[1] // 16), 80).resize(size).convert("RGB")
+        tint = Image.new("RGB", size, tuple(random.randrange(40, 200) for _ in range(3)))
+        buf = io.BytesIO()
+        Image.blend(noise, tint, 0.5).save(buf, "JPEG", quality=85)
+        images.append(buf.getvalue())
+    return images
+
+
+def percentile(ordered: list[float], p: float) -> float:
+    if not ordered:
+        return 0.0
+    return ordered[min(len(ordered) - 1, max(0, round(len(ordered) * p / 100) - 1))]
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies = {}  # endpoint -> successful latencies (seconds)
+        self.errors = {}  # endpoint -> {status or exception name: count}
+        self.recording = False
+
+    def record(self, endpoint: str, seconds: float, status):
+        if not self.recording:
+            return
+        self.latencies.setdefault(endpoint, [])
+        if status == 200:
+            self.latencies[endpoint].append(seconds)
+        else:
+            errors = self.errors.setdefault(endpoint, {})
+            errors[str(status)] = errors.get(str(status), 0) + 1
+
+    def report(self, elapsed: float) -> dict:
+        rows = {}
+        for endpoint in sorted(set(self.latencies) | set(self.errors)):
+            ordered = sorted(self.latencies.get(endpoint, []))
+            errors = self.errors.get(endpoint, {})
+            rows[endpoint] = {
+                "ok": len(ordered),
+                "errors": sum(errors.values()),
+                "error_breakdown": errors,
+                "rps": round(len(ordered) / elapsed, 1),
+                "p50_ms": round(percentile(ordered, 50) * 1000, 1),
+                "p95_ms": round(percentile(ordered, 95) * 1000, 1),
+                "p99_ms": round(percentile(ordered, 99) * 1000, 1),
+                "max_ms": round(ordered[-1] * 1000, 1) if ordered else 0.0,
+            }
+        return rows
+
+
+async def drive(base_url: str, token: str, args, images: list[bytes]) -> tuple[dict, float]:
+    mix = [(name, float(weight)) for name, weight in (item.split("=") for item in args.mix.split(","))]
+    names, weights = [n for n, _ in mix], [w for _, w in mix]
+    recorder = Recorder()
+    headers = {"Authorization": f"Bearer {token}"}
+    sent = []  # images already uploaded, re-sent for --repeat-rate of /predict calls
+
+    async def request(client: httpx.AsyncClient, endpoint: str):
+        if endpoint == "predict":
+            if sent and random.random() < args.repeat_rate:
+                image = random.choice(sent)
+            else:
+                image = images[len(sent) % len(images)]
+                sent.append(image)
+            return await client.post("/predict", files={"file": ("leaf.jpg", image, "image/jpeg")}, headers=headers)
+        if endpoint == "history":
+            return await client.get("/history", headers=headers)
+        return await client.get(f"/{endpoint}")
+
+    async def worker(client: httpx.AsyncClient, stop_at: float):
+        while time.monotonic() < stop_at:
+            endpoint = random.choices(names, weights)[0]
+            start = time.perf_counter()
+            try:
+                status = (await request(client, endpoint)).status_code
+            except httpx.HTTPError as e:
+                status = type(e).__name__
+            recorder.record(endpoint, time.perf_counter() - start, status)
+
+    limits = httpx.Limits(max_connections=args.concurrency, max_keepalive_connections=args.concurrency)
+    async with httpx.AsyncClient(base_url=base_url, timeout=args.request_timeout, limits=limits) as client:
+        start = time.monotonic()
+        stop_at = start + args.warmup + args.duration
+        tasks = [asyncio.create_task(worker(client, stop_at)) for _ in range(args.concurrency)]
+        await asyncio.sleep(args.warmup)
+        recorder.recording = True
+        measured_from = time.monotonic()
+        await asyncio.gather(*tasks)
+        elapsed = time.monotonic() - measured_from
+    if len(sent) > len(images):
+        print(f"note: {len(sent)} uploads cycled through {len(images)} images; raise --images to avoid prediction-cache hits")
+    return recorder.report(elapsed), elapsed
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    regressions = []
+    for endpoint, row in results.items():
+        base = baseline.get(endpoint)
+        if not base or not base["ok"]:
+            continue
+        if row["p95_ms"] > base["p95_ms"] * (1 + tolerance / 100):
+            regressions.append(f"{endpoint}: p95 {base['p95_ms']} -> {row['p95_ms']} ms")
+        if row["rps"] < base["rps"] * (1 - tolerance / 100):
+            regressions.append(f"{endpoint}: throughput {base['rps']} -> {row['rps']} req/s")
+    return regressions
+
+
+def print_table(results: dict):
+    header = f"{'endpoint':<10}{'ok':>8}{'errors':>8}{'req/s':>9}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}"
+    print(header)
+    print("-" * len(header))
+    for endpoint, r in results.items():
+        print(f"{endpoint:<10}{r['ok']:>8}{r['errors']:>8}{r['rps']:>9}{r['p50_ms']:>10}{r['p95_ms']:>10}{r['p99_ms']:>10}{r['max_ms']:>10}")
+        if r["error_breakdown"]:
+            print(f"{'':<10}errors: {r['error_breakdown']}")
+
+
+def app_env(args, database_url: str, gemini_port: int) -> dict:
+    env = dict(os.environ, DATABASE_URL=database_url, MODEL_WARMUP="1", PYTHONUNBUFFERED="1")
+    env["LOCAL_MODEL_ENGINE"] = "synthetic" if args.backend in ("synthetic", "both") else "none"
+    if args.backend in ("gemini", "both"):
+        env["GEMINI_API_KEY"] = "bench-key"
+        env["GEMINI_API_BASE"] = f"http://127.0.0.1:{gemini_port}"
+    else:
+        env["GEMINI_API_KEY"] = ""
+    return env
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backend", choices=("synthetic", "gemini", "both"), default="synthetic")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--duration", type=float, default=30, help="measured seconds")
+    parser.add_argument("--warmup", type=float, default=5, help="unmeasured seconds before the run")
+    parser.add_argument("--mix", default="predict=5,history=3,stats=2")
+    parser.add_argument("--images", type=int, default=1000, help="distinct images to upload")
+    parser.add_argument("--repeat-rate", type=float, default=0.0, help="share of uploads that resend an earlier image")
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--database-url", default=os.environ.get("DATABASE_URL"))
+    parser.add_argument("--embedded-postgres", action="store_true")
+    parser.add_argument("--gemini-latency", default="lognormal:800:0.5")
+    parser.add_argument("--gemini-error-rate", type=float, default=0.02)
+    parser.add_argument("--gemini-error-status", default="429:3,500:1,503:1")
+    parser.add_argument("--save", help="write results as JSON")
+    parser.add_argument("--baseline", help="compare against results saved with --save")
+    parser.add_argument("--tolerance", type=float, default=20, help="allowed regression, percent")
+    args = parser.parse_args()
+
+    if not args.embedded_postgres and not args.database_url:
+        parser.error("pass --database-url (or set DATABASE_URL) or --embedded-postgres")
+
+    processes = []
+    postgres = None
+    log = tempfile.NamedTemporaryFile(prefix="krishi-bench-app-", suffix=".log", delete=False)
+    try:
+        if args.embedded_postgres:
+            postgres = EmbeddedPostgres()
+            database_url = postgres.start()
+        else:
+            database_url = args.database_url
+
+        gemini_port = free_port()
+        if args.backend in ("gemini", "both"):
+            gemini = subprocess.Popen(
+                [sys.executable, os.path.join(HERE, "fake_gemini.py"), "--port", str(gemini_port),
+                 "--latency", args.gemini_latency, "--error-rate", str(args.gemini_error_rate),
+                 "--error-status", args.gemini_error_status],
+                stdout=log, stderr=subprocess.STDOUT,
+            )
+            processes.append(gemini)
+            wait_for(f"http://127.0.0.1:{gemini_port}/calls", 30, gemini)
+
+        app_port = free_port()
+        app = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(app_port), "--log-level", "warning"],
+            cwd=HERE, env=app_env(args, database_url, gemini_port), stdout=log, stderr=subprocess.STDOUT,
+        )
+        processes.append(app)
+        base_url = f"http://127.0.0.1:{app_port}"
+        wait_for(f"{base_url}/ready", READY_TIMEOUT, app)
+
+        email = f"bench-{uuid.uuid4().hex[:12]}@example.com"
+        httpx.post(f"{base_url}/api/auth/register", json={"full_name": "Bench", "email": email, "password": "bench-password"}, timeout=30).raise_for_status()
+        token = httpx.post(f"{base_url}/api/auth/login", data={"username": email, "password": "bench-password"}, timeout=30).json()["access_token"]
+
+        images = make_images(args.images)
+        print(f"backend={args.backend} concurrency={args.concurrency} duration={args.duration:g}s mix={args.mix}")
+        results, elapsed = asyncio.run(drive(base_url, token, args, images))
+        print_table(results)
+        if args.backend in ("gemini", "both"):
+            print(f"fake gemini: {httpx.get(f'http://127.0.0.1:{gemini_port}/calls').json()}")
+
+        if args.save:
+            with open(args.save, "w") as f:
+                json.dump(results, f, indent=2)
+        if args.baseline:
+            with open(args.baseline) as f:
+                regressions = compare(results, json.load(f), args.tolerance)
+            for line in regressions:
+                print(f"REGRESSION {line}")
+            if regressions:
+                sys.exit(1)
+    except Exception as e:
+        print(f"Load test failed: {e} (app log: {log.name})")
+        sys.exit(2)
+    finally:
+        for process in reversed(processes):
+            process.terminate()
+            try:
+                process.wait(timeout=15)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        if postgres is not None:
+            postgres.stop()
+        log.close()
+
+
+if __name__ == "__main__":
+    main()
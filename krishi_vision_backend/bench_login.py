@@ -0,0 +1,78 @@
+"""
+Benchmark: login throughput and event-loop responsiveness during a burst of
+bcrypt verifications — inline on the event loop vs the cpu thread pool vs the
+auth process pool. Loop lag is how late a 10 ms ticker fires while the burst
+runs, i.e. what every other request on the worker would wait.
+Usage: python bench_login.py [logins] [bcrypt rounds]
+"""
+
+import asyncio
+import statistics
+import sys
+import time
+
+from executors import auth_pool, cpu_pool
+from passwords import hash_password, verify_and_rehash
+
+LOGINS = int(sys.argv[1]) if len(sys.argv) > 1 else 32
+ROUNDS = int(sys.argv[2]) if len(sys.argv) > 2 else 12
+TICK = 0.01
+PASSWORD = "kisan-mitra-2024"
+
+
+async def inline(hashed: str):
+    return verify_and_rehash(PASSWORD, hashed, ROUNDS)
+
+
+async def burst(name: str, login, hashed: str) -> dict:
+    lags = []
+    stop = asyncio.Event()
+
+    async def ticker():
+        while not stop.is_set():
+            start = time.perf_counter()
+            await asyncio.sleep(TICK)
+            lags.append(time.perf_counter() - start - TICK)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK * 3)  # let the ticker settle
+    start = time.perf_counter()
+    results = await asyncio.gather(*(login(hashed) for _ in range(LOGINS)))
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await tick_task
+    assert all(ok for ok, _ in results)
+
+    lags.sort()
+    return {
+        "mode": name,
+        "logins/s": round(LOGINS / elapsed, 1),
+        "burst s": round(elapsed, 2),
+        "loop lag p50 ms": round(statistics.median(lags) * 1000, 1),
+        "loop lag max ms": round(lags[-1] * 1000, 1),
+    }
+
+
+async def main():
+    hashed = hash_password(PASSWORD, ROUNDS)
+    # Start the worker processes outside the measurement
+    await asyncio.gather(*(auth_pool.run(hash_password, "warm-up", 4) for _ in range(auth_pool.workers)))
+
+    print(f"{LOGINS} logins at bcrypt cost {ROUNDS}; cpu_pool={cpu_pool.workers} threads, auth_pool={auth_pool.workers} processes")
+    rows = [
+        await burst("inline", inline, hashed),
+        await burst("cpu_pool (threads)", lambda h: cpu_pool.run(verify_and_rehash, PASSWORD, h, ROUNDS), hashed),
+        await burst("auth_pool (processes)", lambda h: auth_pool.run(verify_and_rehash, PASSWORD, h, ROUNDS), hashed),
+    ]
+    for row in rows:
+        print(row)
+
+    # Rehash on login: a hash made at a lower cost gets upgraded by the same call
+    ok, upgraded = await auth_pool.run(verify_and_rehash, PASSWORD, hash_password(PASSWORD, 4), ROUNDS)
+    print({"rehash": ok and upgraded is not None, "new cost": upgraded.split("$")[2] if upgraded else None})
+    auth_pool.shutdown()
+    cpu_pool.shutdown()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
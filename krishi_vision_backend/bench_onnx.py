@@ -0,0 +1,123 @@
+"""
+Benchmark: local model engines — torch pipeline vs ONNX Runtime (fp32 and int8).
+Each engine runs in a fresh process and reports load time, per-image latency
+at batch 1 and batch 8, peak RSS, and top-1 agreement with the torch
+pipeline. Given a PlantVillage-style sample dir (<dir>/<HF label>/<image>),
+accuracy against the folder labels is reported as well.
+
+Export first with `python onnx_engine.py export <model.onnx> --int8 <calibration_dir>`.
+Usage: python bench_onnx.py <model.onnx> [sample_dir] [images]
+"""
+
+import multiprocessing
+import os
+import resource
+import statistics
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from ai_model import LABEL_TO_DISEASE_ID, LOCAL_MODEL_ID
+from onnx_engine import int8_path
+
+BATCH = 8
+
+
+def load_images(sample_dir: str | None, count: int) -> tuple[list, list]:
+    """(images, true labels or None) — synthetic noise leaves when no sample dir is given."""
+    if not sample_dir:
+        rng = np.random.default_rng(0)
+        images = [Image.fromarray(rng.integers(0, 256, (300, 400, 3), dtype=np.uint8)) for _ in range(count)]
+        return images, [None] * count
+    images, labels = [], []
+    for label in sorted(os.listdir(sample_dir)):
+        folder = os.path.join(sample_dir, label)
+        if not os.path.isdir(folder):
+            continue
+        for name in sorted(os.listdir(folder)):
+            images.append(Image.open(os.path.join(folder, name)).convert("RGB"))
+            labels.append(label)
+    return images[:count], labels[:count]
+
+
+def load_engine(engine: str, onnx_path: str):
+    if engine == "torch":
+        from transformers import pipeline
+        return pipeline("image-classification", model=LOCAL_MODEL_ID, top_k=5)
+    from onnx_engine import OnnxEngine
+    path = onnx_path if engine == "onnx" else int8_path(onnx_path)
+    return OnnxEngine(path)
+
+
+def worker(engine: str, onnx_path: str, sample_dir: str | None, count: int, out):
+    images, _ = load_images(sample_dir, count)
+    start = time.perf_counter()
+    model = load_engine(engine, onnx_path)
+    model(images[0])  # warm up
+    load_s = time.perf_counter() - start
+
+    single, labels = [], []
+    for img in images:
+        t = time.perf_counter()
+        labels.append(model(img)[0]["label"])
+        single.append(time.perf_counter() - t)
+
+    t = time.perf_counter()
+    for i in range(0, len(images), BATCH):
+        model(images[i:i + BATCH], batch_size=BATCH)
+    batched_ms = (time.perf_counter() - t) / len(images) * 1000
+
+    out.send({
+        "load_s": load_s,
+        "p50_ms": statistics.median(single) * 1000,
+        "p95_ms": sorted(single)[int(len(single) * 0.95) - 1] * 1000,
+        "batched_ms": batched_ms,
+        "rss_mb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "labels": labels,
+    })
+
+
+def run(engine: str, onnx_path: str, sample_dir: str | None, count: int) -> dict | None:
+    ctx = multiprocessing.get_context("spawn")
+    parent, child = ctx.Pipe()
+    proc = ctx.Process(target=worker, args=(engine, onnx_path, sample_dir, count, child))
+    proc.start()
+    result = parent.recv() if parent.poll(600) else None
+    proc.join()
+    return result
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python bench_onnx.py <model.onnx> [sample_dir] [images]")
+    onnx_path = sys.argv[1]
+    sample_dir = sys.argv[2] if len(sys.argv) > 2 and sys.argv[2] != "-" else None
+    count = int(sys.argv[3]) if len(sys.argv) > 3 else 64
+    _, truth = load_images(sample_dir, count)
+
+    results = {}
+    for engine in ("torch", "onnx", "onnx-int8"):
+        if engine == "onnx-int8" and not os.path.exists(int8_path(onnx_path)):
+            continue
+        results[engine] = run(engine, onnx_path, sample_dir, count)
+
+    reference = results["torch"]["labels"]
+    print(f"{len(reference)} images, model {LOCAL_MODEL_ID}\n")
+    for engine, r in results.items():
+        agree = sum(a == b for a, b in zip(r["labels"], reference)) / len(reference)
+        disease_agree = sum(LABEL_TO_DISEASE_ID.get(a) == LABEL_TO_DISEASE_ID.get(b) for a, b in zip(r["labels"], reference)) / len(reference)
+        line = {
+            "engine": engine,
+            "load s": round(r["load_s"], 2),
+            "p50 ms": round(r["p50_ms"], 2),
+            "p95 ms": round(r["p95_ms"], 2),
+            f"ms/img @{BATCH}": round(r["batched_ms"], 2),
+            "peak RSS MB": round(r["rss_mb"]),
+            "label agree": f"{agree:.1%}",
+            "disease agree": f"{disease_agree:.1%}",
+        }
+        if truth[0] is not None:
+            line["accuracy"] = f"{sum(a == b for a, b in zip(r['labels'], truth)) / len(truth):.1%}"
+        print(line)
@@ -0,0 +1,61 @@
+"""
+Benchmark: model input preprocessing — HF image processor one image at a time
+(what the transformers pipeline does) vs the batched NumPy BatchPreprocessor.
+Also reports the largest per-value difference between the two outputs.
+Needs transformers. Usage: python bench_preprocess.py [images] [batch size]
+"""
+
+import sys
+import time
+
+import numpy as np
+from PIL import Image
+
+from ai_model import LOCAL_MODEL_ID
+from imaging import LOCAL_MODEL_MIN_EDGE
+from local_engine import BatchPreprocessor
+
+IMAGES = int(sys.argv[1]) if len(sys.argv) > 1 else 256
+BATCH = int(sys.argv[2]) if len(sys.argv) > 2 else 8
+ROUNDS = 3
+
+
+def best_rate(fn, images: list) -> float:
+    best = 0.0
+    for _ in range(ROUNDS):
+        start = time.perf_counter()
+        fn(images)
+        best = max(best, len(images) / (time.perf_counter() - start))
+    return best
+
+
+if __name__ == "__main__":
+    from transformers import AutoConfig, AutoImageProcessor
+    from local_engine import processor_meta
+
+    processor = AutoImageProcessor.from_pretrained(LOCAL_MODEL_ID)
+    meta = processor_meta(processor, AutoConfig.from_pretrained(LOCAL_MODEL_ID))
+    batched = BatchPreprocessor.from_meta(meta, capacity=BATCH)
+
+    # What /predict hands the local model: DecodedImage.cover(LOCAL_MODEL_MIN_EDGE) of a 4:3 phone photo
+    rng = np.random.default_rng(0)
+    size = (LOCAL_MODEL_MIN_EDGE * 4 // 3, LOCAL_MODEL_MIN_EDGE)
+    images = [Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)) for _ in range(IMAGES)]
+
+    def hf_per_image(imgs):
+        for img in imgs:
+            processor(images=img, return_tensors="np")["pixel_values"]
+
+    def numpy_batched(imgs):
+        for i in range(0, len(imgs), BATCH):
+            batched(imgs[i:i + BATCH])
+
+    reference = processor(images=images[:BATCH], return_tensors="np")["pixel_values"]
+    diff = np.abs(batched(images[:BATCH]) - reference).max()
+
+    hf_rate = best_rate(hf_per_image, images)
+    np_rate = best_rate(numpy_batched, images)
+    print(f"{IMAGES} images of {size[0]}x{size[1]} -> {meta['crop_size']}x{meta['crop_size']}, batch {BATCH}")
+    print(f"HF processor, per image: {hf_rate:8.1f} img/s")
+    print(f"NumPy batched:           {np_rate:8.1f} img/s  ({np_rate / hf_rate:.1f}x)")
+    print(f"max |diff| vs HF output: {diff:.4f} (normalized units)")
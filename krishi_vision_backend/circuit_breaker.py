@@ -0,0 +1,134 @@
+"""
+KrishiVision — Circuit Breaker Module
+Stops calling a backend that is failing. While closed, the breaker tracks the
+outcome of the last CIRCUIT_WINDOW calls; once at least CIRCUIT_MIN_CALLS are
+on record and the failure rate reaches CIRCUIT_FAILURE_RATE it opens, and
+every call fails immediately with CircuitOpen for CIRCUIT_OPEN_SECONDS. Then
+it goes half-open: up to CIRCUIT_HALF_OPEN_PROBES trial calls go through,
+the first success closes it again and a failure re-opens it.
+"""
+
+import os
+import time
+from collections import deque
+
+CIRCUIT_WINDOW = int(os.environ.get("CIRCUIT_WINDOW", "20"))
+CIRCUIT_MIN_CALLS = int(os.environ.get("CIRCUIT_MIN_CALLS", "10"))
+CIRCUIT_FAILURE_RATE = float(os.environ.get("CIRCUIT_FAILURE_RATE", "0.5"))
+CIRCUIT_OPEN_SECONDS = float(os.environ.get("CIRCUIT_OPEN_SECONDS", "30"))
+CIRCUIT_HALF_OPEN_PROBES = int(os.environ.get("CIRCUIT_HALF_OPEN_PROBES", "1"))
+
+CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+
+class CircuitOpen(Exception):
+    """The backend's circuit is open; the call was not attempted."""
+
+
+class CircuitBreaker:
+    def __init__(self, name: str, window: int, min_calls: int, failure_rate: float, open_seconds: float, half_open_probes: int):
+        self.name = name
+        self.min_calls = min_calls
+        self.failure_rate = failure_rate
+        self.open_seconds = open_seconds
+        self.half_open_probes = max(1, half_open_probes)
+        self._outcomes = deque(maxlen=window)  # True = failure
+        self._state = CLOSED
+        self._opened_at = 0.0
+        self._probes = 0
+
+        self.rejected = 0
+        self.trips = 0
+
+    @property
+    def state(self) -> str:
+        if self._state == OPEN and time.monotonic() - self._opened_at >= self.open_seconds:
+            self._state = HALF_OPEN
+            self._probes = 0
+        return self._state
+
+    def allow(self) -> bool:
+        """Whether a call would be let through right now (doesn't reserve a probe)."""
+        state = self.state
+        return state == CLOSED or (state == HALF_OPEN and self._probes < self.half_open_probes)
+
+    def check(self):
+        """Raise CircuitOpen if a call would be rejected right now, e.g. before doing prep work for it."""
+        if not self.allow():
+            self.rejected += 1
+            retry_in = max(0.0, self.open_seconds - (time.monotonic() - self._opened_at))
+            raise CircuitOpen(f"{self.name} circuit is {self._state}; retry in {retry_in:.0f}s")
+
+    def _acquire(self):
+        self.check()
+        if self._state == HALF_OPEN:
+            self._probes += 1
+
+    def _trip(self):
+        self._state = OPEN
+        self._opened_at = time.monotonic()
+        self._outcomes.clear()
+        self.trips += 1
+        print(f"⚠️ {self.name} circuit opened for {self.open_seconds:.0f}s")
+
+    def _record(self, failed: bool, probe: bool):
+        if probe:
+            self._probes = max(0, self._probes - 1)
+            if failed:
+                self._trip()
+            elif self._state == HALF_OPEN:
+                self._state = CLOSED
+                self._outcomes.clear()
+                print(f"✅ {self.name} circuit closed")
+            return
+        if self._state != CLOSED:
+            return
+        self._outcomes.append(failed)
+        failures = sum(self._outcomes)
+        if len(self._outcomes) >= self.min_calls and failures / len(self._outcomes) >= self.failure_rate:
+            self._trip()
+
+    async def call(self, call, is_failure=lambda e: True):
+        """
+        `await call()` through the breaker. Exceptions for which
+        `is_failure(e)` is false (e.g. a bad request) pass through without
+        counting against the backend; cancellation counts as neither.
+        """
+        self._acquire()
+        probe = self._state == HALF_OPEN
+        try:
+            result = await call()
+        except Exception as e:
+            self._record(is_failure(e), probe)
+            raise
+        except BaseException:
+            if probe:
+                self._probes = max(0, self._probes - 1)
+            raise
+        self._record(False, probe)
+        return result
+
+    def call_sync(self, fn, is_failure=lambda e: True):
+        """Blocking variant of call()."""
+        self._acquire()
+        probe = self._state == HALF_OPEN
+        try:
+            result = fn()
+        except Exception as e:
+            self._record(is_failure(e), probe)
+            raise
+        self._record(False, probe)
+        return result
+
+    def stats(self) -> dict:
+        failures = sum(self._outcomes)
+        return {
+            "state": self.state,
+            "failure_rate": round(failures / len(self._outcomes), 3) if self._outcomes else 0.0,
+            "window_calls": len(self._outcomes),
+            "trips": self.trips,
+            "rejected": self.rejected,
+        }
+
+
+gemini_breaker = CircuitBreaker("gemini", CIRCUIT_WINDOW, CIRCUIT_MIN_CALLS, CIRCUIT_FAILURE_RATE, CIRCUIT_OPEN_SECONDS, CIRCUIT_HALF_OPEN_PROBES)
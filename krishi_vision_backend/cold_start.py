@@ -0,0 +1,148 @@
+"""
+KrishiVision — Cold Start Module
+Where a fresh instance's time goes before it answers its first request, so
+serverless cold starts (Vercel spins up a new process per instance) can be
+tracked across deploys:
+
+    runtime         process start -> main.py begins importing (interpreter, ASGI server)
+    imports         main.py's imports, broken down by module
+    db_pool, schema, backends
+                    lifespan startup phases
+    first_request   process start -> first response started (and its path)
+
+`track_imports()` wraps `builtins.__import__` only while main.py imports its
+dependencies; each first-time import made directly by main.py is charged its
+cumulative time (including everything it imports in turn), like the
+"cumulative" column of `python -X importtime`. Served at /debug/cold-start,
+printed once the first request is answered and exported at /metrics.
+"""
+
+import builtins
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+
+def _process_age() -> float | None:
+    """Seconds since this process was started (Linux; None elsewhere), to ~10 ms."""
+    try:
+        with open("/proc/self/stat") as f:
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return max(0.0, uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class ColdStartReport:
+    def __init__(self):
+        # perf_counter() reading taken at process start (this module's import time when unknown)
+        now = time.perf_counter()
+        age = _process_age()
+        self.runtime = age
+        self._origin = now - age if age is not None else now
+        self.imports = {}  # module -> seconds
+        self.phases = {}  # phase -> seconds
+        self.first_request = None  # (path, seconds since process start)
+        self._original_import = None
+        self._import_depth = threading.local()
+        self._imports_started = None
+
+    # ----- imports -----
+
+    def track_imports(self):
+        """Start timing main.py's direct imports (call first thing in main.py)."""
+        self._imports_started = time.perf_counter()
+        self._original_import = original = builtins.__import__
+        depth = self._import_depth
+
+        def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+            if level or getattr(depth, "value", 0) or name in sys.modules:
+                depth.value = getattr(depth, "value", 0) + 1
+                try:
+                    return original(name, globals, locals, fromlist, level)
+                finally:
+                    depth.value -= 1
+            depth.value = 1
+            start = time.perf_counter()
+            try:
+                return original(name, globals, locals, fromlist, level)
+            finally:
+                depth.value = 0
+                self.imports[name] = self.imports.get(name, 0.0) + time.perf_counter() - start
+
+        builtins.__import__ = timed_import
+
+    def imports_done(self):
+        if self._original_import is None:
+            return
+        builtins.__import__ = self._original_import
+        self._original_import = None
+        self.phases["imports"] = time.perf_counter() - self._imports_started
+
+    # ----- startup phases -----
+
+    @contextmanager
+    def phase(self, name: str):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.phases[name] = time.perf_counter() - start
+
+    def request_served(self, path: str) -> bool:
+        """Record the first response; True only for that one."""
+        if self.first_request is not None:
+            return False
+        self.first_request = (path, time.perf_counter() - self._origin)
+        return True
+
+    # ----- reporting -----
+
+    def report(self, top: int = 15) -> dict:
+        slowest = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:top]
+        return {
+            "runtime_ms": round(self.runtime * 1000, 1) if self.runtime is not None else None,
+            "phases_ms": {name: round(seconds * 1000, 1) for name, seconds in self.phases.items()},
+            "imports_ms": {name: round(seconds * 1000, 1) for name, seconds in slowest},
+            "first_request": None if self.first_request is None else {
+                "path": self.first_request[0],
+                "ms_since_process_start": round(self.first_request[1] * 1000, 1),
+            },
+        }
+
+    def summary(self) -> str:
+        parts = [f"{name} {seconds * 1000:.0f}ms" for name, seconds in self.phases.items()]
+        if self.runtime is not None:
+            parts.insert(0, f"runtime {self.runtime * 1000:.0f}ms")
+        slowest = sorted(self.imports.items(), key=lambda item: item[1], reverse=True)[:3]
+        if slowest:
+            parts.append("slowest imports: " + ", ".join(f"{name} {seconds * 1000:.0f}ms" for name, seconds in slowest))
+        if self.first_request is not None:
+            parts.append(f"first response ({self.first_request[0]}) {self.first_request[1] * 1000:.0f}ms after process start")
+        return "; ".join(parts)
+
+
+class ColdStartMiddleware:
+    """Pure ASGI middleware noting when this process starts its first HTTP response."""
+
+    def __init__(self, app, report: ColdStartReport):
+        self.app = app
+        self.report = report
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.report.first_request is not None:
+            return await self.app(scope, receive, send)
+
+        async def first_send(message):
+            if message["type"] == "http.response.start" and self.report.request_served(scope["path"]):
+                print(f"🧊 Cold start: {self.report.summary()}")
+            await send(message)
+
+        await self.app(scope, receive, first_send)
+
+
+cold_start = ColdStartReport()
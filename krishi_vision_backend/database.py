@@ -1,143 +1,448 @@
 """
 KrishiVision — Database Module
 Handles PostgreSQL (Neon) connection and scan history storage.
+
+Connections come from a thread-safe pool created in the FastAPI lifespan
+hook (or lazily on first use in scripts). Idle connections are health-checked
+before reuse and broken ones are discarded so the next checkout reconnects.
+Hot queries run as server-side prepared statements, prepared once per
+connection. A transaction-mode PgBouncer (such as Neon's pooled endpoint) can
+hand the next transaction to a different server connection, where they don't
+exist, so they are off by default when the DATABASE_URL host is a Neon
+"-pooler" one. DB_PREPARED_STATEMENTS=0/1 overrides this; set it to 0 for any
+other transaction-mode pooler.
 """
 
 import os
+import random
+import re
+import threading
+import time
+
 import psycopg2
-from psycopg2.extras import RealDictCursor
+import psycopg2.errors
+import psycopg2.extensions
+from psycopg2.extras import RealDictCursor, execute_values
+from psycopg2.pool import ThreadedConnectionPool
 from dotenv import load_dotenv
 
+from request_timing import timed
+
 load_dotenv()
 
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Connections idle longer than this get a `SELECT 1` before being handed out
+DB_POOL_HEALTHCHECK_IDLE = float(os.getenv("DB_POOL_HEALTHCHECK_IDLE", "30"))
+DB_PREPARED_STATEMENTS = os.getenv("DB_PREPARED_STATEMENTS", "0" if "-pooler" in (DATABASE_URL or "") else "1") == "1"
+# Per-disease and total-scan counters are split over this many rows so
+# concurrent writers rarely update the same one
+DB_STATS_SHARDS = int(os.getenv("DB_STATS_SHARDS", "8"))
+
 
 def get_connection():
-    """Get a database connection."""
+    """Get a standalone (unpooled) database connection."""
     return psycopg2.connect(DATABASE_URL, cursor_factory=RealDictCursor)
 
 
-def init_db():
-    """Create tables if they don't exist."""
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS scan_history (
-            id SERIAL PRIMARY KEY,
-            disease_name VARCHAR(255) NOT NULL,
-            crop VARCHAR(255) NOT NULL,
-            confidence FLOAT NOT NULL,
-            image_filename VARCHAR(255),
-            image_size_kb FLOAT,
-            scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS users (
-            id SERIAL PRIMARY KEY,
-            full_name VARCHAR(255) NOT NULL,
-            email VARCHAR(255) UNIQUE NOT NULL,
-            password_hash VARCHAR(255) NOT NULL,
-            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    cur.execute("""
-        CREATE TABLE IF NOT EXISTS disease_stats (
-            id SERIAL PRIMARY KEY,
-            disease_id VARCHAR(100) UNIQUE NOT NULL,
-            disease_name VARCHAR(255) NOT NULL,
-            crop VARCHAR(255) NOT NULL,
-            total_scans INT DEFAULT 0,
-            last_scanned TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-        );
-    """)
-
-    conn.commit()
-    cur.close()
-    conn.close()
-    print("✅ Database tables initialized successfully")
-
-
-def save_scan(disease_name: str, crop: str, confidence: float, image_filename: str = None, image_size_kb: float = None):
-    """Save a scan result to the database."""
-    conn = get_connection()
-    cur = conn.cursor()
-
-    # Insert scan record
-    cur.execute(
-        """
-        INSERT INTO scan_history (disease_name, crop, confidence, image_filename, image_size_kb)
-        VALUES (%s, %s, %s, %s, %s)
-        RETURNING id, scanned_at;
-        """,
-        (disease_name, crop, confidence, image_filename, image_size_kb),
-    )
-    scan = cur.fetchone()
-
-    # Update disease stats
-    cur.execute(
-        """
-        INSERT INTO disease_stats (disease_id, disease_name, crop, total_scans, last_scanned)
-        VALUES (%s, %s, %s, 1, CURRENT_TIMESTAMP)
-        ON CONFLICT (disease_id)
-        DO UPDATE SET total_scans = disease_stats.total_scans + 1, last_scanned = CURRENT_TIMESTAMP;
-        """,
-        (disease_name.lower().replace(" ", "_"), disease_name, crop),
-    )
-
-    conn.commit()
-    cur.close()
-    conn.close()
-
-    return scan
-
-
-def get_recent_scans(limit: int = 20):
-    """Get recent scan history."""
-    conn = get_connection()
-    cur = conn.cursor()
-
-    cur.execute(
-        """
+# ---------------------------------------------------------------------------
+# Connection Pool
+# ---------------------------------------------------------------------------
+
+class PooledConnection(psycopg2.extensions.connection):
+    """A connection that remembers its prepared statements and last use."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared = set()
+        self.last_used = time.monotonic()
+
+
+_pool = None
+_pool_lock = threading.Lock()
+_pool_slots = None
+_in_use = 0
+
+
+def init_pool(minconn: int = DB_POOL_MIN, maxconn: int = DB_POOL_MAX):
+    """Create the connection pool (idempotent)."""
+    global _pool, _pool_slots
+    with _pool_lock:
+        if _pool is None:
+            _pool = ThreadedConnectionPool(
+                minconn,
+                maxconn,
+                DATABASE_URL,
+                connection_factory=PooledConnection,
+                cursor_factory=RealDictCursor,
+            )
+            # ThreadedConnectionPool errors when exhausted; make callers wait instead
+            _pool_slots = threading.BoundedSemaphore(maxconn)
+    return _pool
+
+
+def close_pool():
+    """Close every pooled connection. Called on app shutdown."""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+
+
+def pool_stats() -> dict:
+    if _pool is None:
+        return {"initialized": False}
+    return {"initialized": True, "min": _pool.minconn, "max": _pool.maxconn, "in_use": _in_use}
+
+
+def _is_healthy(conn) -> bool:
+    if conn.closed:
+        return False
+    if time.monotonic() - conn.last_used < DB_POOL_HEALTHCHECK_IDLE:
+        return True
+    try:
+        with conn.cursor() as cur:
+            cur.execute("SELECT 1;")
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _checkout():
+    global _in_use
+    pool = _pool or init_pool()
+    if not _pool_slots.acquire(timeout=DB_POOL_TIMEOUT):
+        raise Exception("Timed out waiting for a database connection")
+    try:
+        conn = pool.getconn()
+        while not _is_healthy(conn):
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+    except Exception:
+        _pool_slots.release()
+        raise
+    with _pool_lock:
+        _in_use += 1
+    return pool, conn
+
+
+def _checkin(pool, conn, broken: bool = False):
+    global _in_use
+    with _pool_lock:
+        _in_use -= 1
+    conn.last_used = time.monotonic()
+    try:
+        pool.putconn(conn, close=broken or conn.closed)
+    finally:
+        _pool_slots.release()
+
+
+def run_in_transaction(work, retry: bool = False):
+    """
+    Run `work(cursor)` on a pooled connection and commit.
+
+    Connection-level failures discard the connection; with `retry=True`
+    (only for idempotent reads) the work is retried once on a fresh one.
+    """
+    with timed("db"):
+        return _run_in_transaction(work, 2 if retry else 1)
+
+
+def _run_in_transaction(work, attempts: int):
+    for attempt in range(attempts):
+        pool, conn = _checkout()
+        try:
+            with conn.cursor() as cur:
+                result = work(cur)
+            conn.commit()
+        except (psycopg2.OperationalError, psycopg2.InterfaceError):
+            _checkin(pool, conn, broken=True)
+            if attempt + 1 == attempts:
+                raise
+            continue
+        except Exception:
+            try:
+                conn.rollback()
+            except psycopg2.Error:
+                _checkin(pool, conn, broken=True)
+                raise
+            _checkin(pool, conn)
+            raise
+        _checkin(pool, conn)
+        return result
+
+
+# ---------------------------------------------------------------------------
+# Prepared Statements
+# ---------------------------------------------------------------------------
+
+STATEMENTS = {
+    "bump_scan_total": """
+        INSERT INTO scan_totals (shard, total)
+        VALUES (%s, %s)
+        ON CONFLICT (shard)
+        DO UPDATE SET total = scan_totals.total + EXCLUDED.total;
+    """,
+    # Both served by idx_scan_history_user_time; (scanned_at, id) keeps the order total
+    "recent_scans": """
         SELECT id, disease_name, crop, confidence, image_filename, scanned_at
         FROM scan_history
-        ORDER BY scanned_at DESC
+        WHERE user_id = %s
+        ORDER BY scanned_at DESC, id DESC
         LIMIT %s;
-        """,
-        (limit,),
-    )
-    scans = cur.fetchall()
+    """,
+    "scans_before": """
+        SELECT id, disease_name, crop, confidence, image_filename, scanned_at
+        FROM scan_history
+        WHERE user_id = %s AND (scanned_at, id) < (%s, %s)
+        ORDER BY scanned_at DESC, id DESC
+        LIMIT %s;
+    """,
+    "disease_stats": """
+        SELECT disease_id, disease_name, crop, SUM(total_scans) AS total_scans, MAX(last_scanned) AS last_scanned
+        FROM disease_stat_counters
+        GROUP BY disease_id, disease_name, crop
+        ORDER BY total_scans DESC;
+    """,
+    "count_scans": "SELECT COALESCE(SUM(total), 0) AS total FROM scan_totals;",
+    "user_by_email": "SELECT * FROM users WHERE email = %s;",
+    "insert_user": "INSERT INTO users (full_name, email, password_hash) VALUES (%s, %s, %s) RETURNING id;",
+    # Only replaces the hash that was verified, so a concurrent password change wins
+    "update_password_hash": "UPDATE users SET password_hash = %s WHERE id = %s AND password_hash = %s;",
+}
+
+
+def _to_positional(sql: str) -> str:
+    """Rewrite psycopg2 `%s` placeholders as PostgreSQL `$1, $2, ...`."""
+    counter = iter(range(1, 1000))
+    return re.sub(r"%s", lambda _: f"${next(counter)}", sql).strip().rstrip(";")
+
+
+def execute(cur, name: str, params: tuple = ()):
+    """Execute a named statement, preparing it on this connection first if needed."""
+    if not DB_PREPARED_STATEMENTS:
+        cur.execute(STATEMENTS[name], params)
+        return
+    conn = cur.connection
+    if name not in conn.prepared:
+        cur.execute(f"PREPARE {name} AS {_to_positional(STATEMENTS[name])};")
+        conn.prepared.add(name)
+    if params:
+        cur.execute(f"EXECUTE {name} ({', '.join(['%s'] * len(params))});", params)
+    else:
+        cur.execute(f"EXECUTE {name};")
 
-    cur.close()
-    conn.close()
 
-    return scans
+# ---------------------------------------------------------------------------
+# Schema & Scan History
+# ---------------------------------------------------------------------------
 
+# Bump when create_tables changes: instances already on this version skip the DDL
+SCHEMA_VERSION = 1
+# pg_advisory_xact_lock key serializing migrations from concurrent cold starts
+SCHEMA_LOCK_ID = 7402513
 
-def get_disease_stats():
-    """Get disease detection statistics."""
-    conn = get_connection()
-    cur = conn.cursor()
 
-    cur.execute("""
-        SELECT disease_name, crop, total_scans, last_scanned
-        FROM disease_stats
-        ORDER BY total_scans DESC;
-    """)
-    stats = cur.fetchall()
+def _schema_version(cur) -> int:
+    cur.execute("SELECT COALESCE(MAX(version), 0) AS version FROM schema_version;")
+    return cur.fetchone()["version"]
 
-    # Get total scan count
-    cur.execute("SELECT COUNT(*) as total FROM scan_history;")
-    total = cur.fetchone()
 
-    cur.close()
-    conn.close()
+def init_db():
+    """
+    Bring the schema up to SCHEMA_VERSION. When it is already current (every
+    start but the first after a schema change) this is a single SELECT.
+    """
+    def create_tables(cur):
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS scan_history (
+                id SERIAL PRIMARY KEY,
+                disease_name VARCHAR(255) NOT NULL,
+                crop VARCHAR(255) NOT NULL,
+                confidence FLOAT NOT NULL,
+                image_filename VARCHAR(255),
+                image_size_kb FLOAT,
+                scanned_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS users (
+                id SERIAL PRIMARY KEY,
+                full_name VARCHAR(255) NOT NULL,
+                email VARCHAR(255) UNIQUE NOT NULL,
+                password_hash VARCHAR(255) NOT NULL,
+                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS disease_stats (
+                id SERIAL PRIMARY KEY,
+                disease_id VARCHAR(100) UNIQUE NOT NULL,
+                disease_name VARCHAR(255) NOT NULL,
+                crop VARCHAR(255) NOT NULL,
+                total_scans INT DEFAULT 0,
+                last_scanned TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+
+        # Per-user history, paged by (scanned_at, id) keyset
+        cur.execute("ALTER TABLE scan_history ADD COLUMN IF NOT EXISTS user_id INT REFERENCES users(id);")
+        cur.execute("""
+            CREATE INDEX IF NOT EXISTS idx_scan_history_user_time
+            ON scan_history (user_id, scanned_at DESC, id DESC);
+        """)
+
+        # Sharded counters that replace disease_stats and COUNT(*) on scan_history
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS disease_stat_counters (
+                disease_id VARCHAR(100) NOT NULL,
+                shard SMALLINT NOT NULL,
+                disease_name VARCHAR(255) NOT NULL,
+                crop VARCHAR(255) NOT NULL,
+                total_scans BIGINT NOT NULL DEFAULT 0,
+                last_scanned TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (disease_id, shard)
+            );
+        """)
+
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS scan_totals (
+                shard SMALLINT PRIMARY KEY,
+                total BIGINT NOT NULL DEFAULT 0
+            );
+        """)
+
+        # One-time backfill from the legacy tables; both are no-ops once populated
+        cur.execute("""
+            INSERT INTO disease_stat_counters (disease_id, shard, disease_name, crop, total_scans, last_scanned)
+            SELECT disease_id, 0, disease_name, crop, total_scans, last_scanned FROM disease_stats
+            WHERE NOT EXISTS (SELECT 1 FROM disease_stat_counters);
+        """)
+        cur.execute("""
+            INSERT INTO scan_totals (shard, total)
+            SELECT 0, (SELECT COUNT(*) FROM scan_history)
+            WHERE NOT EXISTS (SELECT 1 FROM scan_totals);
+        """)
+
+    def migrate(cur) -> bool:
+        # Concurrent cold starts queue on the lock; the ones that follow see the new version and skip
+        cur.execute("SELECT pg_advisory_xact_lock(%s);", (SCHEMA_LOCK_ID,))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_version (
+                version INT PRIMARY KEY,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            );
+        """)
+        if _schema_version(cur) >= SCHEMA_VERSION:
+            return False
+        create_tables(cur)
+        cur.execute("INSERT INTO schema_version (version) VALUES (%s) ON CONFLICT DO NOTHING;", (SCHEMA_VERSION,))
+        return True
 
-    return {"total_scans": total["total"], "by_disease": stats}
+    try:
+        current = run_in_transaction(_schema_version)
+    except psycopg2.errors.UndefinedTable:
+        current = 0
+    if current < SCHEMA_VERSION and run_in_transaction(migrate):
+        print(f"✅ Database tables initialized successfully (schema v{current} -> v{SCHEMA_VERSION})")
+    else:
+        print("✅ Database schema up to date")
+
+
+def disease_id_for(disease_name: str) -> str:
+    """Key used for a disease in the stats counters."""
+    return disease_name.lower().replace(" ", "_")
+
+
+def aggregate_scans(scans: list[dict]) -> dict:
+    """Collapse scan records into {disease_id: (count, last_scanned, disease_name, crop)}."""
+    stats = {}
+    for s in scans:
+        disease_id = disease_id_for(s["disease_name"])
+        count, last, name, crop = stats.get(disease_id, (0, s["scanned_at"], s["disease_name"], s["crop"]))
+        stats[disease_id] = (count + 1, max(last, s["scanned_at"]), name, crop)
+    return stats
+
+
+def save_scans(scans: list[dict]):
+    """
+    Bulk-save buffered scan results in one transaction: a single multi-row
+    INSERT into scan_history plus pre-aggregated counter upserts on one
+    randomly chosen shard.
+    Each scan dict carries disease_name, crop, confidence, image_filename,
+    image_size_kb, scanned_at and user_id.
+    """
+    if not scans:
+        return
+
+    stats = aggregate_scans(scans)
+    shard = random.randrange(DB_STATS_SHARDS)
+
+    def insert(cur):
+        execute_values(
+            cur,
+            """
+            INSERT INTO scan_history (disease_name, crop, confidence, image_filename, image_size_kb, scanned_at, user_id)
+            VALUES %s;
+            """,
+            [
+                (s["disease_name"], s["crop"], s["confidence"], s["image_filename"], s["image_size_kb"], s["scanned_at"], s.get("user_id"))
+                for s in scans
+            ],
+            page_size=len(scans),
+        )
+        # Sorted so concurrent flushers lock counter rows in the same order
+        execute_values(
+            cur,
+            """
+            INSERT INTO disease_stat_counters (disease_id, shard, disease_name, crop, total_scans, last_scanned)
+            VALUES %s
+            ON CONFLICT (disease_id, shard)
+            DO UPDATE SET total_scans = disease_stat_counters.total_scans + EXCLUDED.total_scans,
+                          last_scanned = GREATEST(disease_stat_counters.last_scanned, EXCLUDED.last_scanned);
+            """,
+            [(disease_id, shard, name, crop, count, last) for disease_id, (count, last, name, crop) in sorted(stats.items())],
+            page_size=len(stats),
+        )
+        execute(cur, "bump_scan_total", (shard, len(scans)))
+
+    run_in_transaction(insert)
+
+
+def get_recent_scans(user_id: int, limit: int = 20, before: tuple | None = None):
+    """
+    Get one page of a user's scan history, newest first.
+    `before` is the (scanned_at, id) of the last scan on the previous page.
+    """
+    def select(cur):
+        if before is None:
+            execute(cur, "recent_scans", (user_id, limit))
+        else:
+            execute(cur, "scans_before", (user_id, before[0], before[1], limit))
+        return cur.fetchall()
+
+    return run_in_transaction(select, retry=True)
+
+
+def get_disease_stats():
+    """Get disease detection statistics."""
+    def select(cur):
+        execute(cur, "disease_stats")
+        stats = cur.fetchall()
+
+        # Get total scan count
+        execute(cur, "count_scans")
+        total = cur.fetchone()
+        return {"total_scans": total["total"], "by_disease": stats}
+
+    return run_in_transaction(select, retry=True)
 
 
 # ---------------------------------------------------------------------------
@@ -146,30 +451,28 @@ def get_disease_stats():
 
 def get_user_by_email(email: str):
     """Fetch a user by their email address."""
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT * FROM users WHERE email = %s;", (email,))
-    user = cur.fetchone()
-    cur.close()
-    conn.close()
-    return user
+    def select(cur):
+        execute(cur, "user_by_email", (email,))
+        return cur.fetchone()
+
+    return run_in_transaction(select, retry=True)
 
 
 def create_user(full_name: str, email: str, password_hash: str):
     """Create a new user."""
-    conn = get_connection()
-    cur = conn.cursor()
+    def insert(cur):
+        execute(cur, "insert_user", (full_name, email, password_hash))
+        return cur.fetchone()["id"]
+
     try:
-        cur.execute(
-            "INSERT INTO users (full_name, email, password_hash) VALUES (%s, %s, %s) RETURNING id;",
-            (full_name, email, password_hash)
-        )
-        user_id = cur.fetchone()["id"]
-        conn.commit()
-        return user_id
+        return run_in_transaction(insert)
     except psycopg2.IntegrityError:
-        conn.rollback()
         raise Exception("Email already exists")
-    finally:
-        cur.close()
-        conn.close()
+
+
+def update_password_hash(user_id: int, old_hash: str, new_hash: str):
+    """Swap a user's password hash for a rehashed one (no-op if it changed meanwhile)."""
+    def update(cur):
+        execute(cur, "update_password_hash", (new_hash, user_id, old_hash))
+
+    run_in_transaction(update, retry=True)
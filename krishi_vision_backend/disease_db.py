@@ -4,6 +4,11 @@ Based on the PlantVillage dataset's 38-class taxonomy.
 Each entry contains: disease name, crop, description, treatment, and prevention tips.
 """
 
+import hashlib
+import json
+from dataclasses import dataclass
+from types import MappingProxyType
+
 DISEASE_DATABASE = [
     {
         "id": "tomato_late_blight",
@@ -368,17 +373,93 @@ DISEASE_DATABASE = [
 ]
 
 
-def get_disease_classes() -> list[str]:
-    """Return list of all disease IDs for classification."""
-    return [d["id"] for d in DISEASE_DATABASE]
+# ---------------------------------------------------------------------------
+# Compiled Registry
+# ---------------------------------------------------------------------------
+# DISEASE_DATABASE above is the editable source. At import time it is
+# compiled into immutable records with O(1) id and crop indexes, and the
+# JSON bodies the API serves are serialized once, with ETags.
+# ---------------------------------------------------------------------------
+
+@dataclass(frozen=True, slots=True)
+class Treatment:
+    text: str
+    eco_friendly: bool
+
+
+@dataclass(frozen=True, slots=True)
+class Disease:
+    id: str
+    disease: str
+    crop: str
+    confidence_range: tuple[float, float]
+    description: str
+    treatment: tuple[Treatment, ...]
+    prevention: tuple[str, ...]
+
+    def to_summary(self) -> dict:
+        return {"id": self.id, "disease": self.disease, "crop": self.crop}
+
+    def to_detail(self) -> dict:
+        return {
+            "id": self.id,
+            "disease": self.disease,
+            "crop": self.crop,
+            "description": self.description,
+            "treatment": [{"text": t.text, "eco_friendly": t.eco_friendly} for t in self.treatment],
+            "prevention": list(self.prevention),
+        }
+
+
+@dataclass(frozen=True, slots=True)
+class CachedBody:
+    """A pre-serialized JSON response body and its strong ETag."""
+    body: bytes
+    etag: str
 
+    @classmethod
+    def of(cls, payload) -> "CachedBody":
+        body = json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+        return cls(body, '"' + hashlib.sha256(body).hexdigest()[:20] + '"')
 
-def get_disease_info(disease_id: str) -> dict | None:
+
+def _compile(entry: dict) -> Disease:
+    return Disease(
+        id=entry["id"],
+        disease=entry["disease"],
+        crop=entry["crop"],
+        confidence_range=tuple(entry["confidence_range"]),
+        description=entry["description"],
+        treatment=tuple(Treatment(t["text"], t["eco_friendly"]) for t in entry["treatment"]),
+        prevention=tuple(entry["prevention"]),
+    )
+
+
+def _list_body(diseases) -> CachedBody:
+    return CachedBody.of({"total": len(diseases), "diseases": [d.to_summary() for d in diseases]})
+
+
+DISEASES: tuple[Disease, ...] = tuple(_compile(d) for d in DISEASE_DATABASE)
+DISEASES_BY_ID: MappingProxyType = MappingProxyType({d.id: d for d in DISEASES})
+DISEASES_BY_CROP: MappingProxyType = MappingProxyType(
+    {crop: tuple(d for d in DISEASES if d.crop == crop) for crop in dict.fromkeys(d.crop for d in DISEASES)}
+)
+
+DISEASE_LIST_BODY = _list_body(DISEASES)
+DISEASE_LIST_BODY_BY_CROP: MappingProxyType = MappingProxyType(
+    {crop.lower(): _list_body(diseases) for crop, diseases in DISEASES_BY_CROP.items()}
+)
+DISEASE_DETAIL_BODY: MappingProxyType = MappingProxyType({d.id: CachedBody.of(d.to_detail()) for d in DISEASES})
+
+
+def get_disease_classes() -> tuple[str, ...]:
+    """Return all disease IDs for classification."""
+    return tuple(DISEASES_BY_ID)
+
+
+def get_disease_info(disease_id: str) -> Disease | None:
     """Look up full disease information by ID."""
-    for d in DISEASE_DATABASE:
-        if d["id"] == disease_id:
-            return d
-    return None
+    return DISEASES_BY_ID.get(disease_id)
 
 
 # ---------------------------------------------------------------------------
@@ -386,7 +467,6 @@ def get_disease_info(disease_id: str) -> dict | None:
 # ---------------------------------------------------------------------------
 
 if __name__ == "__main__":
-    import json
     from database import get_connection
 
     print("🌱 Seeding diseases into PostgreSQL...")
@@ -0,0 +1,133 @@
+"""
+KrishiVision — Executors Module
+Bounded worker pools for the blocking work done inside async route handlers,
+so one slow Gemini call or bcrypt hash never stalls the event loop.
+
+- io_pool:   network / database waits (Gemini, psycopg2, model batch queue)
+- cpu_pool:  CPU-heavy work that releases the GIL (hashing, resizing)
+- auth_pool: password hashing (bcrypt), in separate processes so a burst of
+             logins can't starve the worker process of CPU
+"""
+
+import asyncio
+import contextvars
+import functools
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+IO_POOL_SIZE = int(os.environ.get("IO_POOL_SIZE", "32"))
+IO_QUEUE_LIMIT = int(os.environ.get("IO_QUEUE_LIMIT", "64"))
+CPU_POOL_SIZE = int(os.environ.get("CPU_POOL_SIZE", str(os.cpu_count() or 2)))
+CPU_QUEUE_LIMIT = int(os.environ.get("CPU_QUEUE_LIMIT", "32"))
+# Concurrent bcrypt hashes per app process; extra logins wait up to AUTH_QUEUE_LIMIT deep
+AUTH_POOL_SIZE = int(os.environ.get("AUTH_POOL_SIZE", str(max(1, (os.cpu_count() or 2) // 2))))
+AUTH_QUEUE_LIMIT = int(os.environ.get("AUTH_QUEUE_LIMIT", "64"))
+# Set to 0 to hash on threads instead, e.g. where subprocesses aren't allowed
+AUTH_POOL_PROCESSES = os.environ.get("AUTH_POOL_PROCESSES", "1") == "1"
+
+
+class ExecutorSaturated(Exception):
+    """Raised when a pool's workers are busy and its wait queue is full."""
+
+
+class BoundedExecutor:
+    """
+    A thread (or, with `processes=True`, process) pool with a cap on queued work.
+
+    At most `workers` calls run at once and at most `queue_limit` more wait
+    for a worker; anything beyond that is rejected immediately with
+    ExecutorSaturated instead of piling up unbounded latency. Process pools
+    need picklable, module-level functions.
+    """
+
+    def __init__(self, name: str, workers: int, queue_limit: int, processes: bool = False):
+        self.name = name
+        self.workers = max(1, workers)
+        self.queue_limit = max(0, queue_limit)
+        self.processes = processes
+        self._pool = None
+        self.in_flight = 0
+
+    async def run(self, fn, *args, **kwargs):
+        """
+        Run `fn(*args, **kwargs)` on the pool and await its result. If the
+        caller is cancelled while `fn` is already running, the call keeps its
+        slot until it actually finishes.
+        """
+        if self.in_flight >= self.workers + self.queue_limit:
+            raise ExecutorSaturated(f"{self.name} pool is saturated ({self.in_flight} in flight)")
+        if self._pool is None:
+            self._pool = self._create_pool()
+        pool = self._pool
+        loop = asyncio.get_running_loop()
+        self.in_flight += 1
+        call = functools.partial(fn, *args, **kwargs)
+        if not self.processes:
+            # Carry the caller's context (e.g. request timings) into the worker thread
+            call = functools.partial(contextvars.copy_context().run, call)
+        try:
+            future = pool.submit(call)
+        except BaseException as e:
+            self.in_flight -= 1
+            if isinstance(e, BrokenProcessPool):
+                self._discard_pool(pool)
+            raise
+        future.add_done_callback(lambda _: self._release(loop))
+        try:
+            return await asyncio.wrap_future(future)
+        except BrokenProcessPool:
+            # A worker process died; the next call starts a fresh pool
+            self._discard_pool(pool)
+            raise
+
+    def _create_pool(self):
+        if self.processes:
+            # spawn, not fork: forking a process that already runs threads can deadlock the child
+            try:
+                return ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, NotImplementedError) as e:  # no POSIX semaphores, e.g. serverless runtimes
+                print(f"⚠️ {self.name} pool can't start processes, using threads: {e}")
+                self.processes = False
+        return ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=self.name)
+
+    def _release(self, loop: asyncio.AbstractEventLoop):
+        try:
+            loop.call_soon_threadsafe(self._decrement)
+        except RuntimeError:  # loop already closed at shutdown
+            self._decrement()
+
+    def _decrement(self):
+        self.in_flight -= 1
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queue_limit": self.queue_limit,
+            "in_flight": self.in_flight,
+            "queued": max(0, self.in_flight - self.workers),
+        }
+
+    def _discard_pool(self, pool):
+        if self._pool is pool:
+            self._pool = None
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def shutdown(self):
+        # The pool is recreated on the next run(), so a restarted app can reuse it
+        pool, self._pool = self._pool, None
+        if pool is not None:
+            pool.shutdown(wait=True, cancel_futures=True)
+
+
+io_pool = BoundedExecutor("io", IO_POOL_SIZE, IO_QUEUE_LIMIT)
+cpu_pool = BoundedExecutor("cpu", CPU_POOL_SIZE, CPU_QUEUE_LIMIT)
+auth_pool = BoundedExecutor("auth", AUTH_POOL_SIZE, AUTH_QUEUE_LIMIT, processes=AUTH_POOL_PROCESSES)
+
+
+def shutdown_executors():
+    """Stop accepting work and wait for running calls to finish."""
+    io_pool.shutdown()
+    cpu_pool.shutdown()
+    auth_pool.shutdown()
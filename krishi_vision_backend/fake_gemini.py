@@ -0,0 +1,89 @@
+"""
+Fake Gemini generateContent server for load tests: answers with a valid
+disease JSON after a latency drawn from a configurable distribution, and
+fails a configurable share of calls. Point the app at it with
+GEMINI_API_BASE=http://127.0.0.1:<port> and any GEMINI_API_KEY.
+
+Usage: python fake_gemini.py [--port 8765] [--latency lognormal:800:0.5]
+                             [--error-rate 0.02] [--error-status 429:3,500:1,503:1]
+                             [--hang-rate 0]
+
+Latency specs (milliseconds): fixed:<ms>, uniform:<lo>:<hi>,
+lognormal:<median>:<sigma>. Errors are returned with a status picked by
+weight from --error-status; "hangs" never answer (exercise client timeouts).
+GET /calls reports what was served.
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import random
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+DISEASE_IDS = (
+    "tomato_late_blight", "tomato_early_blight", "potato_late_blight", "apple_scab",
+    "corn_common_rust", "grape_black_rot", "healthy_leaf",
+)
+
+
+def parse_latency(spec: str):
+    """Latency spec -> zero-arg sampler returning seconds."""
+    kind, *args = spec.split(":")
+    values = [float(a) / 1000 for a in args]
+    if kind == "fixed":
+        return lambda: values[0]
+    if kind == "uniform":
+        return lambda: random.uniform(values[0], values[1])
+    if kind == "lognormal":
+        median, sigma = values[0], float(args[1])
+        return lambda: random.lognormvariate(math.log(median), sigma)
+    raise ValueError(f"Unknown latency distribution '{kind}' (fixed, uniform, lognormal)")
+
+
+def parse_weights(spec: str) -> tuple[list[int], list[float]]:
+    pairs = [item.split(":") for item in spec.split(",") if item]
+    return [int(status) for status, _ in pairs], [float(weight) for _, weight in pairs]
+
+
+def create_app(latency: str = "fixed:50", error_rate: float = 0.0, error_status: str = "429:1", hang_rate: float = 0.0) -> FastAPI:
+    app = FastAPI(title="Fake Gemini")
+    sample = parse_latency(latency)
+    statuses, weights = parse_weights(error_status)
+    calls = {"ok": 0, "errors": {}, "hangs": 0}
+
+    @app.post("/v1beta/models/{model}")
+    async def generate_content(model: str, request: Request):
+        await request.body()
+        roll = random.random()
+        if roll < hang_rate:
+            calls["hangs"] += 1
+            await asyncio.sleep(3600)
+        await asyncio.sleep(sample())
+        if roll < hang_rate + error_rate:
+            status = random.choices(statuses, weights)[0]
+            calls["errors"][status] = calls["errors"].get(status, 0) + 1
+            return JSONResponse({"error": {"code": status, "message": "fake failure"}}, status_code=status)
+        calls["ok"] += 1
+        text = json.dumps({"disease_id": random.choice(DISEASE_IDS), "confidence": round(random.uniform(0.6, 0.99), 2), "raw_label": "fake"})
+        return {"candidates": [{"content": {"parts": [{"text": text}]}}]}
+
+    @app.get("/calls")
+    async def served_calls():
+        return calls
+
+    return app
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--latency", default="lognormal:800:0.5")
+    parser.add_argument("--error-rate", type=float, default=0.02)
+    parser.add_argument("--error-status", default="429:3,500:1,503:1")
+    parser.add_argument("--hang-rate", type=float, default=0.0)
+    args = parser.parse_args()
+    uvicorn.run(create_app(args.latency, args.error_rate, args.error_status, args.hang_rate), host="127.0.0.1", port=args.port, log_level="warning")
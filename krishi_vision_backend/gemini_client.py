@@ -0,0 +1,127 @@
+"""
+KrishiVision — Gemini Client Module
+A long-lived client for the Gemini `generateContent` REST endpoint.
+
+One GeminiBackend is created at startup and reused for every scan, so TLS
+connections stay open between requests. `agenerate` runs on the event loop
+(httpx.AsyncClient), letting many in-flight Gemini calls share it without
+threads; `generate` is the blocking twin for scripts. httpx itself is
+imported with the first client, keeping it out of cold starts that never
+reach Gemini.
+
+Point GEMINI_API_BASE at a local fake server to exercise this offline.
+"""
+
+import base64
+import os
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    import httpx
+
+GEMINI_MODEL = os.environ.get("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_API_BASE = os.environ.get("GEMINI_API_BASE", "https://generativelanguage.googleapis.com")
+GEMINI_TIMEOUT = float(os.environ.get("GEMINI_TIMEOUT", "30"))
+GEMINI_MAX_CONNECTIONS = int(os.environ.get("GEMINI_MAX_CONNECTIONS", "32"))
+
+
+class GeminiError(Exception):
+    """The Gemini API returned an error or an unusable response."""
+
+    def __init__(self, message: str, status_code: int | None = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def is_outage(error: Exception) -> bool:
+    """True for errors that say Gemini itself is unhealthy (throttling, 5xx, network), not that our request was bad."""
+    if isinstance(error, GeminiError):
+        return error.status_code is None or error.status_code == 429 or error.status_code >= 500
+    import httpx
+    return isinstance(error, httpx.HTTPError)
+
+
+def error_reason(error: Exception) -> str:
+    """Short label for a failed call: the HTTP status, bad_response, timeout, transport or other."""
+    if isinstance(error, GeminiError):
+        return str(error.status_code) if error.status_code is not None else "bad_response"
+    import httpx
+    if isinstance(error, httpx.TimeoutException):
+        return "timeout"
+    if isinstance(error, httpx.HTTPError):
+        return "transport"
+    return "other"
+
+
+class GeminiBackend:
+    def __init__(
+        self,
+        api_key: str,
+        model: str = GEMINI_MODEL,
+        base_url: str = GEMINI_API_BASE,
+        timeout: float = GEMINI_TIMEOUT,
+        max_connections: int = GEMINI_MAX_CONNECTIONS,
+    ):
+        self.model = model
+        self._url = f"{base_url.rstrip('/')}/v1beta/models/{model}:generateContent"
+        self._headers = {"x-goog-api-key": api_key}
+        self._timeout = timeout
+        self._max_connections = max_connections
+        self._async_client = None
+        self._sync_client = None
+
+    def _client_options(self) -> dict:
+        import httpx
+        return {
+            "headers": self._headers,
+            "timeout": httpx.Timeout(self._timeout),
+            "limits": httpx.Limits(max_connections=self._max_connections, max_keepalive_connections=self._max_connections),
+        }
+
+    @staticmethod
+    def _body(prompt: str, image_bytes: bytes | None, mime_type: str, json_output: bool) -> dict:
+        parts = [{"text": prompt}]
+        if image_bytes is not None:
+            parts.append({"inline_data": {"mime_type": mime_type, "data": base64.b64encode(image_bytes).decode("ascii")}})
+        body = {"contents": [{"role": "user", "parts": parts}]}
+        if json_output:
+            body["generationConfig"] = {"responseMimeType": "application/json"}
+        return body
+
+    @staticmethod
+    def _text(response: "httpx.Response") -> str:
+        if response.status_code != 200:
+            try:
+                message = response.json()["error"]["message"]
+            except Exception:
+                message = response.text[:200]
+            raise GeminiError(f"HTTP {response.status_code}: {message}", response.status_code)
+        try:
+            parts = response.json()["candidates"][0]["content"]["parts"]
+            return "".join(p.get("text", "") for p in parts)
+        except (KeyError, IndexError, ValueError) as e:
+            raise GeminiError(f"Unexpected response shape: {e}")
+
+    async def agenerate(self, prompt: str, image_bytes: bytes | None = None, mime_type: str = "image/jpeg", json_output: bool = True) -> str:
+        """Send one prompt (+ optional image) and return the model's text."""
+        if self._async_client is None:
+            import httpx
+            self._async_client = httpx.AsyncClient(**self._client_options())
+        response = await self._async_client.post(self._url, json=self._body(prompt, image_bytes, mime_type, json_output))
+        return self._text(response)
+
+    def generate(self, prompt: str, image_bytes: bytes | None = None, mime_type: str = "image/jpeg", json_output: bool = True) -> str:
+        """Blocking variant of agenerate."""
+        if self._sync_client is None:
+            import httpx
+            self._sync_client = httpx.Client(**self._client_options())
+        response = self._sync_client.post(self._url, json=self._body(prompt, image_bytes, mime_type, json_output))
+        return self._text(response)
+
+    async def aclose(self):
+        if self._async_client is not None:
+            await self._async_client.aclose()
+            self._async_client = None
+        if self._sync_client is not None:
+            self._sync_client.close()
+            self._sync_client = None
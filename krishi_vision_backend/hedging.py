@@ -0,0 +1,124 @@
+"""
+KrishiVision — Hedging Module
+Hedged execution across the prediction backends. The primary backend starts
+immediately; if it hasn't answered within its own recent p-th percentile
+latency (HEDGE_PERCENTILE), the secondary starts too. The first valid answer
+wins and the other call is cancelled. If the primary fails outright, the
+secondary starts at once instead of waiting for the hedge delay.
+
+With PREDICT_HEDGE=0 the secondary only ever starts after the primary fails
+(the old sequential fallback).
+"""
+
+import asyncio
+import os
+import time
+from collections import deque
+
+from metrics import BACKEND_ERRORS, BACKEND_SECONDS, PREDICTIONS
+
+PREDICT_HEDGE = os.environ.get("PREDICT_HEDGE", "1") == "1"
+HEDGE_PERCENTILE = float(os.environ.get("HEDGE_PERCENTILE", "95"))
+# Used until a backend has HEDGE_MIN_SAMPLES successful calls on record
+HEDGE_DEFAULT_DELAY_MS = float(os.environ.get("HEDGE_DEFAULT_DELAY_MS", "1000"))
+HEDGE_MIN_DELAY_MS = float(os.environ.get("HEDGE_MIN_DELAY_MS", "50"))
+HEDGE_MIN_SAMPLES = int(os.environ.get("HEDGE_MIN_SAMPLES", "20"))
+HEDGE_WINDOW = int(os.environ.get("HEDGE_WINDOW", "200"))
+
+
+class Hedger:
+    def __init__(self, enabled: bool, percentile: float, default_delay_ms: float, min_delay_ms: float, min_samples: int, window: int):
+        self.enabled = enabled
+        self.percentile = percentile
+        self.default_delay = default_delay_ms / 1000
+        self.min_delay = min_delay_ms / 1000
+        self.min_samples = min_samples
+        self.window = window
+        self._latencies = {}  # backend name -> deque of recent successful latencies (seconds)
+
+        self.calls = 0
+        self.hedges = 0
+        self.failovers = 0
+        self.wins = {}
+
+    def record(self, name: str, seconds: float):
+        self._latencies.setdefault(name, deque(maxlen=self.window)).append(seconds)
+
+    def delay_for(self, name: str) -> float | None:
+        """Seconds to give `name` before hedging; None when hedging is off."""
+        if not self.enabled:
+            return None
+        samples = self._latencies.get(name)
+        if not samples or len(samples) < self.min_samples:
+            return self.default_delay
+        ordered = sorted(samples)
+        index = min(len(ordered) - 1, int(len(ordered) * self.percentile / 100))
+        return max(self.min_delay, ordered[index])
+
+    async def _timed(self, name: str, call):
+        start = time.perf_counter()
+        result = await call()
+        elapsed = time.perf_counter() - start
+        self.record(name, elapsed)
+        BACKEND_SECONDS.observe(elapsed, name)
+        return result
+
+    async def run(self, primary: tuple, secondary: tuple | None = None):
+        """
+        `primary` / `secondary` are (name, call) pairs where `call()` returns a
+        coroutine; the secondary's coroutine is only created if it's needed.
+        Raises the last backend error when every started backend fails.
+        """
+        self.calls += 1
+        pending = {}
+        backup = secondary
+
+        def start(backend):
+            name, call = backend
+            pending[asyncio.ensure_future(self._timed(name, call))] = name
+
+        start(primary)
+        error = None
+        try:
+            delay = self.delay_for(primary[0])
+            while pending:
+                done, _ = await asyncio.wait(pending, timeout=delay if backup else None, return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    self.hedges += 1
+                    start(backup)
+                    backup = None
+                    continue
+                for task in done:
+                    name = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        print(f"⚠️ {name} prediction failed: {e}")
+                        BACKEND_ERRORS.inc(name)
+                        error = e
+                        continue
+                    self.wins[name] = self.wins.get(name, 0) + 1
+                    PREDICTIONS.inc(name)
+                    return result
+                if backup and not pending:
+                    self.failovers += 1
+                    start(backup)
+                    backup = None
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "percentile": self.percentile,
+            "calls": self.calls,
+            "hedges": self.hedges,
+            "failovers": self.failovers,
+            "wins": dict(self.wins),
+            "delay_ms": {name: round(self.delay_for(name) * 1000, 1) for name in self._latencies} if self.enabled else None,
+        }
+
+
+hedger = Hedger(PREDICT_HEDGE, HEDGE_PERCENTILE, HEDGE_DEFAULT_DELAY_MS, HEDGE_MIN_DELAY_MS, HEDGE_MIN_SAMPLES, HEDGE_WINDOW)
@@ -0,0 +1,233 @@
+"""
+KrishiVision — Image Module
+Decodes an uploaded leaf image once per request and hands every prediction
+backend a copy at the size that backend actually consumes.
+
+PIL is imported on first use rather than with this module: it pulls in
+numpy, over 100 ms that cold starts serving anything but a scan can skip.
+"""
+
+import math
+import os
+import threading
+from functools import cache
+from io import BytesIO
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from PIL import Image
+
+# The HF MobileNetV2 processor resizes the shortest edge to 256 before its
+# 224x224 center crop, so anything larger is thrown away inside the pipeline.
+LOCAL_MODEL_MIN_EDGE = 256
+
+# Gemini scales images down to fit 3072x3072 on its side before tokenizing.
+GEMINI_MAX_EDGE = 3072
+
+# A 50 KB PNG can claim 50000x50000 pixels; refuse anything larger than this
+# before decoding (40 MP covers every phone camera we've seen).
+MAX_IMAGE_PIXELS = int(os.environ.get("MAX_IMAGE_PIXELS", "40000000"))
+
+# Pillow reports multi-picture JPEGs, which many phone cameras write, as MPO;
+# the first frame decodes like any other JPEG.
+JPEG_FORMATS = ("JPEG", "MPO")
+SUPPORTED_FORMATS = (*JPEG_FORMATS, "PNG", "WEBP")
+
+
+@cache
+def _pil():
+    """PIL.Image, imported once on first use, with the decompression bomb limit applied."""
+    from PIL import Image
+    Image.MAX_IMAGE_PIXELS = MAX_IMAGE_PIXELS
+    return Image
+
+
+class ImageTooLarge(ValueError):
+    """The image header declares more pixels than MAX_IMAGE_PIXELS."""
+
+
+def check_pixels(size: tuple[int, int] | None):
+    """Raise ImageTooLarge if `size` (None: already known to be too large) exceeds MAX_IMAGE_PIXELS."""
+    if size is None or size[0] * size[1] > MAX_IMAGE_PIXELS:
+        dims = f" ({size[0]}x{size[1]})" if size else ""
+        raise ImageTooLarge(f"Image dimensions too large{dims}. Maximum is {MAX_IMAGE_PIXELS / 1e6:.0f} megapixels.")
+
+
+def sniff(header: bytes) -> tuple[str, tuple[int, int]] | None:
+    """
+    Format and dimensions from the first bytes of an upload, without
+    decoding pixels. None when the header isn't complete (or isn't an
+    image); raises ImageTooLarge for decompression bombs.
+    """
+    Image = _pil()
+    try:
+        with Image.open(BytesIO(header)) as img:
+            fmt, size = img.format, img.size
+    except Image.DecompressionBombError:
+        check_pixels(None)
+    except Exception:
+        return None
+    check_pixels(size)
+    return fmt, size
+
+
+class DecodedImage:
+    """
+    An uploaded image, parsed once and decoded at most once per request.
+
+    Construction only reads the file header (format + dimensions) and
+    rejects decompression bombs with ImageTooLarge. Pixels are
+    decoded lazily on the first resize request; for JPEGs the decoder is asked
+    for a DCT-scaled draft that is just large enough for that request, which
+    skips most of the IDCT work on 12 MP phone photos.
+    """
+
+    def __init__(self, image_bytes: bytes):
+        self.raw = image_bytes
+        Image = _pil()
+        try:
+            self._header = Image.open(BytesIO(image_bytes))
+        except Image.DecompressionBombError:
+            check_pixels(None)
+        self.format = self._header.format or "UNKNOWN"
+        self.original_size = self._header.size
+        check_pixels(self.original_size)
+        self._base = None
+        self._variants = {}
+        self._encoded = {}
+        self._dhash = None
+        self._reserved = None  # minimum size of the first decode, see reserve()
+        self._lock = threading.Lock()
+        # Filled in by the Gemini backend when it uploads this image
+        self.outbound_report = None
+
+    @classmethod
+    def ensure(cls, image) -> "DecodedImage":
+        """Accept either raw upload bytes or an already-built DecodedImage."""
+        return image if isinstance(image, cls) else cls(image)
+
+    # ----- decoding -----
+
+    def _decode(self, min_size: tuple[int, int] | None) -> "Image.Image":
+        img = self._header if self._header is not None else _pil().open(BytesIO(self.raw))
+        self._header = None
+        if min_size is not None and img.format in JPEG_FORMATS:
+            img.draft("RGB", min_size)
+        if img.mode != "RGB":
+            img = img.convert("RGB")
+        else:
+            img.load()
+        return img
+
+    def _base_for(self, size: tuple[int, int]) -> "Image.Image":
+        """Return the decoded RGB image, guaranteed to be at least `size`."""
+        base = self._base
+        if self._reserved is not None:
+            size = (max(size[0], self._reserved[0]), max(size[1], self._reserved[1]))
+        if base is None:
+            base = self._decode(size)
+        elif base.size != self.original_size and (base.width < size[0] or base.height < size[1]):
+            # An earlier, smaller request got a reduced draft; this one needs more pixels.
+            base = self._decode(size)
+            self._variants.clear()
+        self._base = base
+        return base
+
+    def _variant(self, size: tuple[int, int]) -> "Image.Image":
+        with self._lock:
+            if size in self._variants:
+                return self._variants[size]
+            base = self._base_for(size)
+            if base.size == size:
+                out = base
+            else:
+                out = base.resize(size, _pil().LANCZOS, reducing_gap=3.0)
+            self._variants[size] = out
+            return out
+
+    def _scaled(self, scale: float) -> tuple[int, int]:
+        w, h = self.original_size
+        if scale >= 1:
+            return w, h
+        return max(1, math.ceil(w * scale)), max(1, math.ceil(h * scale))
+
+    # ----- public views -----
+
+    def fit_size(self, max_edge: int) -> tuple[int, int]:
+        """The size fit(max_edge) returns."""
+        return self._scaled(max_edge / max(self.original_size))
+
+    def cover_size(self, min_edge: int) -> tuple[int, int]:
+        """The size cover(min_edge) returns."""
+        return self._scaled(min_edge / min(self.original_size))
+
+    def reserve(self, size: tuple[int, int]):
+        """
+        Make the first decode at least `size`: call with the largest view
+        this request will need, so a small view asked for first (the dHash)
+        doesn't leave a draft too small for the later ones.
+        """
+        if self._reserved is not None:
+            size = (max(size[0], self._reserved[0]), max(size[1], self._reserved[1]))
+        self._reserved = size
+
+    def full(self) -> "Image.Image":
+        """The image at its original resolution."""
+        return self._variant(self.original_size)
+
+    def fit(self, max_edge: int) -> "Image.Image":
+        """Downscale (never upscale) so the longest edge is at most `max_edge`."""
+        return self._variant(self.fit_size(max_edge))
+
+    def cover(self, min_edge: int) -> "Image.Image":
+        """Downscale (never upscale) so the shortest edge is `min_edge`."""
+        return self._variant(self.cover_size(min_edge))
+
+    def resize(self, size: tuple[int, int]) -> "Image.Image":
+        """Exact resize to `size`, ignoring aspect ratio."""
+        return self._variant(size)
+
+    def produced_sizes(self) -> dict:
+        """What was actually decoded for this request: the base decode and each resized view."""
+        with self._lock:
+            return {
+                "decoded_size": self._base.size if self._base is not None else None,
+                "views": sorted(self._variants),
+            }
+
+    def encode(self, max_edge: int, fmt: str = "JPEG", quality: int = 85, center_crop: float = 1.0) -> bytes:
+        """
+        Re-encode for upload: keep the central `center_crop` fraction of each
+        edge, fit the longest edge within `max_edge`, save as `fmt`.
+        Results are memoized, so retries and hedged calls reuse the bytes.
+        """
+        key = (max_edge, fmt, quality, center_crop)
+        if key not in self._encoded:
+            if center_crop < 1:
+                img = self.fit(math.ceil(max_edge / center_crop))
+                w, h = img.size
+                cw, ch = round(w * center_crop), round(h * center_crop)
+                left, top = (w - cw) // 2, (h - ch) // 2
+                img = img.crop((left, top, left + cw, top + ch))
+            else:
+                img = self.fit(max_edge)
+            buf = BytesIO()
+            img.save(buf, format=fmt, quality=quality)
+            self._encoded[key] = buf.getvalue()
+        return self._encoded[key]
+
+    def dhash(self) -> int:
+        """
+        64-bit difference hash: compares horizontally adjacent pixels of a 9x8
+        grayscale thumbnail. Near-identical photos differ in only a few bits.
+        Built from the local-model view so it never forces an extra decode there.
+        """
+        if self._dhash is None:
+            thumb = self.cover(LOCAL_MODEL_MIN_EDGE).convert("L").resize((9, 8), _pil().BILINEAR)
+            px = thumb.tobytes()
+            value = 0
+            for row in range(8):
+                for col in range(8):
+                    value = (value << 1) | (px[row * 9 + col] > px[row * 9 + col + 1])
+            self._dhash = value
+        return self._dhash
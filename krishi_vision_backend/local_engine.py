@@ -0,0 +1,145 @@
+"""
+KrishiVision — Local Engine Module
+Shared plumbing for the on-box classifiers (torch here, ONNX Runtime in
+onnx_engine.py): batched NumPy preprocessing and the logits -> top-k
+labels step.
+
+BatchPreprocessor replaces the HF image processor's one-image-at-a-time
+Python path. PIL does only the geometric step (shortest-edge resize and
+center crop in a single resample); normalization and HWC -> CHW happen in
+one vectorized pass over the whole batch, into per-thread buffers that are
+reused across calls.
+"""
+
+import threading
+
+import numpy as np
+from PIL import Image
+
+PREPROCESS_BATCH_CAPACITY = 16
+
+
+def processor_meta(processor, config) -> dict:
+    """Labels + preprocessing settings from an HF image processor and model config."""
+    size = processor.size
+    crop = processor.crop_size
+    return {
+        "labels": [config.id2label[i] for i in range(config.num_labels)],
+        "resize_shortest_edge": size.get("shortest_edge", size.get("height")),
+        "crop_size": crop["height"] if getattr(processor, "do_center_crop", True) else size.get("height"),
+        "image_mean": list(processor.image_mean),
+        "image_std": list(processor.image_std),
+    }
+
+
+class BatchPreprocessor:
+    """
+    PIL images -> contiguous float32 NCHW batch, matching the HF processor
+    (bilinear resize, center crop, (x / 255 - mean) / std). The returned
+    array is a view of a reusable buffer: consume it before the same thread
+    calls again.
+    """
+
+    def __init__(self, resize_edge: int, crop_size: int, image_mean, image_std, capacity: int = PREPROCESS_BATCH_CAPACITY):
+        self.resize_edge = resize_edge
+        self.crop_size = crop_size
+        self.capacity = capacity
+        mean = np.asarray(image_mean, dtype=np.float32).reshape(3, 1, 1)
+        std = np.asarray(image_std, dtype=np.float32).reshape(3, 1, 1)
+        # (x / 255 - mean) / std  ==  x * scale + bias
+        self._scale = 1.0 / (255.0 * std)
+        self._bias = -mean / std
+        self._local = threading.local()
+
+    @classmethod
+    def from_meta(cls, meta: dict, capacity: int = PREPROCESS_BATCH_CAPACITY) -> "BatchPreprocessor":
+        return cls(meta["resize_shortest_edge"], meta["crop_size"], meta["image_mean"], meta["image_std"], capacity)
+
+    def _buffers(self, n: int) -> tuple[np.ndarray, np.ndarray]:
+        buffers = getattr(self._local, "buffers", None)
+        if buffers is None or len(buffers[0]) < n:
+            capacity = max(n, self.capacity)
+            size = self.crop_size
+            buffers = (
+                np.empty((capacity, size, size, 3), dtype=np.uint8),
+                np.empty((capacity, 3, size, size), dtype=np.float32),
+            )
+            self._local.buffers = buffers
+        return buffers
+
+    def _crop_box(self, width: int, height: int) -> tuple[float, float, float, float]:
+        """Source-pixel box that the HF resize-then-crop would keep (same integer crop offsets)."""
+        short, long = min(width, height), max(width, height)
+        resized_long = int(self.resize_edge * long / short)
+        resized_w, resized_h = (self.resize_edge, resized_long) if width <= height else (resized_long, self.resize_edge)
+        left = (resized_w - self.crop_size) // 2
+        top = (resized_h - self.crop_size) // 2
+        sx, sy = width / resized_w, height / resized_h
+        return left * sx, top * sy, (left + self.crop_size) * sx, (top + self.crop_size) * sy
+
+    def __call__(self, images: list) -> np.ndarray:
+        n = len(images)
+        pixels, batch = self._buffers(n)
+        size = (self.crop_size, self.crop_size)
+        for i, image in enumerate(images):
+            if image.mode != "RGB":
+                image = image.convert("RGB")
+            pixels[i] = image.resize(size, Image.BILINEAR, box=self._crop_box(*image.size))
+        out = batch[:n]
+        np.multiply(pixels[:n].transpose(0, 3, 1, 2), self._scale, out=out)
+        out += self._bias
+        return out
+
+
+class LocalEngine:
+    """
+    Base for local classifiers. Subclasses implement `_forward(batch)` on a
+    float32 NCHW batch. Mirrors the HF pipeline call signature:
+    `engine(image)` returns the top-k [{label, score}] list,
+    `engine(images, batch_size=n)` one list per image.
+    """
+
+    def __init__(self, meta: dict, top_k: int = 5):
+        self.labels = meta["labels"]
+        self.top_k = min(top_k, len(self.labels))
+        self.preprocess = BatchPreprocessor.from_meta(meta)
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        raise NotImplementedError
+
+    def logits(self, images: list) -> np.ndarray:
+        return self._forward(self.preprocess(images))
+
+    def probabilities(self, images: list) -> np.ndarray:
+        logits = self.logits(images)
+        logits -= logits.max(axis=1, keepdims=True)
+        np.exp(logits, out=logits)
+        logits /= logits.sum(axis=1, keepdims=True)
+        return logits
+
+    def __call__(self, images, batch_size: int | None = None):
+        single = not isinstance(images, list)
+        probs = self.probabilities([images] if single else images)
+        top = np.argsort(-probs, axis=1)[:, :self.top_k]
+        results = [
+            [{"label": self.labels[c], "score": float(row[c])} for c in classes]
+            for row, classes in zip(probs, top)
+        ]
+        return results[0] if single else results
+
+
+class TorchEngine(LocalEngine):
+    """The HF checkpoint run directly with torch, fed by BatchPreprocessor."""
+
+    def __init__(self, model_id: str, top_k: int = 5):
+        import torch
+        from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+        self._torch = torch
+        self._model = AutoModelForImageClassification.from_pretrained(model_id).eval()
+        meta = processor_meta(AutoImageProcessor.from_pretrained(model_id), self._model.config)
+        super().__init__(meta, top_k)
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        with self._torch.inference_mode():
+            return self._model(pixel_values=self._torch.from_numpy(batch)).logits.numpy()
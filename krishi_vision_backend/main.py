@@ -3,24 +3,68 @@ KrishiVision Backend — FastAPI
 Crop disease detection API with image upload and AI prediction.
 """
 
+from cold_start import cold_start, ColdStartMiddleware
+cold_start.track_imports()
+
+import asyncio
+import base64
+import functools
 import hashlib
+import json
 import random
 import os
-from io import BytesIO
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI, File, UploadFile, HTTPException, Depends
+from fastapi import FastAPI, File, UploadFile, HTTPException, Depends, Header, Request
+from fastapi.responses import FileResponse, JSONResponse, Response, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.security import OAuth2PasswordBearer, OAuth2PasswordRequestForm
 from pydantic import BaseModel
 from datetime import datetime, timedelta, timezone
-import jwt
-import bcrypt
-from PIL import Image
 
-from disease_db import DISEASE_DATABASE, get_disease_info
-from database import init_db, save_scan, get_recent_scans, get_disease_stats, create_user, get_user_by_email
-from ai_model import predict_disease as ai_predict, is_model_available, is_gemini_api_available
+from imaging import DecodedImage, ImageTooLarge
+from executors import io_pool, cpu_pool, auth_pool, shutdown_executors, ExecutorSaturated
+from prediction_cache import prediction_cache
+from scan_writer import scan_writer
+from outbound_image import gemini_image_policy
+from uploads import (
+    UploadLimitMiddleware,
+    read_image_upload,
+    check_content_type,
+    is_zip,
+    list_zip_images,
+    read_zip_image,
+    MAX_UPLOAD_BYTES,
+    BATCH_MAX_UPLOAD_BYTES,
+    MULTIPART_OVERHEAD,
+    INVALID_IMAGE_DETAIL,
+)
+from stats_snapshot import stats_snapshot
+from disease_db import DISEASES, DISEASE_LIST_BODY, DISEASE_LIST_BODY_BY_CROP, DISEASE_DETAIL_BODY, CachedBody, get_disease_info
+from database import init_pool, close_pool, pool_stats, init_db, get_recent_scans, create_user, get_user_by_email, update_password_hash, save_scans
+from passwords import hash_password, verify_and_rehash
+from ai_model import (
+    predict_disease_async as ai_predict,
+    reserve_decode,
+    is_gemini_api_available,
+    get_gemini_backend,
+    close_gemini_backend,
+    detect_backends,
+    backend_status,
+    warm_up_local_model,
+    local_batch_stats,
+    MODEL_WARMUP,
+    LOCAL_MODEL_ENGINE,
+)
+from hedging import hedger
+from circuit_breaker import gemini_breaker
+from rate_limiter import gemini_limiter
+from scan_jobs import scan_jobs
+from metrics import registry, CONTENT_TYPE as METRICS_CONTENT_TYPE, PREDICTIONS, SCAN_FLUSH_SECONDS
+from request_timing import ServerTimingMiddleware, stage
+from profiler import profiler
+
+cold_start.imports_done()
 
 # ---------------------------------------------------------------------------
 # App Setup
@@ -28,12 +72,35 @@ from ai_model import predict_disease as ai_predict, is_model_available, is_gemin
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    # Startup: initialize database tables
+    # Startup: open the connection pool and initialize database tables
     try:
-        init_db()
+        with cold_start.phase("db_pool"):
+            await io_pool.run(init_pool)
+        with cold_start.phase("schema"):
+            await io_pool.run(init_db)
     except Exception as e:
         print(f"⚠️ Database init failed (will still work without DB): {e}")
+    await scan_writer.start()
+    await scan_jobs.start()
+    # Detect backends once; warm the local model in the background so /ready can gate traffic
+    with cold_start.phase("backends"):
+        backends = await io_pool.run(detect_backends)
+    print(f"🔎 Prediction backends: {backends}")
+    warmup = None
+    if backends["local"] == "cold" and MODEL_WARMUP:
+        warmup = asyncio.create_task(io_pool.run(warm_up_local_model))
+    # One Gemini client per process, so connections are reused across scans
+    if is_gemini_api_available():
+        get_gemini_backend()
     yield
+    # Shutdown: flush buffered scans, let in-flight blocking calls finish, then drain the pool
+    if warmup is not None and not warmup.done():
+        warmup.cancel()
+    await scan_jobs.stop()
+    await scan_writer.stop()
+    await close_gemini_backend()
+    shutdown_executors()
+    close_pool()
 
 app = FastAPI(
     title="KrishiVision API",
@@ -42,6 +109,17 @@ app = FastAPI(
     lifespan=lifespan,
 )
 
+# Refuse oversized upload bodies before they are buffered. Added before CORS so
+# CORS wraps it: the browser can only read the 413's detail with CORS headers
+app.add_middleware(
+    UploadLimitMiddleware,
+    limits={
+        "/predict": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+        "/predict/batch": BATCH_MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+        "/scans": MAX_UPLOAD_BYTES + MULTIPART_OVERHEAD,
+    },
+)
+
 # CORS — allow frontend origins (local + deployed)
 app.add_middleware(
     CORSMiddleware,
@@ -54,39 +132,51 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "X-Profile-Id"],
 )
 
+# Outside the app's own middleware, so `total` in Server-Timing covers everything up to the response start
+app.add_middleware(ServerTimingMiddleware)
+# Only watches for this process's first response; a no-op pass-through after that
+app.add_middleware(ColdStartMiddleware, report=cold_start)
+
+# Scans flushed by this process show up in /stats without a database round-trip
+scan_writer.add_listener(stats_snapshot.apply)
+
+
+@app.exception_handler(ExecutorSaturated)
+async def executor_saturated_handler(request: Request, exc: ExecutorSaturated):
+    # Shed load quickly instead of queueing without bound
+    return JSONResponse(status_code=503, content={"detail": "Server is busy. Please retry shortly."}, headers={"Retry-After": "1"})
+
+
 # ---------------------------------------------------------------------------
 # Image Preprocessing
 # ---------------------------------------------------------------------------
 
-TARGET_SIZE = (224, 224)
-
-
-def preprocess_image(image_bytes: bytes) -> dict:
+def preprocess_image(image_bytes: bytes) -> DecodedImage:
     """
-    Validate and preprocess the uploaded image.
-    Returns metadata about the preprocessed image.
+    Validate the uploaded image and wrap it for the prediction backends.
+    Only the header is parsed here; pixels are decoded once, lazily, at the
+    largest size the enabled backends need (see reserve_decode).
     """
     try:
-        img = Image.open(BytesIO(image_bytes))
+        return DecodedImage(image_bytes)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
     except Exception:
-        raise HTTPException(status_code=400, detail="Invalid image file. Please upload a JPG or PNG image.")
+        raise HTTPException(status_code=400, detail=INVALID_IMAGE_DETAIL)
 
-    # Convert to RGB if needed (handles RGBA, grayscale, etc.)
-    if img.mode != "RGB":
-        img = img.convert("RGB")
-
-    original_size = img.size
-
-    # Resize to model input size
-    img_resized = img.resize(TARGET_SIZE, Image.LANCZOS)
 
+def describe_image(image: DecodedImage) -> dict:
+    """Metadata about the uploaded image, returned with every prediction."""
     return {
-        "original_width": original_size[0],
-        "original_height": original_size[1],
-        "preprocessed_size": TARGET_SIZE,
-        "format": img.format or "UNKNOWN",
+        "original_width": image.original_size[0],
+        "original_height": image.original_size[1],
+        "format": image.format,
+        # Sizes actually produced: the one decode, then the dHash / local model / Gemini upload views
+        **image.produced_sizes(),
+        "outbound": image.outbound_report,
     }
 
 
@@ -97,7 +187,12 @@ def preprocess_image(image_bytes: bytes) -> dict:
 # falls back to mock prediction otherwise.
 # ---------------------------------------------------------------------------
 
-USE_REAL_MODEL = is_model_available() or is_gemini_api_available()
+# End-to-end budget for /predict; when it runs out, the scan falls back to the mock prediction
+PREDICT_LATENCY_BUDGET_MS = float(os.environ.get("PREDICT_LATENCY_BUDGET_MS", "15000"))
+
+# /predict/batch: images per request, and how many are analysed at once
+BATCH_MAX_IMAGES = int(os.environ.get("BATCH_MAX_IMAGES", "50"))
+BATCH_CONCURRENCY = int(os.environ.get("BATCH_CONCURRENCY", "4"))
 
 
 def mock_predict(image_bytes: bytes) -> dict:
@@ -108,11 +203,11 @@ def mock_predict(image_bytes: bytes) -> dict:
     image_hash = hashlib.md5(image_bytes).hexdigest()
     seed = int(image_hash[:8], 16)
     rng = random.Random(seed)
-    disease_entry = rng.choice(DISEASE_DATABASE)
-    low, high = disease_entry["confidence_range"]
+    disease_entry = rng.choice(DISEASES)
+    low, high = disease_entry.confidence_range
     confidence = round(rng.uniform(low, high), 4)
     return {
-        "disease_id": disease_entry["id"],
+        "disease_id": disease_entry.id,
         "confidence": confidence,
     }
 
@@ -127,15 +222,8 @@ ACCESS_TOKEN_EXPIRE_DAYS = 7
 
 oauth2_scheme = OAuth2PasswordBearer(tokenUrl="/api/auth/login")
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return bcrypt.checkpw(plain_password.encode('utf-8'), hashed_password.encode('utf-8'))
-
-def get_password_hash(password: str) -> str:
-    salt = bcrypt.gensalt()
-    hashed = bcrypt.hashpw(password.encode('utf-8'), salt)
-    return hashed.decode('utf-8')
-
 def create_access_token(data: dict, expires_delta: timedelta | None = None):
+    import jwt  # on first use, not on every cold start
     to_encode = data.copy()
     if expires_delta:
         expire = datetime.now(timezone.utc) + expires_delta
@@ -145,15 +233,21 @@ def create_access_token(data: dict, expires_delta: timedelta | None = None):
     encoded_jwt = jwt.encode(to_encode, SECRET_KEY, algorithm=ALGORITHM)
     return encoded_jwt
 
-def verify_token(token: str = Depends(oauth2_scheme)):
+def decode_token(token: str = Depends(oauth2_scheme)) -> dict:
+    import jwt
     try:
         payload = jwt.decode(token, SECRET_KEY, algorithms=[ALGORITHM])
-        email: str = payload.get("sub")
-        if email is None:
-            raise HTTPException(status_code=401, detail="Invalid auth token")
-        return email
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid or expired token")
+    if payload.get("sub") is None:
+        raise HTTPException(status_code=401, detail="Invalid auth token")
+    return payload
+
+def current_user_id(payload: dict = Depends(decode_token)) -> int:
+    user_id = payload.get("id")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid auth token")
+    return user_id
 
 class RegisterRequest(BaseModel):
     full_name: str
@@ -162,23 +256,36 @@ class RegisterRequest(BaseModel):
 
 @app.post("/api/auth/register")
 async def register_user(req: RegisterRequest):
-    if get_user_by_email(req.email):
+    if await io_pool.run(get_user_by_email, req.email):
         raise HTTPException(status_code=400, detail="Email already registered")
     
-    hashed_pwd = get_password_hash(req.password)
+    hashed_pwd = await auth_pool.run(hash_password, req.password)
     try:
-        user_id = create_user(req.full_name, req.email, hashed_pwd)
+        user_id = await io_pool.run(create_user, req.full_name, req.email, hashed_pwd)
         token = create_access_token({"sub": req.email, "id": user_id})
         return {"success": True, "token": token, "email": req.email, "full_name": req.full_name}
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/api/auth/login")
 async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
-    user = get_user_by_email(form_data.username)
-    if not user or not verify_password(form_data.password, user["password_hash"]):
+    user = await io_pool.run(get_user_by_email, form_data.username)
+    if not user:
         raise HTTPException(status_code=401, detail="Incorrect email or password")
-    
+    ok, new_hash = await auth_pool.run(verify_and_rehash, form_data.password, user["password_hash"])
+    if not ok:
+        raise HTTPException(status_code=401, detail="Incorrect email or password")
+    if new_hash is not None:
+        # BCRYPT_ROUNDS changed since this hash was made: upgrade it, but never fail the login over it
+        try:
+            await io_pool.run(update_password_hash, user["id"], user["password_hash"], new_hash)
+        except ExecutorSaturated:
+            pass
+        except Exception as e:
+            print(f"⚠️ Password rehash for user {user['id']} failed: {e}")
+
     token = create_access_token({"sub": user["email"], "id": user["id"]})
     return {"access_token": token, "token_type": "bearer", "success": True, "email": user["email"], "full_name": user["full_name"]}
 
@@ -190,126 +297,466 @@ async def login_user(form_data: OAuth2PasswordRequestForm = Depends()):
 @app.get("/")
 async def root():
     """Health check endpoint."""
-    model_label = "real (Local HF)" if is_model_available() else ("gemini-2.5-flash" if is_gemini_api_available() else "mock (demo)")
+    backends = backend_status()
+    model_label = f"real (Local {LOCAL_MODEL_ENGINE})" if backends["local"] != "unavailable" else ("gemini-2.5-flash" if backends["gemini"] != "unavailable" else "mock (demo)")
     return {
         "status": "healthy",
         "service": "KrishiVision API",
         "version": "1.0.0",
         "ai_model": model_label,
+        "backends": backends,
+        "prediction_cache": prediction_cache.stats(),
+        "scan_writer": scan_writer.stats(),
+        "gemini_image_policy": gemini_image_policy.stats(),
+        "hedging": hedger.stats(),
+        "gemini_circuit": gemini_breaker.stats(),
+        "gemini_rate_limit": gemini_limiter.stats(),
+        "scan_jobs": scan_jobs.stats(),
+        "profiler": profiler.stats(),
+        "cold_start": cold_start.report(top=5),
         "message": "Upload a leaf image to /predict to detect crop diseases.",
     }
 
 
-@app.get("/diseases")
-async def list_diseases():
-    """List all diseases the model can detect."""
-    return {
-        "total": len(DISEASE_DATABASE),
-        "diseases": [
-            {
-                "id": d["id"],
-                "disease": d["disease"],
-                "crop": d["crop"],
-            }
-            for d in DISEASE_DATABASE
-        ],
-    }
+DISEASE_CACHE_CONTROL = "public, max-age=300"
 
 
-@app.post("/predict")
-async def predict_disease(file: UploadFile = File(...), current_user: str = Depends(verify_token)):
-    """
-    Upload a leaf image and get disease prediction.
-
-    Accepts: JPG, PNG, WEBP images
-    Returns: Disease name, confidence, description, treatment, prevention
-    """
-    # Validate file type
-    allowed_types = {"image/jpeg", "image/png", "image/webp", "image/jpg"}
-    if file.content_type and file.content_type not in allowed_types:
-        raise HTTPException(
-            status_code=400,
-            detail=f"Invalid file type '{file.content_type}'. Please upload a JPG, PNG, or WEBP image.",
-        )
+def cached_json_response(request: Request, cached: CachedBody) -> Response:
+    """Serve a pre-serialized body, or 304 when the client already has it."""
+    headers = {"ETag": cached.etag, "Cache-Control": DISEASE_CACHE_CONTROL}
+    if cached.etag in request.headers.get("if-none-match", ""):
+        return Response(status_code=304, headers=headers)
+    return Response(content=cached.body, media_type="application/json", headers=headers)
 
-    # Read image bytes
-    image_bytes = await file.read()
 
-    if len(image_bytes) == 0:
-        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+@app.get("/ready")
+async def readiness():
+    """
+    Readiness probe for load balancers: 200 once a real backend can answer
+    without a cold start (or when running in mock-only demo mode), else 503.
+    """
+    backends = backend_status()
+    warm = backends["local"] == "warm" or backends["gemini"] == "ready"
+    demo_only = backends["local"] == "unavailable" and backends["gemini"] == "unavailable"
+    ready = warm or demo_only
+    return JSONResponse(status_code=200 if ready else 503, content={"ready": ready, "backends": backends})
+
+
+@registry.collector
+def runtime_metrics():
+    """Gauges and running totals read from the components' own stats at scrape time."""
+    startup = cold_start.report()
+    yield "krishi_cold_start_phase_seconds", "gauge", "Startup phases of this process: runtime, imports, db_pool, schema, backends.", [
+        ({"phase": name}, ms / 1000) for name, ms in {"runtime": startup["runtime_ms"], **startup["phases_ms"]}.items() if ms is not None
+    ]
+    if startup["first_request"] is not None:
+        yield "krishi_cold_start_first_response_seconds", "gauge", "Process start to this process's first HTTP response.", [({}, startup["first_request"]["ms_since_process_start"] / 1000)]
+
+    pools = {"io": io_pool.stats(), "cpu": cpu_pool.stats(), "auth": auth_pool.stats()}
+    yield "krishi_executor_in_flight", "gauge", "Calls running or waiting on a worker pool.", [({"pool": n}, p["in_flight"]) for n, p in pools.items()]
+    yield "krishi_executor_queued", "gauge", "Calls waiting for a free worker.", [({"pool": n}, p["queued"]) for n, p in pools.items()]
+    yield "krishi_executor_capacity", "gauge", "Workers plus queue slots before calls are shed.", [({"pool": n}, p["workers"] + p["queue_limit"]) for n, p in pools.items()]
+
+    db = pool_stats()
+    if db["initialized"]:
+        yield "krishi_db_pool_connections_in_use", "gauge", "Database connections checked out.", [({}, db["in_use"])]
+        yield "krishi_db_pool_connections_max", "gauge", "Database connection pool size.", [({}, db["max"])]
+
+    writer = scan_writer.stats()
+    yield "krishi_scan_writer_buffer_depth", "gauge", "Scans waiting to be written.", [({}, writer["buffer_depth"])]
+    yield "krishi_scan_writer_flushed_total", "counter", "Scans written by the background writer.", [({}, writer["flushed"])]
+    yield "krishi_scan_writer_failed_flushes_total", "counter", "Background writes that failed.", [({}, writer["failed_flushes"])]
+    yield "krishi_scan_writer_dropped_total", "counter", "Scans dropped because the buffer was full.", [({}, writer["dropped"])]
+
+    jobs = scan_jobs.stats()
+    yield "krishi_scan_jobs_queued", "gauge", "Scan jobs waiting for a worker.", [({}, jobs["queued"])]
+    yield "krishi_scan_jobs_retained", "gauge", "Scan jobs held in memory (pending or finished within the TTL).", [({}, jobs["retained"])]
+    yield "krishi_local_batch_queue_depth", "gauge", "Images waiting for the local model micro-batcher.", [({}, local_batch_stats()["queued"])]
+
+    cache = prediction_cache.stats()
+    yield "krishi_prediction_cache_entries", "gauge", "Predictions held in the memory cache.", [({}, cache["entries"])]
+    yield "krishi_prediction_cache_hits_total", "counter", "Prediction cache hits by tier.", [({"tier": t}, n) for t, n in cache["hits"].items()]
+    yield "krishi_prediction_cache_misses_total", "counter", "Prediction cache misses.", [({}, cache["misses"])]
+
+    hedging = hedger.stats()
+    yield "krishi_hedged_calls_total", "counter", "Predictions where the secondary backend was started after the hedge delay.", [({}, hedging["hedges"])]
+    yield "krishi_failovers_total", "counter", "Predictions where the secondary backend was started after the primary failed.", [({}, hedging["failovers"])]
+
+    states = ("closed", "open", "half_open")
+    circuit = gemini_breaker.stats()
+    yield "krishi_gemini_circuit_state", "gauge", "1 for the Gemini circuit breaker's current state.", [({"state": st}, int(circuit["state"] == st)) for st in states]
+    yield "krishi_gemini_circuit_trips_total", "counter", "Times the Gemini circuit opened.", [({}, circuit["trips"])]
+    limiter = gemini_limiter.stats()
+    if limiter["enabled"]:
+        yield "krishi_gemini_rate_limit_tokens", "gauge", "Tokens left in the Gemini quota bucket.", [({}, limiter["tokens"])]
+
+    backends = backend_status()
+    yield "krishi_backend_status", "gauge", "1 for each backend's current status.", [({"backend": name, "status": status}, 1) for name, status in backends.items()]
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text-format metrics."""
+    return Response(content=registry.render(), media_type=METRICS_CONTENT_TYPE)
 
-    if len(image_bytes) > 10 * 1024 * 1024:  # 10 MB limit
-        raise HTTPException(status_code=400, detail="Image too large. Maximum size is 10 MB.")
 
-    # Preprocess the image
-    image_info = preprocess_image(image_bytes)
+@app.get("/diseases")
+async def list_diseases(request: Request, crop: str | None = None):
+    """List all diseases the model can detect, optionally for one crop."""
+    if crop is None:
+        return cached_json_response(request, DISEASE_LIST_BODY)
+    cached = DISEASE_LIST_BODY_BY_CROP.get(crop.lower())
+    if cached is None:
+        raise HTTPException(status_code=404, detail=f"No diseases recorded for crop '{crop}'.")
+    return cached_json_response(request, cached)
+
+
+@app.get("/diseases/{disease_id}")
+async def disease_details(request: Request, disease_id: str):
+    """Full description, treatment and prevention for one disease."""
+    cached = DISEASE_DETAIL_BODY.get(disease_id)
+    if cached is None:
+        raise HTTPException(status_code=404, detail="Disease not found.")
+    return cached_json_response(request, cached)
+
+
+async def analyze_image(image_bytes: bytes, filename: str | None, user_id: int | None, deadline: float) -> tuple[dict, dict]:
+    """
+    Run one uploaded image through the cache / AI / mock chain.
+    Returns (response body, scan record to persist).
+    """
+    # Preprocess the image (decoded once, shared by every backend below)
+    with stage("preprocess"):
+        image = preprocess_image(image_bytes)
+        # The dHash needs only a small view; decode once at the size the backends need
+        reserve_decode(image)
+        try:
+            phash = await cpu_pool.run(image.dhash)
+        except ExecutorSaturated:
+            raise
+        except Exception:
+            raise HTTPException(status_code=400, detail=INVALID_IMAGE_DETAIL)
 
     # Run prediction — AI model (local or HF API) with mock fallback
+    # Identical and near-identical re-uploads are served from the prediction cache
     model_type = "mock"
     ai_error = None
-    try:
-        prediction = ai_predict(image_bytes)
-        model_type = "ai"
-    except Exception as e:
-        ai_error = str(e)
-        print(f"⚠️ AI inference failed, falling back to mock: {e}")
-        prediction = mock_predict(image_bytes)
+    cache_source = None
+    with stage("predict"):
+        try:
+            prediction, cache_source = await prediction_cache.get_or_compute(
+                prediction_cache.key_for(image_bytes),
+                lambda: ai_predict(image, deadline=deadline),
+                phash=phash,
+            )
+            model_type = "ai"
+        except ExecutorSaturated:
+            raise
+        except Exception as e:
+            ai_error = str(e)
+            print(f"⚠️ AI inference failed, falling back to mock: {e}")
+            prediction = mock_predict(image_bytes)
+    # Fresh AI answers are counted per backend by the hedger
+    if model_type == "mock":
+        PREDICTIONS.inc("mock")
+    elif cache_source is not None:
+        PREDICTIONS.inc("cache")
+
+    image_info = describe_image(image)
 
     # Fetch disease details
-    disease_data = get_disease_info(prediction["disease_id"])
+    with stage("disease_info"):
+        disease_data = get_disease_info(prediction["disease_id"])
     if disease_data is None:
         raise HTTPException(status_code=500, detail="Internal error: disease not found in database.")
 
-    # Save scan to database
-    try:
-        image_size_kb = round(len(image_bytes) / 1024, 2)
-        save_scan(
-            disease_name=disease_data["disease"],
-            crop=disease_data["crop"],
-            confidence=prediction["confidence"],
-            image_filename=file.filename,
-            image_size_kb=image_size_kb,
-        )
-    except Exception as e:
-        print(f"⚠️ Failed to save scan to DB: {e}")
+    scan = {
+        "disease_name": disease_data.disease,
+        "crop": disease_data.crop,
+        "confidence": prediction["confidence"],
+        "image_filename": filename,
+        "image_size_kb": round(len(image_bytes) / 1024, 2),
+        "scanned_at": datetime.now(timezone.utc).replace(tzinfo=None),
+        "user_id": user_id,
+    }
 
     # Build response
-    return {
+    body = {
         "success": True,
         "prediction": {
-            "disease": disease_data["disease"],
-            "crop": disease_data["crop"],
+            "disease": disease_data.disease,
+            "crop": disease_data.crop,
             "confidence": prediction["confidence"],
             "confidence_percent": round(prediction["confidence"] * 100, 1),
         },
         "details": {
-            "description": disease_data["description"],
-            "treatment": disease_data["treatment"],
-            "prevention": disease_data["prevention"],
+            "description": disease_data.description,
+            "treatment": [{"text": t.text, "eco_friendly": t.eco_friendly} for t in disease_data.treatment],
+            "prevention": list(disease_data.prevention),
         },
         "image_info": image_info,
         "model_type": model_type,
         "ai_error": ai_error,
+        "cache_hit": cache_source is not None,
+        "cache_source": cache_source,
     }
+    return body, scan
+
+
+@app.post("/predict")
+async def predict_disease(
+    response: Response,
+    file: UploadFile = File(...),
+    user_id: int = Depends(current_user_id),
+    x_profile: str | None = Header(None),
+):
+    """
+    Upload a leaf image and get disease prediction.
+
+    Accepts: JPG, PNG, WEBP images
+    Returns: Disease name, confidence, description, treatment, prevention
+
+    Sampled requests, or ones sending `X-Profile: <PROFILE_TOKEN>`, are
+    profiled; the response then carries `X-Profile-Id`.
+    """
+    profile = profiler.start("predict") if profiler.should_profile(x_profile) else None
+    try:
+        deadline = asyncio.get_running_loop().time() + PREDICT_LATENCY_BUDGET_MS / 1000
+
+        # Validate file type
+        check_content_type(file.content_type)
+
+        # Read image bytes in chunks; oversized files and decompression bombs stop at the header
+        with stage("upload_read"):
+            image_bytes = await read_image_upload(file)
+
+        body, scan = await analyze_image(image_bytes, file.filename, user_id, deadline)
+
+        # Queue the scan for the background batch writer
+        with stage("save"):
+            scan_writer.submit(scan)
+        return body
+    finally:
+        if profile is not None:
+            profiler.stop(profile)
+            try:
+                response.headers["X-Profile-Id"] = await io_pool.run(profiler.save, profile)
+            except Exception as e:
+                print(f"⚠️ Could not save profile {profile.id}: {e}")
+
+
+async def save_batch_scans(scans: list[dict]) -> str:
+    """Persist a whole batch in one write; on failure hand it to the buffered writer to retry."""
+    if not scans:
+        return "none"
+    try:
+        with SCAN_FLUSH_SECONDS.time():
+            await io_pool.run(save_scans, scans)
+    except Exception as e:
+        print(f"⚠️ Bulk save of {len(scans)} batch scans failed, queueing for retry: {e}")
+        for scan in scans:
+            scan_writer.submit(scan)
+        return "queued"
+    stats_snapshot.apply(scans)
+    return "saved"
+
+
+BATCH_REQUEST_SCHEMA = {
+    "requestBody": {
+        "required": True,
+        "content": {
+            "multipart/form-data": {
+                "schema": {
+                    "type": "object",
+                    "required": ["files"],
+                    "properties": {"files": {"type": "array", "items": {"type": "string", "format": "binary"}}},
+                }
+            }
+        },
+    }
+}
+
+
+@app.post("/predict/batch", openapi_extra=BATCH_REQUEST_SCHEMA)
+async def predict_batch(request: Request, user_id: int = Depends(current_user_id)):
+    """
+    Upload many leaf images — as repeated `files` fields, zip archives of
+    images, or both — and get one prediction per image.
+
+    Streams newline-delimited JSON: one line per image as soon as it is
+    ready (completion order, tagged with its `index` and `filename`), then a
+    summary line. All scans are saved in one bulk write at the end.
+    The form is parsed here rather than by FastAPI so the uploaded files
+    stay open while results stream.
+    """
+    form = await request.form(max_files=BATCH_MAX_IMAGES, max_fields=BATCH_MAX_IMAGES)
+    archives = []
+    try:
+        items = []  # (filename, zero-arg coroutine factory returning the image bytes)
+        for upload in form.getlist("files"):
+            if isinstance(upload, str):
+                raise HTTPException(status_code=400, detail="Field 'files' must contain file uploads.")
+            if is_zip(upload):
+                archive, entries = await io_pool.run(list_zip_images, upload.file)
+                archives.append(archive)
+                items.extend((info.filename, functools.partial(cpu_pool.run, read_zip_image, archive, info)) for info in entries)
+            else:
+                def read(upload=upload):
+                    check_content_type(upload.content_type)
+                    return read_image_upload(upload)
+                items.append((upload.filename, read))
+
+        if not items:
+            raise HTTPException(status_code=400, detail="No images found. Upload JPG, PNG or WEBP files, or a zip of them.")
+        if len(items) > BATCH_MAX_IMAGES:
+            raise HTTPException(status_code=400, detail=f"Too many images ({len(items)}). Maximum is {BATCH_MAX_IMAGES} per batch.")
+    except BaseException:
+        for archive in archives:
+            archive.close()
+        await form.close()
+        raise
+
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def analyze(index: int, filename: str, read) -> tuple[dict, dict | None]:
+        async with semaphore:
+            deadline = asyncio.get_running_loop().time() + PREDICT_LATENCY_BUDGET_MS / 1000
+            try:
+                body, scan = await analyze_image(await read(), filename, user_id, deadline)
+            except HTTPException as e:
+                return {"index": index, "filename": filename, "success": False, "error": e.detail}, None
+            except ExecutorSaturated:
+                return {"index": index, "filename": filename, "success": False, "error": "Server is busy. Please retry shortly."}, None
+        return {"index": index, "filename": filename, **body}, scan
+
+    async def stream():
+        tasks = [asyncio.ensure_future(analyze(i, name, read)) for i, (name, read) in enumerate(items)]
+        unsaved = []  # finished scans not yet handed to save_batch_scans
+        succeeded = failed = 0
+        try:
+            for next_done in asyncio.as_completed(tasks):
+                line, scan = await next_done
+                if scan is None:
+                    failed += 1
+                else:
+                    succeeded += 1
+                    unsaved.append(scan)
+                yield json.dumps(line) + "\n"
+            # Taken before awaiting: a disconnect during the save must not save it again below
+            scans, unsaved = unsaved, []
+            saved = await save_batch_scans(scans)
+            yield json.dumps({"done": True, "total": len(items), "succeeded": succeeded, "failed": failed, "scans": saved}) + "\n"
+        finally:
+            # Client went away mid-stream: stop outstanding work, keep what finished
+            for task in tasks:
+                task.cancel()
+            await save_batch_scans(unsaved)
+            for archive in archives:
+                archive.close()
+            await form.close()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
+
+
+# Seconds between SSE keep-alive comments, so proxies don't drop an idle stream
+SCAN_EVENTS_HEARTBEAT = float(os.environ.get("SCAN_EVENTS_HEARTBEAT", "15"))
+
+
+def scan_job_body(job) -> dict:
+    return {
+        **job.to_dict(),
+        "status_url": f"/scans/{job.id}",
+        "events_url": f"/scans/{job.id}/events",
+    }
+
+
+@app.post("/scans", status_code=202)
+async def submit_scan(response: Response, file: UploadFile = File(...), user_id: int = Depends(current_user_id)):
+    """
+    Queue a leaf image for prediction and return a job id immediately.
+
+    Poll `GET /scans/{job_id}` or subscribe to `GET /scans/{job_id}/events`
+    for the result. Re-submitting the same image while its job is queued,
+    running or still retained returns that job (200) instead of starting a
+    new one, so retries after a dropped connection are free.
+    """
+    check_content_type(file.content_type)
+    with stage("upload_read"):
+        image_bytes = await read_image_upload(file)
+    filename = file.filename
+
+    async def run() -> dict:
+        # The latency budget starts when a worker picks the job up, not while it waits in the queue
+        deadline = asyncio.get_running_loop().time() + PREDICT_LATENCY_BUDGET_MS / 1000
+        body, scan = await analyze_image(image_bytes, filename, user_id, deadline)
+        with stage("save"):
+            scan_writer.submit(scan)
+        return body
+
+    job, created = scan_jobs.submit(user_id, prediction_cache.key_for(image_bytes), run, len(image_bytes))
+    if not created:
+        response.status_code = 200
+    return scan_job_body(job)
+
+
+def get_scan_job(job_id: str, user_id: int):
+    job = scan_jobs.get(job_id, user_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Scan job not found or expired.")
+    return job
+
+
+@app.get("/scans/{job_id}")
+async def scan_job_status(job_id: str, user_id: int = Depends(current_user_id)):
+    """Status of a submitted scan; `result` holds the /predict response once `status` is `done`."""
+    return scan_job_body(get_scan_job(job_id, user_id))
+
+
+@app.get("/scans/{job_id}/events")
+async def scan_job_events(job_id: str, user_id: int = Depends(current_user_id)):
+    """
+    Server-sent events for a submitted scan: a `status` event on every state
+    change and a final `result` event (status `done` or `failed`), after
+    which the stream closes.
+    """
+    job = get_scan_job(job_id, user_id)
+
+    def event(name: str, data: dict) -> str:
+        return f"event: {name}\ndata: {json.dumps(data)}\n\n"
+
+    async def stream():
+        sent = None
+        while not job.finished:
+            if job.status != sent:
+                sent = job.status
+                yield event("status", {"job_id": job.id, "status": sent})
+            elif not await job.wait_for_update(SCAN_EVENTS_HEARTBEAT):
+                yield ": keep-alive\n\n"
+        yield event("result", scan_job_body(job))
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
 
 
 @app.get("/debug/test-ai")
 async def test_ai_api():
     """Debug endpoint: test Gemini API directly."""
     try:
-        from ai_model import is_gemini_api_available, get_gemini_client, GEMINI_API_KEY
+        from ai_model import is_gemini_api_available, get_gemini_backend, GEMINI_API_KEY
         if not is_gemini_api_available():
              return {"status": "error", "message": "Gemini API dependencies or key missing", "has_key": bool(GEMINI_API_KEY)}
              
-        import google.generativeai as genai
-        debug_model = genai.GenerativeModel("gemini-2.5-flash")
-        response = debug_model.generate_content("Hello! Are you working?")
+        backend = get_gemini_backend()
+        response = await backend.agenerate("Hello! Are you working?", json_output=False)
         
         return {
             "status": "success",
-            "model": "gemini-2.5-flash",
+            "model": backend.model,
             "has_key": bool(GEMINI_API_KEY),
-            "response": response.text
+            "response": response
         }
     except Exception as e:
         return {
@@ -318,14 +765,65 @@ async def test_ai_api():
         }
 
 
+@app.get("/debug/cold-start")
+async def cold_start_report():
+    """Where this process's startup time went: runtime, imports by module, lifespan phases, first response."""
+    return cold_start.report()
+
+
+def require_profile_token(x_profile: str | None = Header(None)):
+    if not profiler.token:
+        raise HTTPException(status_code=404, detail="Profiling is not enabled.")
+    if not profiler.authorized(x_profile):
+        raise HTTPException(status_code=403, detail="A valid X-Profile token is required.")
+
+
+@app.get("/debug/profiles", dependencies=[Depends(require_profile_token)])
+async def list_profiles():
+    """Saved /predict profiles, newest first (needs `X-Profile: <PROFILE_TOKEN>`)."""
+    return {"profiles": await io_pool.run(profiler.list), **profiler.stats()}
+
+
+@app.get("/debug/profiles/{profile_id}", dependencies=[Depends(require_profile_token)])
+async def download_profile(profile_id: str):
+    """One profile in collapsed-stack format, ready for flamegraph.pl or speedscope."""
+    path = await io_pool.run(profiler.path_for, profile_id)
+    if path is None:
+        raise HTTPException(status_code=404, detail="Profile not found or rotated out.")
+    return FileResponse(path, media_type="text/plain", filename=f"predict-{profile_id}.folded")
+
+
+HISTORY_MAX_PAGE_SIZE = 100
+
+
+def encode_history_cursor(scan: dict) -> str:
+    raw = f"{scan['scanned_at'].isoformat()}|{scan['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_history_cursor(cursor: str) -> tuple:
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode()
+        scanned_at, scan_id = raw.rsplit("|", 1)
+        return datetime.fromisoformat(scanned_at), int(scan_id)
+    except Exception:
+        raise HTTPException(status_code=400, detail="Invalid history cursor.")
+
+
 @app.get("/history")
-async def scan_history(limit: int = 20, current_user: str = Depends(verify_token)):
-    """Get recent scan history from the database."""
+async def scan_history(limit: int = 20, before: str | None = None, user_id: int = Depends(current_user_id)):
+    """
+    Get the current user's scan history, newest first.
+    Pass the previous page's `next_cursor` as `?before=` to get the next page.
+    """
+    limit = max(1, min(limit, HISTORY_MAX_PAGE_SIZE))
+    keyset = decode_history_cursor(before) if before else None
     try:
-        scans = get_recent_scans(limit)
+        scans = await io_pool.run(get_recent_scans, user_id, limit, keyset)
         return {
             "success": True,
             "total": len(scans),
+            "next_cursor": encode_history_cursor(scans[-1]) if len(scans) == limit else None,
             "scans": [
                 {
                     "id": s["id"],
@@ -338,15 +836,17 @@ async def scan_history(limit: int = 20, current_user: str = Depends(verify_token
                 for s in scans
             ],
         }
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
 
 
 @app.get("/stats")
 async def disease_statistics():
-    """Get disease detection statistics."""
+    """Get disease detection statistics (served from the in-memory snapshot)."""
     try:
-        stats = get_disease_stats()
+        stats = await stats_snapshot.get()
         return {
             "success": True,
             "total_scans": stats["total_scans"],
@@ -360,5 +860,7 @@ async def disease_statistics():
                 for s in stats["by_disease"]
             ],
         }
+    except ExecutorSaturated:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Database error: {str(e)}")
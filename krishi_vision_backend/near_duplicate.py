@@ -0,0 +1,141 @@
+"""
+KrishiVision — Near-Duplicate Index Module
+Finds recent predictions for images that *look* the same as a new upload,
+even when the bytes differ (the same leaf shot twice a few seconds apart).
+
+Uploads are keyed by their 64-bit dHash (see imaging.DecodedImage.dhash)
+and indexed in a BK-tree, which answers "anything within Hamming distance
+d?" without comparing against every stored hash.
+"""
+
+import os
+import time
+from collections import OrderedDict
+
+NEAR_DUPLICATE_MAX_DISTANCE = int(os.environ.get("NEAR_DUPLICATE_MAX_DISTANCE", "5"))
+NEAR_DUPLICATE_SIZE = int(os.environ.get("NEAR_DUPLICATE_SIZE", "4096"))
+NEAR_DUPLICATE_TTL = float(os.environ.get("NEAR_DUPLICATE_TTL", "900"))
+
+
+def hamming(a: int, b: int) -> int:
+    return (a ^ b).bit_count()
+
+
+def is_informative(phash: int) -> bool:
+    """Flat or near-flat images hash to (almost) all zeros/ones and would match each other."""
+    return 8 <= phash.bit_count() <= 56
+
+
+class BKTree:
+    """Burkhard–Keller tree over 64-bit hashes under Hamming distance."""
+
+    def __init__(self):
+        self._root = None  # [hash, {distance: child}]
+        self.size = 0
+
+    def add(self, phash: int):
+        if self._root is None:
+            self._root = [phash, {}]
+            self.size = 1
+            return
+        node = self._root
+        while True:
+            d = hamming(phash, node[0])
+            if d == 0:
+                return
+            child = node[1].get(d)
+            if child is None:
+                node[1][d] = [phash, {}]
+                self.size += 1
+                return
+            node = child
+
+    def search(self, phash: int, max_distance: int) -> list[tuple[int, int]]:
+        """Return (distance, hash) for every stored hash within `max_distance`, nearest first."""
+        found = []
+        stack = [self._root] if self._root is not None else []
+        while stack:
+            node = stack.pop()
+            d = hamming(phash, node[0])
+            if d <= max_distance:
+                found.append((d, node[0]))
+            # Triangle inequality: only subtrees at distance d±max_distance can match
+            for edge, child in node[1].items():
+                if d - max_distance <= edge <= d + max_distance:
+                    stack.append(child)
+        found.sort()
+        return found
+
+
+class NearDuplicateIndex:
+    """
+    Bounded, TTL'd map of dHash -> prediction with BK-tree lookup.
+    Evicted hashes stay in the tree until the next rebuild and are skipped
+    on lookup; the tree is rebuilt once it is twice the size of the live set.
+    """
+
+    def __init__(self, max_distance: int, max_entries: int, ttl_seconds: float):
+        self.max_distance = max_distance
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self._entries = OrderedDict()  # phash -> (stored_at, prediction)
+        self._tree = BKTree()
+
+        self.lookups = 0
+        self.hits = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_distance >= 0
+
+    def _alive(self, phash: int, now: float) -> bool:
+        entry = self._entries.get(phash)
+        if entry is None:
+            return False
+        if now - entry[0] > self.ttl:
+            del self._entries[phash]
+            return False
+        return True
+
+    def lookup(self, phash: int) -> tuple[dict, int] | None:
+        """Return (prediction, distance) for the closest live match, if any."""
+        if not self.enabled or not is_informative(phash):
+            return None
+        self.lookups += 1
+        now = time.time()
+        for distance, candidate in self._tree.search(phash, self.max_distance):
+            if self._alive(candidate, now):
+                self._entries.move_to_end(candidate)
+                self.hits += 1
+                return self._entries[candidate][1], distance
+        return None
+
+    def add(self, phash: int, prediction: dict):
+        if not self.enabled or not is_informative(phash):
+            return
+        self._entries[phash] = (time.time(), prediction)
+        self._entries.move_to_end(phash)
+        self._tree.add(phash)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        if self._tree.size > 2 * max(len(self._entries), 1):
+            self._rebuild()
+
+    def _rebuild(self):
+        tree = BKTree()
+        for phash in self._entries:
+            tree.add(phash)
+        self._tree = tree
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_distance": self.max_distance,
+            "lookups": self.lookups,
+            "hits": self.hits,
+            "misses": self.lookups - self.hits,
+            "hit_rate": round(self.hits / self.lookups, 4) if self.lookups else 0.0,
+        }
+
+
+near_duplicate_index = NearDuplicateIndex(NEAR_DUPLICATE_MAX_DISTANCE, NEAR_DUPLICATE_SIZE, NEAR_DUPLICATE_TTL)
@@ -0,0 +1,152 @@
+"""
+KrishiVision — ONNX Engine Module
+Runs the plant-disease MobileNetV2 with onnxruntime on CPU instead of the
+torch + transformers pipeline, so the local model fits targets where torch
+is too large to deploy.
+
+Export once (needs torch + transformers, writes the model and a .json
+sidecar with labels and preprocessing settings):
+
+    python onnx_engine.py export models/plant_disease.onnx [--int8 <calibration_dir>]
+
+then serve with LOCAL_MODEL_ENGINE=onnx and ONNX_MODEL_PATH pointing at
+the exported file (only onnxruntime + numpy are needed at runtime).
+"""
+
+import json
+import os
+
+import numpy as np
+from PIL import Image
+
+from local_engine import BatchPreprocessor, LocalEngine, processor_meta
+
+ONNX_MODEL_PATH = os.environ.get("ONNX_MODEL_PATH", os.path.join(os.path.dirname(__file__), "models", "plant_disease.onnx"))
+ONNX_THREADS = int(os.environ.get("ONNX_THREADS", "0"))  # 0 = let onnxruntime decide
+
+
+def sidecar_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".json"
+
+
+def int8_path(model_path: str) -> str:
+    return os.path.splitext(model_path)[0] + ".int8.onnx"
+
+
+class OnnxEngine(LocalEngine):
+    """The exported model on onnxruntime's CPU provider (see LocalEngine for the call signature)."""
+
+    def __init__(self, model_path: str, top_k: int = 5, threads: int = ONNX_THREADS):
+        import onnxruntime as ort
+
+        with open(sidecar_path(model_path)) as f:
+            meta = json.load(f)
+        super().__init__(meta, top_k)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if threads:
+            options.intra_op_num_threads = threads
+        self.model_path = model_path
+        self._session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self._input = self._session.get_inputs()[0].name
+
+    def _forward(self, batch: np.ndarray) -> np.ndarray:
+        return self._session.run(None, {self._input: batch})[0]
+
+
+# ---------------------------------------------------------------------------
+# Export: HF checkpoint -> ONNX (+ optional int8) with a preprocessing sidecar
+# ---------------------------------------------------------------------------
+
+def _calibration_batches(calibration_dir: str, meta: dict, limit: int = 128):
+    """Static int8 needs activation ranges from real leaf photos, one image at a time."""
+    from onnxruntime.quantization import CalibrationDataReader
+
+    preprocess = BatchPreprocessor.from_meta(meta, capacity=1)
+    paths = [
+        os.path.join(root, name)
+        for root, _, files in os.walk(calibration_dir)
+        for name in sorted(files)
+        if name.lower().endswith((".jpg", ".jpeg", ".png", ".webp"))
+    ][:limit]
+    if not paths:
+        raise ValueError(f"No calibration images found in {calibration_dir}")
+
+    class Reader(CalibrationDataReader):
+        def __init__(self):
+            self._paths = iter(paths)
+
+        def get_next(self):
+            path = next(self._paths, None)
+            if path is None:
+                return None
+            with Image.open(path) as img:
+                return {"pixel_values": preprocess([img]).copy()}
+
+    return Reader()
+
+
+def export(model_path: str, model_id: str, calibration_dir: str | None = None) -> list[str]:
+    """
+    Export HF checkpoint `model_id` to `model_path`. With `calibration_dir`,
+    also write a statically quantized int8 model (QDQ, per-channel weights)
+    to `<name>.int8.onnx`; dynamic quantization leaves the convolutions in
+    float and is slower than fp32 on CPU for this network. Returns written paths.
+    """
+    import torch
+    from transformers import AutoImageProcessor, AutoModelForImageClassification
+
+    model = AutoModelForImageClassification.from_pretrained(model_id).eval()
+    meta = {"source": model_id, **processor_meta(AutoImageProcessor.from_pretrained(model_id), model.config)}
+
+    os.makedirs(os.path.dirname(os.path.abspath(model_path)), exist_ok=True)
+    dummy = torch.zeros(1, 3, meta["crop_size"], meta["crop_size"])
+    torch.onnx.export(
+        model,
+        (dummy,),
+        model_path,
+        input_names=["pixel_values"],
+        output_names=["logits"],
+        dynamic_axes={"pixel_values": {0: "batch"}, "logits": {0: "batch"}},
+        opset_version=17,
+        dynamo=False,
+    )
+    written = [model_path]
+
+    if calibration_dir:
+        from onnxruntime.quantization import QuantFormat, QuantType, quantize_static
+        from onnxruntime.quantization.shape_inference import quant_pre_process
+
+        prepared = os.path.splitext(model_path)[0] + ".prep.onnx"
+        quant_pre_process(model_path, prepared)
+        try:
+            quantize_static(
+                prepared,
+                int8_path(model_path),
+                _calibration_batches(calibration_dir, meta),
+                quant_format=QuantFormat.QDQ,
+                per_channel=True,
+                activation_type=QuantType.QUInt8,
+                weight_type=QuantType.QInt8,
+            )
+        finally:
+            os.remove(prepared)
+        written.append(int8_path(model_path))
+
+    for path in written:
+        with open(sidecar_path(path), "w") as f:
+            json.dump(meta, f, indent=2)
+    return written
+
+
+if __name__ == "__main__":
+    import sys
+
+    from ai_model import LOCAL_MODEL_ID
+
+    if len(sys.argv) < 3 or sys.argv[1] != "export" or sys.argv[3:4] == ["--int8"] and len(sys.argv) < 5:
+        sys.exit("Usage: python onnx_engine.py export <out.onnx> [--int8 <calibration_dir>]  (exports LOCAL_MODEL_ID)")
+    calibration_dir = sys.argv[4] if sys.argv[3:4] == ["--int8"] else None
+    for path in export(sys.argv[2], LOCAL_MODEL_ID, calibration_dir):
+        print(f"✅ Wrote {path}")
@@ -0,0 +1,158 @@
+"""
+KrishiVision — Outbound Image Module
+Controls what we upload to Gemini. Our label set is coarse, so a 10 MB
+phone photo buys no accuracy over a ~1024px JPEG but costs upload time and
+image tokens. The policy is configurable per deployment:
+
+    GEMINI_IMAGE_MAX_EDGE    longest edge in pixels            (default 1024)
+    GEMINI_IMAGE_FORMAT      JPEG or WEBP                      (default JPEG)
+    GEMINI_IMAGE_QUALITY     encoder quality 1-100             (default 85)
+    GEMINI_IMAGE_CENTER_CROP fraction of each edge to keep     (default 1.0 = no crop)
+    GEMINI_UPLINK_MBPS       assumed uplink, for latency-saved estimates (default 20)
+
+Run `python outbound_image.py <sample_dir>` to check offline that labels
+are unchanged against full-resolution uploads on a sample set.
+"""
+
+import math
+import os
+import time
+
+from imaging import DecodedImage, GEMINI_MAX_EDGE
+
+GEMINI_IMAGE_MAX_EDGE = int(os.environ.get("GEMINI_IMAGE_MAX_EDGE", "1024"))
+GEMINI_IMAGE_FORMAT = os.environ.get("GEMINI_IMAGE_FORMAT", "JPEG").upper()
+GEMINI_IMAGE_QUALITY = int(os.environ.get("GEMINI_IMAGE_QUALITY", "85"))
+GEMINI_IMAGE_CENTER_CROP = float(os.environ.get("GEMINI_IMAGE_CENTER_CROP", "1.0"))
+GEMINI_UPLINK_MBPS = float(os.environ.get("GEMINI_UPLINK_MBPS", "20"))
+
+MIME_TYPES = {"JPEG": "image/jpeg", "WEBP": "image/webp"}
+# Upload formats Gemini takes as they are, when re-encoding wouldn't make them smaller
+PASSTHROUGH_MIME_TYPES = {**MIME_TYPES, "PNG": "image/png"}
+
+
+class OutboundImagePolicy:
+    def __init__(self, max_edge: int, fmt: str, quality: int, center_crop: float = 1.0, uplink_mbps: float = GEMINI_UPLINK_MBPS):
+        if fmt not in MIME_TYPES:
+            raise ValueError(f"Unsupported outbound image format '{fmt}' (use JPEG or WEBP)")
+        self.max_edge = max_edge
+        self.format = fmt
+        self.quality = quality
+        self.center_crop = min(max(center_crop, 0.1), 1.0)
+        self.uplink_mbps = uplink_mbps
+
+        self.requests = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self.encode_ms = 0.0
+
+    @property
+    def mime_type(self) -> str:
+        return MIME_TYPES[self.format]
+
+    def _within(self, image: DecodedImage) -> bool:
+        return max(image.original_size) <= self.max_edge and self.center_crop >= 1
+
+    def passes_through(self, image: DecodedImage) -> bool:
+        """Already in the policy's format and within its max edge (and no crop): sent as uploaded."""
+        return image.format == self.format and self._within(image)
+
+    def view_size(self, image: DecodedImage) -> tuple[int, int] | None:
+        """Size of the decoded view prepare() re-encodes from; None when the upload is sent as is."""
+        if self.passes_through(image):
+            return None
+        if self.center_crop < 1:
+            return image.fit_size(math.ceil(self.max_edge / self.center_crop))
+        return image.fit_size(self.max_edge)
+
+    def prepare(self, image: DecodedImage | bytes) -> tuple[bytes, str]:
+        """
+        Encode `image` for upload; records a per-request report on the image.
+        Uploads the policy wouldn't change are sent unchanged: re-encoding
+        them costs time and can come out larger than the original. Small
+        uploads in another format are re-encoded, but the original is kept
+        if that didn't make it smaller.
+        """
+        image = DecodedImage.ensure(image)
+        start = time.perf_counter()
+        passthrough = self.passes_through(image)
+        if passthrough:
+            data, mime_type = image.raw, self.mime_type
+        else:
+            data, mime_type = image.encode(self.max_edge, self.format, self.quality, self.center_crop), self.mime_type
+            if self._within(image) and image.format in PASSTHROUGH_MIME_TYPES and len(image.raw) <= len(data):
+                data, mime_type, passthrough = image.raw, PASSTHROUGH_MIME_TYPES[image.format], True
+        encode_ms = (time.perf_counter() - start) * 1000
+
+        bytes_saved = len(image.raw) - len(data)
+        upload_ms_saved = bytes_saved * 8 / (self.uplink_mbps * 1e6) * 1000
+        image.outbound_report = {
+            "format": image.format if passthrough else self.format,
+            "passthrough": passthrough,
+            "bytes_sent": len(data),
+            "bytes_saved": bytes_saved,
+            "encode_ms": round(encode_ms, 2),
+            "est_latency_saved_ms": round(upload_ms_saved - encode_ms, 1) or 0.0,
+        }
+
+        self.requests += 1
+        self.bytes_in += len(image.raw)
+        self.bytes_out += len(data)
+        self.encode_ms += encode_ms
+        return data, mime_type
+
+    def stats(self) -> dict:
+        return {
+            "max_edge": self.max_edge,
+            "format": self.format,
+            "quality": self.quality,
+            "center_crop": self.center_crop,
+            "requests": self.requests,
+            "bytes_saved": self.bytes_in - self.bytes_out,
+            "avg_bytes_sent": round(self.bytes_out / self.requests) if self.requests else 0,
+            "avg_encode_ms": round(self.encode_ms / self.requests, 2) if self.requests else 0.0,
+        }
+
+
+gemini_image_policy = OutboundImagePolicy(GEMINI_IMAGE_MAX_EDGE, GEMINI_IMAGE_FORMAT, GEMINI_IMAGE_QUALITY, GEMINI_IMAGE_CENTER_CROP)
+
+# What Gemini would see anyway: it scales anything larger down to 3072px
+FULL_RESOLUTION_POLICY = OutboundImagePolicy(GEMINI_MAX_EDGE, "JPEG", 95)
+
+
+# ---------------------------------------------------------------------------
+# Offline comparison: policy vs full resolution on a sample set
+# ---------------------------------------------------------------------------
+
+if __name__ == "__main__":
+    import sys
+
+    from ai_model import GEMINI_PROMPT, _parse_gemini_result, get_gemini_backend
+
+    if len(sys.argv) < 2:
+        sys.exit("Usage: python outbound_image.py <dir of sample leaf images>")
+
+    sample_dir = sys.argv[1]
+    backend = get_gemini_backend()
+    files = sorted(f for f in os.listdir(sample_dir) if f.lower().endswith((".jpg", ".jpeg", ".png", ".webp")))
+    agree = 0
+
+    print(f"Policy: {GEMINI_IMAGE_FORMAT} q{GEMINI_IMAGE_QUALITY}, max edge {GEMINI_IMAGE_MAX_EDGE}, crop {GEMINI_IMAGE_CENTER_CROP}\n")
+    for name in files:
+        with open(os.path.join(sample_dir, name), "rb") as f:
+            image = DecodedImage(f.read())
+
+        results = []
+        for policy in (FULL_RESOLUTION_POLICY, gemini_image_policy):
+            data, mime_type = policy.prepare(image)
+            start = time.perf_counter()
+            label = _parse_gemini_result(backend.generate(GEMINI_PROMPT, data, mime_type))["disease_id"]
+            results.append((label, len(data), (time.perf_counter() - start) * 1000))
+
+        (full_label, full_bytes, full_ms), (label, sent, ms) = results
+        agree += full_label == label
+        mark = "✅" if full_label == label else "❌"
+        print(f"{mark} {name}: {full_label} -> {label} | {full_bytes / 1024:.0f} KB -> {sent / 1024:.0f} KB | {full_ms:.0f} ms -> {ms:.0f} ms")
+
+    if files:
+        print(f"\nLabels unchanged on {agree}/{len(files)} images ({agree / len(files):.0%}).")
@@ -0,0 +1,44 @@
+"""
+KrishiVision — Passwords Module
+bcrypt hashing for user accounts. The functions here are CPU-bound and are
+meant to run in executors.auth_pool (separate processes), so they import
+nothing but bcrypt and can be pickled by reference.
+
+BCRYPT_ROUNDS sets the cost factor for new hashes. A stored hash with a
+different cost is re-hashed the next time its owner logs in successfully.
+"""
+
+import os
+
+import bcrypt
+
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+
+
+def hash_password(password: str, rounds: int = BCRYPT_ROUNDS) -> str:
+    return bcrypt.hashpw(password.encode("utf-8"), bcrypt.gensalt(rounds)).decode("utf-8")
+
+
+def verify_password(plain_password: str, hashed_password: str) -> bool:
+    return bcrypt.checkpw(plain_password.encode("utf-8"), hashed_password.encode("utf-8"))
+
+
+def hash_rounds(hashed_password: str) -> int | None:
+    """Cost factor of a modular-crypt bcrypt hash ("$2b$12$..."), or None if unparseable."""
+    parts = hashed_password.split("$")
+    if len(parts) < 4 or not parts[2].isdigit():
+        return None
+    return int(parts[2])
+
+
+def verify_and_rehash(plain_password: str, hashed_password: str, rounds: int = BCRYPT_ROUNDS) -> tuple[bool, str | None]:
+    """
+    Check a login. Returns (ok, new_hash): new_hash is set when the password
+    matched but the stored hash uses a different cost than `rounds`. Both
+    steps happen in one call so a login costs a single pool round trip.
+    """
+    if not verify_password(plain_password, hashed_password):
+        return False, None
+    if hash_rounds(hashed_password) == rounds:
+        return True, None
+    return True, hash_password(plain_password, rounds)
@@ -0,0 +1,172 @@
+"""
+KrishiVision — Prediction Cache Module
+Content-addressed cache of AI predictions, keyed by the SHA-256 of the
+uploaded image bytes, so a farmer re-uploading the same photo after a
+dropped connection never pays for a second Gemini / local inference.
+
+Tiers:
+1. In-memory LRU with a TTL
+2. Optional on-disk JSON store (PREDICTION_CACHE_DIR) that survives restarts
+3. Near-duplicate lookup by perceptual hash (see near_duplicate.py)
+
+Concurrent requests for the same image are coalesced: only the first runs
+inference, the rest await its result.
+"""
+
+import asyncio
+import hashlib
+import json
+import os
+import time
+from collections import OrderedDict
+
+from executors import io_pool
+from near_duplicate import NearDuplicateIndex, near_duplicate_index
+
+PREDICTION_CACHE_SIZE = int(os.environ.get("PREDICTION_CACHE_SIZE", "1024"))
+PREDICTION_CACHE_TTL = float(os.environ.get("PREDICTION_CACHE_TTL", "3600"))
+PREDICTION_CACHE_DIR = os.environ.get("PREDICTION_CACHE_DIR", "")
+
+
+class PredictionCache:
+    def __init__(self, max_entries: int, ttl_seconds: float, disk_dir: str = "", near_index: NearDuplicateIndex | None = None):
+        self.max_entries = max_entries
+        self.ttl = ttl_seconds
+        self.disk_dir = disk_dir
+        self.near_index = near_index
+        self._entries = OrderedDict()  # key -> (stored_at, prediction)
+        self._inflight = {}  # key -> asyncio.Future
+
+        self.hits = {"memory": 0, "disk": 0, "coalesced": 0, "near_duplicate": 0}
+        self.misses = 0
+
+    @staticmethod
+    def key_for(image_bytes: bytes) -> str:
+        return hashlib.sha256(image_bytes).hexdigest()
+
+    # ----- memory tier -----
+
+    def get(self, key: str) -> dict | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        stored_at, prediction = entry
+        if time.time() - stored_at > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return prediction
+
+    def put(self, key: str, prediction: dict, stored_at: float | None = None):
+        self._entries[key] = (stored_at or time.time(), prediction)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    # ----- disk tier -----
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.disk_dir, key[:2], f"{key}.json")
+
+    def _disk_get(self, key: str) -> tuple[float, dict] | None:
+        try:
+            with open(self._disk_path(key)) as f:
+                record = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - record["stored_at"] > self.ttl:
+            return None
+        return record["stored_at"], record["prediction"]
+
+    def _disk_put(self, key: str, prediction: dict):
+        path = self._disk_path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w") as f:
+            json.dump({"stored_at": time.time(), "prediction": prediction}, f)
+        os.replace(tmp, path)
+
+    # ----- single-flight lookup -----
+
+    async def get_or_compute(self, key: str, compute, phash: int | None = None) -> tuple[dict, str | None]:
+        """
+        Return (prediction, source) for `key`, running `await compute()` only
+        when no tier has it and no identical request is already in flight.
+        `source` is "memory", "disk", "coalesced" or "near_duplicate" on a
+        hit, None on a miss. Pass the upload's dHash as `phash` to enable the
+        near-duplicate tier.
+        """
+        prediction = self.get(key)
+        if prediction is not None:
+            self.hits["memory"] += 1
+            return prediction, "memory"
+
+        inflight = self._inflight.get(key)
+        if inflight is not None:
+            try:
+                prediction = await asyncio.shield(inflight)
+            except asyncio.CancelledError:
+                # The request running it was cancelled (client gone, shutdown), not this one: take over
+                if inflight.cancelled() and not asyncio.current_task().cancelling():
+                    return await self.get_or_compute(key, compute, phash)
+                raise
+            self.hits["coalesced"] += 1
+            return prediction, "coalesced"
+
+        future = asyncio.get_running_loop().create_future()
+        self._inflight[key] = future
+        try:
+            if self.disk_dir:
+                record = await io_pool.run(self._disk_get, key)
+                if record is not None:
+                    stored_at, prediction = record
+                    self.put(key, prediction, stored_at)
+                    self.hits["disk"] += 1
+                    future.set_result(prediction)
+                    return prediction, "disk"
+
+            if self.near_index is not None and phash is not None:
+                match = self.near_index.lookup(phash)
+                if match is not None:
+                    prediction, _distance = match
+                    self.put(key, prediction)
+                    self.hits["near_duplicate"] += 1
+                    future.set_result(prediction)
+                    return prediction, "near_duplicate"
+
+            self.misses += 1
+            prediction = await compute()
+            self.put(key, prediction)
+            if self.near_index is not None and phash is not None:
+                self.near_index.add(phash, prediction)
+            future.set_result(prediction)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            future.exception()  # mark retrieved when nobody else was waiting
+            raise
+        finally:
+            self._inflight.pop(key, None)
+
+        if self.disk_dir:
+            try:
+                await io_pool.run(self._disk_put, key, prediction)
+            except Exception as e:
+                print(f"⚠️ Failed to write prediction cache entry: {e}")
+        return prediction, None
+
+    def stats(self) -> dict:
+        total_hits = sum(self.hits.values())
+        lookups = total_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "hits": dict(self.hits),
+            "misses": self.misses,
+            "hit_rate": round(total_hits / lookups, 4) if lookups else 0.0,
+            "near_duplicate": self.near_index.stats() if self.near_index is not None else None,
+        }
+
+
+prediction_cache = PredictionCache(PREDICTION_CACHE_SIZE, PREDICTION_CACHE_TTL, PREDICTION_CACHE_DIR, near_duplicate_index)
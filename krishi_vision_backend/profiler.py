@@ -0,0 +1,182 @@
+"""
+KrishiVision — Profiler Module
+On-demand sampling profiles of the /predict pipeline, for debugging single
+slow scans. Off unless configured:
+
+    PROFILE_SAMPLE_RATE   share of /predict requests profiled at random   (default 0)
+    PROFILE_TOKEN         requests carrying `X-Profile: <token>` are always
+                          profiled; also required to list/download profiles
+    PROFILE_INTERVAL_MS   sampling interval                                (default 5)
+    PROFILE_DIR           where profiles are kept                          (default ./profiles)
+    PROFILE_RING_SIZE     profiles kept on disk; the oldest are deleted    (default 50)
+    PROFILE_MAX_ACTIVE    profiled requests at once; others run unprofiled (default 2)
+
+While a profiled request runs, a background thread samples the stack of
+every thread in the process (event loop, executor workers, the model
+batcher) — concurrent requests show up too, under their thread names.
+Profiles are written in collapsed-stack ("folded") format, one
+`thread;outer;...;inner count` line per distinct stack, which
+flamegraph.pl, speedscope and inferno read directly.
+"""
+
+import hmac
+import os
+import random
+import secrets
+import sys
+import threading
+import time
+from collections import Counter
+
+PROFILE_SAMPLE_RATE = float(os.environ.get("PROFILE_SAMPLE_RATE", "0"))
+PROFILE_TOKEN = os.environ.get("PROFILE_TOKEN", "")
+PROFILE_INTERVAL_MS = float(os.environ.get("PROFILE_INTERVAL_MS", "5"))
+PROFILE_DIR = os.environ.get("PROFILE_DIR", os.path.join(os.path.dirname(__file__), "profiles"))
+PROFILE_RING_SIZE = int(os.environ.get("PROFILE_RING_SIZE", "50"))
+PROFILE_MAX_ACTIVE = int(os.environ.get("PROFILE_MAX_ACTIVE", "2"))
+
+PROFILE_EXTENSION = ".folded"
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Profile:
+    def __init__(self, label: str):
+        self.id = secrets.token_hex(8)
+        self.label = label.replace("-", "_")
+        self.started_at = time.time()
+        self.duration = 0.0
+        self.samples = Counter()  # folded stack -> count
+
+
+class SamplingProfiler:
+    def __init__(self, interval_ms: float, directory: str, ring_size: int, max_active: int, sample_rate: float, token: str):
+        self.interval = interval_ms / 1000
+        self.directory = directory
+        self.ring_size = max(1, ring_size)
+        self.max_active = max_active
+        self.sample_rate = sample_rate
+        self.token = token
+        self._active = []
+        self._lock = threading.Lock()
+        self._thread = None
+
+        self.captured = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.sample_rate > 0 or bool(self.token)
+
+    def authorized(self, header: str | None) -> bool:
+        return bool(self.token) and header is not None and hmac.compare_digest(header, self.token)
+
+    def should_profile(self, header: str | None) -> bool:
+        """Whether to profile this request: it asked with the token, or it was sampled."""
+        if self.authorized(header):
+            return True
+        return self.sample_rate > 0 and random.random() < self.sample_rate
+
+    def start(self, label: str) -> Profile | None:
+        """Begin collecting samples for one request; None when PROFILE_MAX_ACTIVE are already running."""
+        with self._lock:
+            if len(self._active) >= self.max_active:
+                self.skipped += 1
+                return None
+            profile = Profile(label)
+            self._active.append(profile)
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._sample_loop, name="profiler", daemon=True)
+                self._thread.start()
+        return profile
+
+    def stop(self, profile: Profile):
+        with self._lock:
+            self._active.remove(profile)
+        profile.duration = time.time() - profile.started_at
+
+    def _sample_loop(self):
+        me = threading.get_ident()
+        while True:
+            time.sleep(self.interval)
+            names = {t.ident: t.name for t in threading.enumerate()}
+            stacks = []
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                stack = []
+                while frame is not None:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                stack.append(names.get(ident, f"thread-{ident}"))
+                stacks.append(";".join(reversed(stack)))
+            with self._lock:
+                if not self._active:
+                    self._thread = None
+                    return
+                # Under the lock, so a stopped profile is never written to again
+                for profile in self._active:
+                    profile.samples.update(stacks)
+
+    # ----- on-disk ring -----
+
+    def _path(self, name: str) -> str:
+        return os.path.join(self.directory, name)
+
+    def save(self, profile: Profile) -> str:
+        """Write a finished profile (blocking) and drop the oldest beyond the ring size. Returns its id."""
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{int(profile.started_at * 1000)}-{profile.id}-{profile.label}-{round(profile.duration * 1000)}ms{PROFILE_EXTENSION}"
+        tmp = self._path(name + ".tmp")
+        with open(tmp, "w") as f:
+            for stack, count in profile.samples.most_common():
+                f.write(f"{stack} {count}\n")
+        os.replace(tmp, self._path(name))
+        self.captured += 1
+        for old in self._names()[:-self.ring_size]:
+            try:
+                os.remove(self._path(old))
+            except FileNotFoundError:
+                pass
+        return profile.id
+
+    def _names(self) -> list[str]:
+        """Saved profile file names, oldest first."""
+        try:
+            return sorted(n for n in os.listdir(self.directory) if n.endswith(PROFILE_EXTENSION))
+        except FileNotFoundError:
+            return []
+
+    def list(self) -> list[dict]:
+        profiles = []
+        for name in reversed(self._names()):
+            started_ms, profile_id, label, duration = name[:-len(PROFILE_EXTENSION)].split("-", 3)
+            profiles.append({
+                "id": profile_id,
+                "label": label,
+                "started_at": int(started_ms) / 1000,
+                "duration_ms": int(duration.rstrip("ms")),
+                "bytes": os.path.getsize(self._path(name)),
+            })
+        return profiles
+
+    def path_for(self, profile_id: str) -> str | None:
+        for name in self._names():
+            if name.split("-", 2)[1] == profile_id:
+                return self._path(name)
+        return None
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "sample_rate": self.sample_rate,
+            "active": len(self._active),
+            "captured": self.captured,
+            "skipped": self.skipped,
+        }
+
+
+profiler = SamplingProfiler(PROFILE_INTERVAL_MS, PROFILE_DIR, PROFILE_RING_SIZE, PROFILE_MAX_ACTIVE, PROFILE_SAMPLE_RATE, PROFILE_TOKEN)
@@ -0,0 +1,98 @@
+"""
+KrishiVision — Rate Limiter Module
+Client-side token bucket matching our Gemini quota, so a burst of scans
+queues briefly or fails fast here instead of piling 429s up at Google.
+
+    GEMINI_RPM              sustained requests per minute   (default 1000; 0 disables)
+    GEMINI_BURST            bucket size                      (default 20)
+    GEMINI_QUEUE_MAX_WAIT   longest a call may wait, seconds (default 2.0)
+
+A call that would have to wait longer than GEMINI_QUEUE_MAX_WAIT for a
+token is rejected at once with RateLimited.
+"""
+
+import asyncio
+import os
+import time
+
+GEMINI_RPM = float(os.environ.get("GEMINI_RPM", "1000"))
+GEMINI_BURST = float(os.environ.get("GEMINI_BURST", "20"))
+GEMINI_QUEUE_MAX_WAIT = float(os.environ.get("GEMINI_QUEUE_MAX_WAIT", "2.0"))
+
+
+class RateLimited(Exception):
+    """No token would be available within the allowed wait."""
+
+
+class TokenBucket:
+    def __init__(self, name: str, rate_per_minute: float, burst: float, max_wait: float):
+        self.name = name
+        self.rate = rate_per_minute / 60
+        self.capacity = max(1.0, burst)
+        self.max_wait = max_wait
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+
+        self.granted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self):
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _reserve(self) -> float:
+        """Take a token (possibly borrowing from the future); returns how long to wait for it."""
+        self._refill()
+        wait = max(0.0, (1 - self._tokens) / self.rate)
+        if wait > self.max_wait:
+            self.rejected += 1
+            raise RateLimited(f"{self.name} rate limit: next slot in {wait:.1f}s")
+        self._tokens -= 1
+        self.granted += 1
+        return wait
+
+    async def acquire(self):
+        """Wait (at most max_wait) for a token, or raise RateLimited."""
+        if not self.enabled:
+            return
+        wait = self._reserve()
+        if wait <= 0:
+            return
+        self.queued += 1
+        try:
+            await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self._tokens += 1  # hand the reservation back
+            raise
+
+    def acquire_sync(self):
+        """Blocking variant of acquire()."""
+        if not self.enabled:
+            return
+        wait = self._reserve()
+        if wait > 0:
+            self.queued += 1
+            time.sleep(wait)
+
+    def stats(self) -> dict:
+        if not self.enabled:
+            return {"enabled": False}
+        self._refill()
+        return {
+            "enabled": True,
+            "rpm": round(self.rate * 60, 1),
+            "burst": self.capacity,
+            "tokens": round(self._tokens, 2),
+            "granted": self.granted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+        }
+
+
+gemini_limiter = TokenBucket("gemini", GEMINI_RPM, GEMINI_BURST, GEMINI_QUEUE_MAX_WAIT)
@@ -0,0 +1,99 @@
+"""
+KrishiVision — Request Timing Module
+Per-request stage timings, returned to the client as a Server-Timing header
+(visible in browser devtools) so a single slow scan can be broken down:
+
+    Server-Timing: upload;dur=1.9, decode;dur=12.4, inference;dur=840.2, db;dur=3.1, total;dur=861.0
+
+ServerTimingMiddleware starts an empty timing table for each HTTP request
+in a context variable; `stage()` and `record()` add to it from anywhere in
+the request, including executors' worker threads (they run calls in a copy
+of the caller's context). Outside a request they only feed the metrics.
+Shared background work a request merely kicks off (a stats refresh, the
+scan writer's flush loop) is started with `background_task()`, so its time
+isn't charged to whichever request happened to start it.
+"""
+
+import asyncio
+import contextvars
+import time
+from contextlib import contextmanager
+
+from metrics import PREDICT_STAGE_SECONDS
+
+# Pipeline stage -> Server-Timing metric name
+STAGE_NAMES = {
+    "upload_read": "upload",
+    "preprocess": "decode",
+    "predict": "inference",
+    "disease_info": "lookup",
+    "save": "save",
+}
+
+_timings = contextvars.ContextVar("request_timings", default=None)
+
+
+def record(name: str, seconds: float):
+    """Add `seconds` to this request's `name` entry (durations of repeated entries add up)."""
+    timings = _timings.get()
+    if timings is not None:
+        timings[name] = timings.get(name, 0.0) + seconds
+
+
+def background_task(coro) -> asyncio.Task:
+    """Start `coro` as a task outside any request's timings (in a fresh context)."""
+    return contextvars.Context().run(asyncio.get_running_loop().create_task, coro)
+
+
+@contextmanager
+def timed(name: str):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(name, time.perf_counter() - start)
+
+
+@contextmanager
+def stage(name: str):
+    """Time one /predict pipeline stage into both its histogram and the Server-Timing header."""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - start
+        PREDICT_STAGE_SECONDS.observe(elapsed, name)
+        record(STAGE_NAMES.get(name, name), elapsed)
+
+
+def server_timing_header(timings: dict, total: float) -> bytes:
+    entries = [f"{name};dur={seconds * 1000:.1f}" for name, seconds in timings.items()]
+    entries.append(f"total;dur={total * 1000:.1f}")
+    return ", ".join(entries).encode("latin-1")
+
+
+class ServerTimingMiddleware:
+    """Pure ASGI middleware adding Server-Timing to every HTTP response (timings up to the response start)."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            return await self.app(scope, receive, send)
+
+        timings = {}
+        token = _timings.set(timings)
+        start = time.perf_counter()
+
+        async def timed_send(message):
+            if message["type"] == "http.response.start":
+                headers = list(message.get("headers", []))
+                headers.append((b"server-timing", server_timing_header(timings, time.perf_counter() - start)))
+                message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, timed_send)
+        finally:
+            _timings.reset(token)
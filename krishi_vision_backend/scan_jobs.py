@@ -0,0 +1,199 @@
+"""
+KrishiVision — Scan Jobs Module
+Submit-and-poll scans for clients on flaky mobile connections. POST /scans
+queues the upload and returns a job id at once; SCAN_JOB_WORKERS in-process
+workers run the normal prediction pipeline; the result is fetched with
+GET /scans/{id} or pushed over server-sent events.
+
+Jobs are keyed by (user, image SHA-256): re-submitting the same photo while
+its job is queued, running or finished returns the existing job instead of
+running inference again. Finished jobs are kept for SCAN_JOB_TTL seconds,
+and at most SCAN_JOB_MAX_RETAINED of them (oldest dropped first).
+
+A job holds its upload only until it finishes. Queued and running jobs
+together may hold at most SCAN_JOB_QUEUE_BYTES of uploads (besides the
+SCAN_JOB_QUEUE_LIMIT job count); submissions beyond either are shed with 503.
+"""
+
+import asyncio
+import os
+import secrets
+import time
+from collections import OrderedDict
+
+from executors import ExecutorSaturated
+
+SCAN_JOB_WORKERS = int(os.environ.get("SCAN_JOB_WORKERS", "4"))
+SCAN_JOB_QUEUE_LIMIT = int(os.environ.get("SCAN_JOB_QUEUE_LIMIT", "100"))
+SCAN_JOB_QUEUE_BYTES = int(os.environ.get("SCAN_JOB_QUEUE_BYTES", str(64 * 1024 * 1024)))
+SCAN_JOB_TTL = float(os.environ.get("SCAN_JOB_TTL", "600"))
+SCAN_JOB_MAX_RETAINED = int(os.environ.get("SCAN_JOB_MAX_RETAINED", "1000"))
+
+QUEUED, RUNNING, DONE, FAILED = "queued", "running", "done", "failed"
+
+
+class ScanJob:
+    def __init__(self, job_id: str, user_id: int | None, key: str):
+        self.id = job_id
+        self.user_id = user_id
+        self.key = key
+        self.status = QUEUED
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.finished_at = None
+        self._updated = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in (DONE, FAILED)
+
+    def _set(self, status: str):
+        self.status = status
+        if self.finished:
+            self.finished_at = time.time()
+        # Wake everyone waiting on the previous state, then start a fresh event
+        self._updated.set()
+        self._updated = asyncio.Event()
+
+    async def wait_for_update(self, timeout: float) -> bool:
+        """Wait for the next status change; False on timeout."""
+        try:
+            await asyncio.wait_for(self._updated.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.id,
+            "status": self.status,
+            "created_at": self.created_at,
+            "finished_at": self.finished_at,
+            "result": self.result,
+            "error": self.error,
+        }
+
+
+class ScanJobManager:
+    def __init__(self, workers: int, queue_limit: int, queue_bytes: int, ttl: float, max_retained: int):
+        self.workers = max(1, workers)
+        self.queue_limit = queue_limit
+        self.queue_bytes = queue_bytes
+        self.ttl = ttl
+        self.max_retained = max(1, max_retained)
+        self._pending_bytes = 0  # upload bytes held by queued and running jobs
+        self._jobs = OrderedDict()  # job id -> ScanJob, in submission order
+        self._by_key = {}  # (user_id, image key) -> job id
+        self._queue = None
+        self._tasks = []
+
+        self.submitted = 0
+        self.deduplicated = 0
+        self.completed = 0
+        self.failed = 0
+
+    async def start(self):
+        if self._tasks:
+            return
+        self._queue = asyncio.Queue()
+        self._tasks = [asyncio.get_running_loop().create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        """Cancel the workers; jobs still queued or running are marked failed."""
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        # Drop queued closures (and their uploads)
+        while self._queue is not None and not self._queue.empty():
+            _job, _run, size = self._queue.get_nowait()
+            self._pending_bytes -= size
+        for job in self._jobs.values():
+            if not job.finished:
+                job.error = "Server shut down before the scan finished. Please resubmit."
+                job._set(FAILED)
+
+    def submit(self, user_id: int | None, key: str, run, size: int = 0) -> tuple[ScanJob, bool]:
+        """
+        Queue `await run()` (returns the job's result) for this user's image
+        `key`; `size` is the upload bytes `run` holds on to. Returns (job,
+        created); created is False when an identical scan is already queued,
+        running or finished.
+        """
+        self._purge()
+        existing = self._jobs.get(self._by_key.get((user_id, key)))
+        if existing is not None and existing.status != FAILED:
+            self.deduplicated += 1
+            return existing, False
+        if self._queue is None:
+            raise RuntimeError("Scan job workers are not running")
+        if self._queue.qsize() >= self.queue_limit:
+            raise ExecutorSaturated(f"scan job queue is full ({self.queue_limit} waiting)")
+        # A single upload larger than the budget still runs when nothing else is pending
+        if self._pending_bytes and self._pending_bytes + size > self.queue_bytes:
+            raise ExecutorSaturated(f"scan job queue is full ({self._pending_bytes} bytes pending)")
+
+        job = ScanJob(secrets.token_urlsafe(16), user_id, key)
+        self._jobs[job.id] = job
+        self._by_key[(user_id, key)] = job.id
+        self._queue.put_nowait((job, run, size))
+        self._pending_bytes += size
+        self.submitted += 1
+        return job, True
+
+    def get(self, job_id: str, user_id: int | None) -> ScanJob | None:
+        """The caller's job, or None if it doesn't exist, expired or belongs to someone else."""
+        self._purge()
+        job = self._jobs.get(job_id)
+        if job is None or job.user_id != user_id:
+            return None
+        return job
+
+    async def _worker(self):
+        while True:
+            job, run, size = await self._queue.get()
+            job._set(RUNNING)
+            try:
+                job.result = await run()
+            except asyncio.CancelledError:
+                job.error = "Scan was cancelled. Please resubmit."
+                job._set(FAILED)
+                raise
+            except Exception as e:
+                job.error = str(getattr(e, "detail", e))
+                self.failed += 1
+                job._set(FAILED)
+            else:
+                self.completed += 1
+                job._set(DONE)
+            finally:
+                # Release the closure and the upload it holds before waiting for the next job
+                run = None
+                self._pending_bytes -= size
+
+    def _purge(self):
+        cutoff = time.time() - self.ttl
+        finished = [job for job in self._jobs.values() if job.finished]
+        # Oldest first: past the TTL, or beyond the retention cap
+        excess = len(finished) - self.max_retained
+        expired = [job for i, job in enumerate(finished) if i < excess or job.finished_at < cutoff]
+        for job in expired:
+            del self._jobs[job.id]
+            if self._by_key.get((job.user_id, job.key)) == job.id:
+                del self._by_key[(job.user_id, job.key)]
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self._queue.qsize() if self._queue is not None else 0,
+            "pending_bytes": self._pending_bytes,
+            "retained": len(self._jobs),
+            "submitted": self.submitted,
+            "deduplicated": self.deduplicated,
+            "completed": self.completed,
+            "failed": self.failed,
+        }
+
+
+scan_jobs = ScanJobManager(SCAN_JOB_WORKERS, SCAN_JOB_QUEUE_LIMIT, SCAN_JOB_QUEUE_BYTES, SCAN_JOB_TTL, SCAN_JOB_MAX_RETAINED)
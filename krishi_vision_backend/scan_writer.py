@@ -0,0 +1,126 @@
+"""
+KrishiVision — Scan Writer Module
+Write-behind persistence for scan results. /predict drops each scan into an
+in-process buffer and returns; a background task flushes the buffer to
+PostgreSQL in batches (database.save_scans) when it reaches
+SCAN_FLUSH_SIZE records or SCAN_FLUSH_INTERVAL seconds, whichever is first.
+Anything still buffered is flushed on shutdown.
+"""
+
+import asyncio
+import os
+import time
+
+from database import save_scans
+from executors import io_pool
+from metrics import SCAN_FLUSH_SECONDS
+from request_timing import background_task
+
+SCAN_FLUSH_SIZE = int(os.environ.get("SCAN_FLUSH_SIZE", "100"))
+SCAN_FLUSH_INTERVAL = float(os.environ.get("SCAN_FLUSH_INTERVAL", "1.0"))
+# Upper bound on buffered scans while the database is unreachable
+SCAN_BUFFER_LIMIT = int(os.environ.get("SCAN_BUFFER_LIMIT", "10000"))
+
+
+class ScanWriter:
+    def __init__(self, flush_size: int, flush_interval: float, buffer_limit: int):
+        self.flush_size = max(1, flush_size)
+        self.flush_interval = flush_interval
+        self.buffer_limit = buffer_limit
+        self._buffer = []
+        self._wake = None
+        self._task = None
+        self._closing = False
+        self._listeners = []
+
+        self.flushed = 0
+        self.flushes = 0
+        self.failed_flushes = 0
+        self.dropped = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    def add_listener(self, callback):
+        """Call `callback(batch)` on the event loop after every successful flush."""
+        self._listeners.append(callback)
+
+    def submit(self, scan: dict):
+        """Buffer one scan record. Must be called from the event loop."""
+        if len(self._buffer) >= self.buffer_limit:
+            self._buffer.pop(0)
+            self.dropped += 1
+        self._buffer.append(scan)
+        self._ensure_started()
+        if len(self._buffer) >= self.flush_size:
+            self._wake.set()
+
+    def _ensure_started(self):
+        if self._task is None or self._task.done():
+            self._closing = False
+            self._wake = asyncio.Event()
+            self._task = background_task(self._run())
+
+    async def start(self):
+        self._ensure_started()
+
+    async def stop(self):
+        """Stop the background task after a final flush of everything buffered."""
+        if self._task is None:
+            return
+        self._closing = True
+        self._wake.set()
+        await self._task
+        self._task = None
+        if self._buffer:
+            print(f"⚠️ {len(self._buffer)} buffered scans could not be saved before shutdown")
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            while self._buffer:
+                if not await self.flush() or (not self._closing and len(self._buffer) < self.flush_size):
+                    break
+            if self._closing:
+                return
+
+    async def flush(self) -> bool:
+        """Write up to one batch; on failure the batch goes back to the front of the buffer."""
+        batch = self._buffer[:self.flush_size]
+        del self._buffer[:len(batch)]
+        start = time.perf_counter()
+        try:
+            await io_pool.run(save_scans, batch)
+        except Exception as e:
+            self.failed_flushes += 1
+            room = max(0, self.buffer_limit - len(self._buffer))
+            self.dropped += len(batch) - min(room, len(batch))
+            self._buffer[:0] = batch[len(batch) - min(room, len(batch)):]
+            print(f"⚠️ Failed to flush {len(batch)} scans to DB: {e}")
+            return False
+        elapsed = time.perf_counter() - start
+        SCAN_FLUSH_SECONDS.observe(elapsed)
+        self.last_flush_ms = round(elapsed * 1000, 2)
+        self.max_flush_ms = max(self.max_flush_ms, self.last_flush_ms)
+        self.flushes += 1
+        self.flushed += len(batch)
+        for callback in self._listeners:
+            callback(batch)
+        return True
+
+    def stats(self) -> dict:
+        return {
+            "buffer_depth": len(self._buffer),
+            "flushed": self.flushed,
+            "flushes": self.flushes,
+            "failed_flushes": self.failed_flushes,
+            "dropped": self.dropped,
+            "last_flush_ms": self.last_flush_ms,
+            "max_flush_ms": self.max_flush_ms,
+        }
+
+
+scan_writer = ScanWriter(SCAN_FLUSH_SIZE, SCAN_FLUSH_INTERVAL, SCAN_BUFFER_LIMIT)
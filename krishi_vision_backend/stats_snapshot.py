@@ -0,0 +1,79 @@
+"""
+KrishiVision — Stats Snapshot Module
+Serves /stats from memory. The snapshot is loaded from the sharded counter
+tables once, updated in place with every batch this process flushes (see
+scan_writer), and re-synced from the database in the background every
+STATS_REFRESH_INTERVAL seconds to pick up other instances' scans.
+"""
+
+import asyncio
+import os
+import time
+
+from database import aggregate_scans, get_disease_stats
+from executors import io_pool
+from request_timing import background_task
+
+STATS_REFRESH_INTERVAL = float(os.environ.get("STATS_REFRESH_INTERVAL", "30"))
+
+
+class StatsSnapshot:
+    def __init__(self, refresh_interval: float):
+        self.refresh_interval = refresh_interval
+        self.total_scans = 0
+        self._by_disease = {}  # disease_id -> {disease_name, crop, total_scans, last_scanned}
+        self.loaded_at = None
+        self._refresh_task = None
+
+    def apply(self, scans: list[dict]):
+        """
+        Fold a just-flushed batch into the snapshot. A batch that commits while
+        a re-sync query is running may be counted twice until the next re-sync.
+        """
+        if self.loaded_at is None:
+            return
+        for disease_id, (count, last, name, crop) in aggregate_scans(scans).items():
+            row = self._by_disease.setdefault(
+                disease_id, {"disease_name": name, "crop": crop, "total_scans": 0, "last_scanned": last}
+            )
+            row["total_scans"] += count
+            row["last_scanned"] = max(row["last_scanned"], last)
+        self.total_scans += len(scans)
+
+    async def refresh(self):
+        stats = await io_pool.run(get_disease_stats)
+        self._by_disease = {
+            s["disease_id"]: {
+                "disease_name": s["disease_name"],
+                "crop": s["crop"],
+                "total_scans": int(s["total_scans"]),
+                "last_scanned": s["last_scanned"],
+            }
+            for s in stats["by_disease"]
+        }
+        self.total_scans = int(stats["total_scans"])
+        self.loaded_at = time.monotonic()
+
+    def _start_refresh(self) -> asyncio.Task:
+        """Single-flight: concurrent callers share one refresh query."""
+        if self._refresh_task is None or self._refresh_task.done():
+            self._refresh_task = background_task(self.refresh())
+            self._refresh_task.add_done_callback(self._log_refresh_failure)
+        return self._refresh_task
+
+    @staticmethod
+    def _log_refresh_failure(task: asyncio.Task):
+        if not task.cancelled() and task.exception() is not None:
+            print(f"⚠️ Stats refresh failed, serving previous snapshot: {task.exception()}")
+
+    async def get(self) -> dict:
+        """Current stats; only the very first call waits on the database."""
+        if self.loaded_at is None:
+            await asyncio.shield(self._start_refresh())
+        elif time.monotonic() - self.loaded_at > self.refresh_interval:
+            self._start_refresh()
+        rows = sorted(self._by_disease.values(), key=lambda r: r["total_scans"], reverse=True)
+        return {"total_scans": self.total_scans, "by_disease": rows}
+
+
+stats_snapshot = StatsSnapshot(STATS_REFRESH_INTERVAL)
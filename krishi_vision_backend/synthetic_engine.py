@@ -0,0 +1,57 @@
+"""
+KrishiVision — Synthetic Engine Module
+A stand-in local classifier for load tests (LOCAL_MODEL_ENGINE=synthetic).
+It needs neither torch nor a model file: each batch takes a configurable
+amount of time, and each image gets a label picked deterministically from
+its pixels, so repeated uploads get the same answer.
+
+    SYNTHETIC_BATCH_MS       fixed cost per forward pass       (default 20)
+    SYNTHETIC_PER_IMAGE_MS   extra cost per image in the batch (default 5)
+    SYNTHETIC_JITTER_MS      uniform random extra per pass     (default 5)
+    SYNTHETIC_BUSY=1         burn CPU while holding the GIL instead of
+                             sleeping, like pure-Python inference would
+"""
+
+import os
+import random
+import time
+import zlib
+
+SYNTHETIC_BATCH_MS = float(os.environ.get("SYNTHETIC_BATCH_MS", "20"))
+SYNTHETIC_PER_IMAGE_MS = float(os.environ.get("SYNTHETIC_PER_IMAGE_MS", "5"))
+SYNTHETIC_JITTER_MS = float(os.environ.get("SYNTHETIC_JITTER_MS", "5"))
+SYNTHETIC_BUSY = os.environ.get("SYNTHETIC_BUSY", "0") == "1"
+
+
+class SyntheticEngine:
+    """Same call signature as the real engines: image -> top-k, list of images -> list of top-k."""
+
+    def __init__(self, labels, top_k: int = 5):
+        self.labels = list(labels)
+        self.top_k = min(top_k, len(self.labels))
+
+    def _spend(self, n: int):
+        seconds = (SYNTHETIC_BATCH_MS + n * SYNTHETIC_PER_IMAGE_MS + random.uniform(0, SYNTHETIC_JITTER_MS)) / 1000
+        if not SYNTHETIC_BUSY:
+            time.sleep(seconds)
+            return
+        end = time.perf_counter() + seconds
+        while time.perf_counter() < end:
+            pass
+
+    def _classify(self, image) -> list[dict]:
+        seed = zlib.crc32(image.resize((8, 8)).tobytes())
+        first = seed % len(self.labels)
+        top = 0.55 + (seed >> 8) % 40 / 100
+        results = [{"label": self.labels[first], "score": top}]
+        rest = (1 - top) / max(1, self.top_k - 1)
+        for i in range(1, self.top_k):
+            results.append({"label": self.labels[(first + i) % len(self.labels)], "score": rest})
+        return results
+
+    def __call__(self, images, batch_size: int | None = None):
+        single = not isinstance(images, list)
+        batch = [images] if single else images
+        self._spend(len(batch))
+        results = [self._classify(image) for image in batch]
+        return results[0] if single else results
@@ -0,0 +1,70 @@
+"""
+Offline check that a scan decodes the upload's pixels once: the
+near-duplicate hash (a small view, computed first) must not leave a draft
+too small for the Gemini upload, which would force a second decode.
+
+Usage: python test_decode_once.py   (or: python -m pytest test_decode_once.py)
+
+Gemini is the scripted local fake from test_gemini_client.py; the local
+model is left out, as on the Gemini-only serverless deployment.
+"""
+
+import asyncio
+import io
+import random
+
+from PIL import Image
+
+import ai_model
+import main
+from gemini_client import GeminiBackend
+from imaging import DecodedImage
+from test_gemini_client import scripted_fake, serve
+
+
+def phone_photo(size=(4000, 3000)) -> bytes:
+    """A JPEG unlike any earlier one, so neither cache tier answers."""
+    rng = random.Random()
+    img = Image.new("RGB", (40, 30), tuple(rng.randrange(256) for _ in range(3)))
+    img.putdata([tuple(rng.randrange(256) for _ in range(3)) for _ in range(40 * 30)])
+    buf = io.BytesIO()
+    img.resize(size).save(buf, "JPEG", quality=90)
+    return buf.getvalue()
+
+
+def test_gemini_scan_decodes_once():
+    decodes = []
+    original_decode = DecodedImage._decode
+
+    def counting_decode(self, min_size):
+        img = original_decode(self, min_size)
+        decodes.append(img.size)
+        return img
+
+    saved = (ai_model.GEMINI_API_KEY, ai_model._gemini_backend, ai_model._use_local_model, DecodedImage._decode)
+    with serve(scripted_fake(["ok"])) as url:
+        ai_model.GEMINI_API_KEY = "test-key"
+        ai_model._gemini_backend = GeminiBackend("test-key", base_url=url)
+        ai_model._use_local_model = lambda: False
+        DecodedImage._decode = counting_decode
+        try:
+            async def scan():
+                deadline = asyncio.get_running_loop().time() + 30
+                try:
+                    return await main.analyze_image(phone_photo(), "leaf.jpg", None, deadline)
+                finally:
+                    await ai_model.close_gemini_backend()
+
+            body, _scan = asyncio.run(scan())
+        finally:
+            ai_model.GEMINI_API_KEY, ai_model._gemini_backend, ai_model._use_local_model, DecodedImage._decode = saved
+
+    assert body["model_type"] == "ai", body["ai_error"]
+    assert len(decodes) == 1, f"decoded {len(decodes)} times: {decodes}"
+    # A reduced JPEG draft, still large enough for the 1024px upload
+    assert 1024 <= max(decodes[0]) < 4000, decodes
+
+
+if __name__ == "__main__":
+    test_gemini_scan_decodes_once()
+    print("✅ test_gemini_scan_decodes_once")
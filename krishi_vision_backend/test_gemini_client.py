@@ -0,0 +1,158 @@
+"""
+Offline checks for GeminiBackend against a local fake generateContent
+endpoint: no API key or network needed.
+
+Usage: python test_gemini_client.py   (or: python -m pytest test_gemini_client.py)
+
+The fake answers each call with the next step of a script ("ok", an HTTP
+status, "bad_shape" or "slow"), so every path is deterministic: the happy
+path and connection reuse, the client staying usable after failed calls,
+and how is_outage / error_reason classify each failure (the
+circuit breaker, hedger and metrics all rely on them).
+"""
+
+import asyncio
+import json
+import socket
+import threading
+import time
+from contextlib import contextmanager
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+from gemini_client import GeminiBackend, GeminiError, is_outage, error_reason
+
+SLOW_SECONDS = 1.0
+ANSWER = {"disease_id": "tomato_late_blight", "confidence": 0.9, "raw_label": "fake"}
+
+
+def scripted_fake(script: list) -> FastAPI:
+    app = FastAPI()
+    app.state.calls = []
+
+    @app.post("/v1beta/models/{model}")
+    async def generate_content(model: str, request: Request):
+        body = await request.json()
+        app.state.calls.append({"model": model, "key": request.headers.get("x-goog-api-key"), "body": body})
+        step = script.pop(0) if script else "ok"
+        if step == "slow":
+            await asyncio.sleep(SLOW_SECONDS)
+        if isinstance(step, int):
+            return JSONResponse({"error": {"code": step, "message": "scripted failure"}}, status_code=step)
+        if step == "bad_shape":
+            return {"candidates": []}
+        return {"candidates": [{"content": {"parts": [{"text": json.dumps(ANSWER)}]}}]}
+
+    return app
+
+
+@contextmanager
+def serve(app: FastAPI):
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    deadline = time.monotonic() + 10
+    while not server.started:
+        if time.monotonic() > deadline:
+            raise RuntimeError("fake Gemini server did not start")
+        time.sleep(0.01)
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
+
+
+def run_calls(base_url: str, calls: int, timeout: float = 5.0) -> tuple[list, GeminiBackend]:
+    """Make `calls` sequential agenerate calls on one backend; returns each call's text or exception."""
+    backend = GeminiBackend("test-key", model="fake-model", base_url=base_url, timeout=timeout)
+
+    async def go():
+        results = []
+        try:
+            for _ in range(calls):
+                try:
+                    results.append(await backend.agenerate("identify", b"\xff\xd8jpeg", "image/jpeg"))
+                except Exception as e:
+                    results.append(e)
+        finally:
+            await backend.aclose()
+        return results
+
+    return asyncio.run(go()), backend
+
+
+def test_agenerate_returns_text_and_reuses_connection():
+    app = scripted_fake(["ok", "ok"])
+    with serve(app) as url:
+        backend = GeminiBackend("test-key", model="fake-model", base_url=url)
+
+        async def go():
+            first = await backend.agenerate("identify", b"img")
+            client = backend._async_client
+            second = await backend.agenerate("identify", b"img")
+            assert backend._async_client is client
+            await backend.aclose()
+            return first, second
+
+        first, second = asyncio.run(go())
+    assert json.loads(first) == ANSWER and json.loads(second) == ANSWER
+    call = app.state.calls[0]
+    assert call["model"] == "fake-model:generateContent"
+    assert call["key"] == "test-key"
+    assert call["body"]["contents"][0]["parts"][1]["inline_data"]["mime_type"] == "image/jpeg"
+    assert call["body"]["generationConfig"] == {"responseMimeType": "application/json"}
+
+
+def test_client_stays_usable_after_outage_responses():
+    # Nothing retries Gemini calls: the hedger fails over to the local model and a scan job is
+    # marked failed. A failed call must still leave the shared client working for the next scan.
+    with serve(scripted_fake([503, 429, "ok"])) as url:
+        results, _ = run_calls(url, 3)
+    assert [r.status_code for r in results[:2]] == [503, 429]
+    assert all(is_outage(r) for r in results[:2])
+    assert json.loads(results[2]) == ANSWER
+
+
+def test_http_errors_are_classified():
+    with serve(scripted_fake([500, 429, 400, 403, "bad_shape"])) as url:
+        results, _ = run_calls(url, 5)
+    assert all(isinstance(r, GeminiError) for r in results)
+    assert [error_reason(r) for r in results] == ["500", "429", "400", "403", "bad_response"]
+    # Throttling, 5xx and unusable answers trip the breaker; our own bad requests don't
+    assert [is_outage(r) for r in results] == [True, True, False, False, True]
+
+
+def test_timeout_is_an_outage():
+    with serve(scripted_fake(["slow"])) as url:
+        (result,), _ = run_calls(url, 1, timeout=SLOW_SECONDS / 5)
+    assert isinstance(result, httpx.TimeoutException)
+    assert error_reason(result) == "timeout" and is_outage(result)
+
+
+def test_unreachable_endpoint_is_a_transport_outage():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        port = s.getsockname()[1]
+    (result,), _ = run_calls(f"http://127.0.0.1:{port}", 1)
+    assert isinstance(result, httpx.TransportError)
+    assert error_reason(result) == "transport" and is_outage(result)
+
+
+def test_non_http_errors_are_not_outages():
+    error = ValueError("unparseable model output")
+    assert error_reason(error) == "other" and not is_outage(error)
+
+
+if __name__ == "__main__":
+    tests = [(name, fn) for name, fn in sorted(globals().items()) if name.startswith("test_")]
+    for name, fn in tests:
+        fn()
+        print(f"✅ {name}")
+    print(f"{len(tests)} checks passed")
@@ -0,0 +1,60 @@
+"""
+Offline checks for the upload size limit as the browser sees it: a 413 for
+an oversized cross-origin upload must carry CORS headers, or the frontend
+can't read its detail and reports the backend as down.
+
+Usage: python test_upload_limits.py   (or: python -m pytest test_upload_limits.py)
+
+No database or model needed: the app is exercised without its lifespan,
+and the limit rejects the body before any route code runs.
+"""
+
+from fastapi.testclient import TestClient
+
+from main import app
+from uploads import MAX_UPLOAD_BYTES, TOO_LARGE_DETAIL
+
+ORIGIN = "https://krishi-vision.vercel.app"
+OVERSIZED = b"\xff" * (MAX_UPLOAD_BYTES + 1024 * 1024)
+
+
+def multipart(body: bytes) -> tuple[bytes, str]:
+    boundary = "krishi-test-boundary"
+    payload = (
+        f"--{boundary}\r\nContent-Disposition: form-data; name=\"file\"; filename=\"big.jpg\"\r\n"
+        f"Content-Type: image/jpeg\r\n\r\n"
+    ).encode() + body + f"\r\n--{boundary}--\r\n".encode()
+    return payload, f"multipart/form-data; boundary={boundary}"
+
+
+def check_cors_413(response):
+    assert response.status_code == 413, response.status_code
+    assert response.json()["detail"] == TOO_LARGE_DETAIL
+    assert response.headers.get("access-control-allow-origin") == ORIGIN
+    assert response.headers.get("access-control-allow-credentials") == "true"
+
+
+def test_declared_oversized_upload_gets_cors_413():
+    payload, content_type = multipart(OVERSIZED)
+    response = TestClient(app).post("/predict", content=payload, headers={"Origin": ORIGIN, "Content-Type": content_type})
+    check_cors_413(response)
+
+
+def test_streamed_oversized_upload_gets_cors_413():
+    # No Content-Length: the limit trips while the body is being read
+    payload, content_type = multipart(OVERSIZED)
+
+    def chunks():
+        for i in range(0, len(payload), 256 * 1024):
+            yield payload[i:i + 256 * 1024]
+
+    response = TestClient(app).post("/predict", content=chunks(), headers={"Origin": ORIGIN, "Content-Type": content_type})
+    check_cors_413(response)
+
+
+if __name__ == "__main__":
+    tests = [(name, fn) for name, fn in sorted(globals().items()) if name.startswith("test_")]
+    for name, fn in tests:
+        fn()
+        print(f"✅ {name}")
+    print(f"{len(tests)} checks passed")
@@ -0,0 +1,176 @@
+"""
+KrishiVision — Uploads Module
+Bounded ingestion of uploaded images, so one request can't make a worker
+buffer an arbitrarily large body or decode a decompression bomb.
+
+1. UploadLimitMiddleware caps the raw request body per upload route: a
+   Content-Length over the cap is refused before any byte is read, and a
+   chunked body is cut off as soon as it crosses the cap.
+2. read_image_upload() pulls the file in UPLOAD_CHUNK_SIZE pieces, sniffs
+   format and dimensions from the first chunks and rejects unsupported
+   formats or oversized images before reading (let alone decoding) the rest.
+3. Zip archives (for /predict/batch) are listed from their central
+   directory and each entry is read with the same limits, never trusting
+   the sizes the archive declares.
+"""
+
+import os
+import zipfile
+import zlib
+
+from fastapi import HTTPException, UploadFile
+from starlette.responses import JSONResponse
+
+from imaging import ImageTooLarge, SUPPORTED_FORMATS, sniff
+
+MAX_UPLOAD_MB = float(os.environ.get("MAX_UPLOAD_MB", "10"))
+MAX_UPLOAD_BYTES = int(MAX_UPLOAD_MB * 1024 * 1024)
+# Whole request body for /predict/batch (many images or zip archives)
+BATCH_MAX_UPLOAD_MB = float(os.environ.get("BATCH_MAX_UPLOAD_MB", "100"))
+BATCH_MAX_UPLOAD_BYTES = int(BATCH_MAX_UPLOAD_MB * 1024 * 1024)
+UPLOAD_CHUNK_SIZE = int(os.environ.get("UPLOAD_CHUNK_SIZE", str(64 * 1024)))
+# Give up sniffing after this much: no real JPEG puts its frame header further in
+SNIFF_LIMIT = 512 * 1024
+# Multipart boundaries, part headers and small form fields on top of the file itself
+MULTIPART_OVERHEAD = 64 * 1024
+
+TOO_LARGE_DETAIL = f"Image too large. Maximum size is {MAX_UPLOAD_MB:g} MB."
+INVALID_IMAGE_DETAIL = "Invalid image file. Please upload a JPG or PNG image."
+
+ALLOWED_CONTENT_TYPES = {"image/jpeg", "image/png", "image/webp", "image/jpg"}
+ZIP_CONTENT_TYPES = {"application/zip", "application/x-zip-compressed"}
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp")
+
+
+class UploadLimitMiddleware:
+    """Pure ASGI middleware: `limits` maps a POST path to its maximum body size in bytes."""
+
+    def __init__(self, app, limits: dict[str, int]):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get(scope["path"]) if scope["type"] == "http" and scope["method"] == "POST" else None
+        if limit is None:
+            return await self.app(scope, receive, send)
+
+        length = dict(scope["headers"]).get(b"content-length")
+        if length is not None and length.isdigit() and int(length) > limit:
+            return await self._reject(scope, receive, send)
+
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            if exceeded:
+                return {"type": "http.disconnect"}
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Look like a dropped client to the body parser; the 413 is sent below
+                    exceeded = True
+                    return {"type": "http.disconnect"}
+            return message
+
+        async def guarded_send(message):
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except Exception:
+            if not exceeded:
+                raise
+        if exceeded:
+            await self._reject(scope, receive, send)
+
+    @staticmethod
+    async def _reject(scope, receive, send):
+        response = JSONResponse(status_code=413, content={"detail": TOO_LARGE_DETAIL}, headers={"Connection": "close"})
+        await response(scope, receive, send)
+
+
+def check_content_type(content_type: str | None):
+    if content_type and content_type not in ALLOWED_CONTENT_TYPES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Invalid file type '{content_type}'. Please upload a JPG, PNG, or WEBP image.",
+        )
+
+
+def check_header(data: bytes) -> bool:
+    """
+    Sniff the upload's first bytes: raises HTTPException for decompression
+    bombs and unsupported formats, returns False if more bytes are needed.
+    """
+    try:
+        header = sniff(data)
+    except ImageTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
+    if header is None:
+        return False
+    if header[0] not in SUPPORTED_FORMATS:
+        raise HTTPException(status_code=400, detail=INVALID_IMAGE_DETAIL)
+    return True
+
+
+async def read_image_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """
+    Read an uploaded image chunk by chunk. Raises HTTPException as soon as
+    the size limit is crossed or the header shows an unsupported format or a
+    decompression bomb.
+    """
+    data = bytearray()
+    sniffed = False
+    while True:
+        chunk = await file.read(UPLOAD_CHUNK_SIZE)
+        if not chunk:
+            break
+        data += chunk
+        if len(data) > max_bytes:
+            raise HTTPException(status_code=413, detail=TOO_LARGE_DETAIL)
+        if not sniffed and len(data) <= SNIFF_LIMIT + UPLOAD_CHUNK_SIZE:
+            sniffed = check_header(bytes(data))
+
+    if not data:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    return bytes(data)
+
+
+def is_zip(upload) -> bool:
+    return upload.content_type in ZIP_CONTENT_TYPES or (upload.filename or "").lower().endswith(".zip")
+
+
+def list_zip_images(fileobj) -> tuple[zipfile.ZipFile, list[zipfile.ZipInfo]]:
+    """Open an uploaded archive and list its image entries (folders, dotfiles and __MACOSX skipped)."""
+    try:
+        archive = zipfile.ZipFile(fileobj)
+    except zipfile.BadZipFile:
+        raise HTTPException(status_code=400, detail="Invalid zip archive.")
+    entries = [
+        info for info in archive.infolist()
+        if not info.is_dir()
+        and info.filename.lower().endswith(IMAGE_EXTENSIONS)
+        and not info.filename.startswith("__MACOSX/")
+        and not os.path.basename(info.filename).startswith(".")
+    ]
+    return archive, entries
+
+
+def read_zip_image(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_bytes: int = MAX_UPLOAD_BYTES) -> bytes:
+    """Decompress one entry, stopping at `max_bytes` whatever its declared size."""
+    if info.file_size > max_bytes:
+        raise HTTPException(status_code=413, detail=TOO_LARGE_DETAIL)
+    try:
+        with archive.open(info) as f:
+            data = f.read(max_bytes + 1)
+    except (zipfile.BadZipFile, zlib.error, EOFError, RuntimeError, NotImplementedError):  # corrupt, encrypted or unsupported
+        raise HTTPException(status_code=400, detail=INVALID_IMAGE_DETAIL)
+    if len(data) > max_bytes:
+        raise HTTPException(status_code=413, detail=TOO_LARGE_DETAIL)
+    if not data:
+        raise HTTPException(status_code=400, detail="Uploaded file is empty.")
+    check_header(data[:SNIFF_LIMIT])
+    return data